@@ -1,31 +1,102 @@
-from fastapi import Header, HTTPException, Query
+from fastapi import Header, HTTPException, Query, Request
 from typing import Optional
-from .database import get_pool
+from .cache import TTLCache
+from .database import get_pool, warm
+
+# Agent names are unique and agents are provisioned out of band, so the
+# name -> (agent_id, user_id) mapping is effectively static.
+_agents_by_name = TTLCache(ttl=300)
+
+# api_key -> caller info, for the same reason; the short TTL bounds how long
+# a key keeps working after it is revoked.
+_callers_by_key = TTLCache(ttl=30)
+
+_VERIFY_API_KEY_SQL = warm("""
+        SELECT a.agent_id, a.name AS agent_name, a.user_id, u.name AS user_name
+        FROM agents a
+        JOIN users u ON a.user_id = u.user_id
+        WHERE a.api_key = $1
+        """, "")
+
+_AGENT_BY_NAME_SQL = warm("SELECT agent_id, user_id FROM agents WHERE name = $1", "")
+
+
+async def lookup_api_key(api_key: str) -> dict | None:
+    """Return {agent_id, agent_name, user_id, user_name} for an API key, or None."""
+    caller = _callers_by_key.get(api_key)
+    if caller is not None:
+        return caller
+    pool = get_pool()
+    row = await pool.fetchrow(_VERIFY_API_KEY_SQL, api_key)
+    if not row:
+        return None
+    caller = dict(row)
+    _callers_by_key.set(api_key, caller)
+    return caller
 
 
 async def verify_api_key(
+    request: Request,
     x_api_key: Optional[str] = Header(None),
     agent_key: Optional[str] = Query(None)
 ) -> dict:
     """Validate API key and return agent info.
     
     Accepts key from either X-Api-Key header or agent_key query parameter.
-    Header takes precedence if both are provided.
+    Header takes precedence if both are provided. The result is kept on
+    request.state.caller so other code handling the request can reuse it.
     """
+    caller = getattr(request.state, "caller", None)
+    if caller is not None:
+        return caller
     api_key = x_api_key or agent_key
     if not api_key:
         raise HTTPException(status_code=401, detail="API key required (X-Api-Key header or agent_key parameter)")
     
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        """
-        SELECT a.agent_id, a.name AS agent_name, a.user_id, u.name AS user_name
-        FROM agents a
-        JOIN users u ON a.user_id = u.user_id
-        WHERE a.api_key = $1
-        """,
-        api_key
-    )
-    if not row:
+    caller = await lookup_api_key(api_key)
+    if caller is None:
         raise HTTPException(status_code=401, detail="Invalid API key")
-    return dict(row)
+    request.state.caller = caller
+    return caller
+
+
+async def get_agent_by_name(agent_name: str) -> dict | None:
+    """Return {agent_id, user_id} for an agent name, or None if unknown."""
+    agent = _agents_by_name.get(agent_name)
+    if agent is not None:
+        return agent
+    pool = get_pool()
+    row = await pool.fetchrow(_AGENT_BY_NAME_SQL, agent_name)
+    if not row:
+        return None
+    agent = dict(row)
+    _agents_by_name.set(agent_name, agent)
+    return agent
+
+
+async def reader_agent_id(agent_name: str, caller: dict,
+                          not_found: str = "Not found or access denied") -> int:
+    """agent_id for access any agent of the same user may have, such as a read.
+
+    An agent reading its own data already has its id from auth, so only
+    other agents' names need resolving (from the cached name lookup).
+    """
+    if caller["agent_name"] == agent_name:
+        return caller["agent_id"]
+    agent = await get_agent_by_name(agent_name)
+    if not agent or agent["user_id"] != caller["user_id"]:
+        raise HTTPException(status_code=404, detail=not_found)
+    return agent["agent_id"]
+
+
+async def writer_agent_id(agent_name: str, caller: dict, denied: str) -> int:
+    """agent_id for an agent-scoped write, which only the named agent may make.
+
+    The caller's own id comes from its auth row, so the allowed path needs no
+    lookup; the agent is only resolved to tell 404 from 403 on refusal.
+    """
+    if caller["agent_name"] == agent_name:
+        return caller["agent_id"]
+    if not await get_agent_by_name(agent_name):
+        raise HTTPException(status_code=404, detail="Agent not found")
+    raise HTTPException(status_code=403, detail=denied)
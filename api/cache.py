@@ -0,0 +1,312 @@
+"""
+Short-lived in-process caches for hot, user-scoped list reads.
+
+Agents poll list endpoints (projects, hints, wikis, shares) far more often
+than they write to them. These caches hold each user's list for a few seconds,
+already encoded as JSON bytes, and are cleared wholesale by every write path,
+so a hit skips both the database round trip and serialization without
+serving stale data.
+
+Each worker process has its own caches. Shared caches broadcast every
+pop/clear with Postgres NOTIFY, and each worker's listener connection drops
+the same entries, so a write handled by one worker is seen by the next read
+on any other. While a worker's listener is down, its shared caches are
+bypassed rather than risk serving another worker's stale entries.
+
+Static lookup tables (project_statuses) are held here too, loaded at startup.
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Hashable
+
+import asyncpg
+import orjson
+
+from .database import get_pool, warm
+
+logger = logging.getLogger(__name__)
+
+_CHANNEL = "lucyapi_cache"
+# Identifies this process's own notifications, which it has already applied
+_ORIGIN = uuid.uuid4().hex
+
+# Shared caches by name, for applying notifications from other workers
+_shared: dict[str, "TTLCache"] = {}
+_notify_tasks: set[asyncio.Task] = set()
+
+_listener: asyncpg.Connection | None = None
+_listener_dsn: str | None = None
+_listening = False
+_stopping = False
+
+
+class TTLCache:
+    """Dict-backed cache with per-entry expiry and single-flight loading.
+
+    A cache given a shared name propagates pop/clear to every worker process.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000, shared: str | None = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.shared = shared
+        if shared:
+            _shared[shared] = self
+        self._data: dict[Hashable, tuple[float, Any]] = {}
+        # Loads in progress; an entry lives only while its loader runs
+        self._loading: dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Any | None:
+        if self.shared and not _listening:
+            return None
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            self._data.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.shared and not _listening:
+            return
+        if len(self._data) >= self.maxsize and key not in self._data:
+            # Drop the oldest insertion to stay bounded
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable) -> None:
+        self._drop(key)
+        _broadcast(self.shared, key)
+
+    def clear(self) -> None:
+        self._drop_all()
+        _broadcast(self.shared, None)
+
+    def _drop(self, key: Hashable) -> None:
+        self._generation += 1
+        self._data.pop(key, None)
+
+    def _drop_all(self) -> None:
+        self._generation += 1
+        self._data.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, or run loader once for concurrent misses."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        task = self._loading.get(key)
+        if task is None:
+            task = self._loading[key] = asyncio.ensure_future(self._load(key, loader))
+        # Shielded so one cancelled waiter does not cancel the shared load
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            generation = self._generation
+            value = await loader()
+            # Skip the store if a write invalidated the cache mid-load
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            self._loading.pop(key, None)
+
+
+# ── Cross-process invalidation ─────────────────────────────────
+
+def _broadcast(name: str | None, key: Hashable | None) -> None:
+    """NOTIFY other workers to drop key (or everything, for None) from a shared cache."""
+    if name is None:
+        return
+    try:
+        pool = get_pool()
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Before startup nothing is cached anywhere yet
+        return
+    payload = orjson.dumps({"origin": _ORIGIN, "cache": name, "key": key}).decode()
+    task = loop.create_task(pool.execute("SELECT pg_notify($1, $2)", _CHANNEL, payload))
+    _notify_tasks.add(task)
+    task.add_done_callback(_notify_done)
+
+
+def _notify_done(task: asyncio.Task) -> None:
+    _notify_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Cache invalidation NOTIFY failed: {task.exception()}")
+
+
+def _on_notify(conn, pid, channel, payload: str) -> None:
+    msg = orjson.loads(payload)
+    if msg["origin"] == _ORIGIN:
+        return
+    if msg["cache"] == _STATUSES:
+        task = asyncio.get_running_loop().create_task(load_project_statuses())
+        _notify_tasks.add(task)
+        task.add_done_callback(_reload_done)
+        return
+    cache = _shared.get(msg["cache"])
+    if cache is None:
+        return
+    key = msg["key"]
+    if key is None:
+        cache._drop_all()
+    else:
+        # JSON turns tuple keys into lists
+        cache._drop(tuple(key) if isinstance(key, list) else key)
+
+
+def _reload_done(task: asyncio.Task) -> None:
+    _notify_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Project status reload failed: {task.exception()}")
+
+
+def _on_listener_lost(conn) -> None:
+    global _listening
+    _listening = False
+    # Notifications may have been missed: nothing cached so far can be trusted
+    for cache in _shared.values():
+        cache._drop_all()
+    if not _stopping:
+        logger.warning("Cache invalidation listener lost; bypassing shared caches until it reconnects")
+        asyncio.get_running_loop().create_task(_reconnect_listener())
+
+
+async def _connect_listener() -> None:
+    global _listener, _listening
+    _listener = await asyncpg.connect(_listener_dsn)
+    await _listener.add_listener(_CHANNEL, _on_notify)
+    _listener.add_termination_listener(_on_listener_lost)
+    _listening = True
+
+
+async def _reconnect_listener() -> None:
+    delay = 1
+    while not _stopping and not _listening:
+        await asyncio.sleep(delay)
+        try:
+            await _connect_listener()
+            logger.info("Cache invalidation listener reconnected")
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.warning(f"Cache invalidation listener reconnect failed: {e}")
+            delay = min(delay * 2, 30)
+
+
+async def start_invalidation_listener(dsn: str) -> None:
+    """Open the LISTEN connection that applies other workers' invalidations."""
+    global _listener_dsn, _stopping
+    _listener_dsn = dsn
+    _stopping = False
+    await _connect_listener()
+
+
+async def stop_invalidation_listener() -> None:
+    global _listener, _listening, _stopping
+    _stopping = True
+    _listening = False
+    if _listener:
+        await _listener.close()
+        _listener = None
+
+
+# Cleared by any project, hint, wiki, or share write respectively; sharing
+# changes clear all four since they alter what other users can see.
+project_lists = TTLCache(ttl=10, shared="project_lists")
+hint_lists = TTLCache(ttl=10, shared="hint_lists")
+wiki_lists = TTLCache(ttl=10, shared="wiki_lists")
+share_lists = TTLCache(ttl=10, shared="share_lists")
+
+
+# Per-agent always_load rows behind /boot and the context endpoints; cleared
+# by any always_load write.
+always_load_trees = TTLCache(ttl=10, shared="always_load_trees")
+
+_ALWAYS_LOAD_TREE_SQL = warm(
+    "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid", 0
+)
+
+
+async def always_load_tree(agent_id: int) -> list[dict]:
+    """An agent's always_load rows (pkid, parent_id, title, description), cached."""
+    async def load():
+        rows = await get_pool().fetch(_ALWAYS_LOAD_TREE_SQL, agent_id)
+        return [dict(r) for r in rows]
+    return await always_load_trees.get_or_load(agent_id, load)
+
+
+async def always_load_item(agent_id: int, pkid: int) -> tuple[dict | None, list[dict]]:
+    """One always_load node and its direct children, from the cached tree."""
+    rows = await always_load_tree(agent_id)
+    node = next((r for r in rows if r["pkid"] == pkid), None)
+    # Rows are ordered by (parent_id, pkid), so children come out in pkid order
+    return node, [r for r in rows if r["parent_id"] == pkid]
+
+
+# Google Docs/Drive reads (document text, folder listings, file metadata),
+# keyed on (user_id, op, id). Upstream calls are slow and agents re-read while
+# polling, so a few seconds collapses those into one call; cleared by any
+# Google write.
+google_reads = TTLCache(ttl=5, maxsize=1000, shared="google_reads")
+
+
+# Each agent's pending handoffs behind list_handoffs, which agents poll; a
+# burst of identical polls shares one query. Cleared by any handoff write.
+handoff_lists = TTLCache(ttl=5, shared="handoff_lists")
+
+_PENDING_HANDOFFS_SQL = warm(
+    "SELECT handoff_id, title, prompt, created_at FROM handoffs WHERE agent_id = $1 AND picked_up_at IS NULL ORDER BY created_at", 0
+)
+
+
+async def pending_handoffs(agent_id: int) -> list:
+    """An agent's not-yet-picked-up handoffs, oldest first, cached."""
+    return await handoff_lists.get_or_load(agent_id, lambda: get_pool().fetch(_PENDING_HANDOFFS_SQL, agent_id))
+
+
+def invalidate_shares() -> None:
+    """Drop every list that depends on shared_objects."""
+    project_lists.clear()
+    hint_lists.clear()
+    wiki_lists.clear()
+    share_lists.clear()
+
+
+# project_statuses is a static lookup table: loaded once at startup and
+# reloaded on demand, so reads and project writes never join against it
+_STATUSES = "project_statuses"
+project_statuses: list[dict] = []
+_status_by_id: dict[int, dict] = {}
+
+
+async def load_project_statuses() -> None:
+    """(Re)load the project_statuses lookup table into memory."""
+    pool = get_pool()
+    rows = await pool.fetch("SELECT status_id, code, label, sort_order FROM project_statuses ORDER BY sort_order")
+    project_statuses[:] = [dict(r) for r in rows]
+    _status_by_id.clear()
+    _status_by_id.update((s["status_id"], s) for s in project_statuses)
+    # Project lists embed status code and label
+    project_lists.clear()
+
+
+async def reload_all_project_statuses() -> None:
+    """Reload project_statuses here and tell every other worker to do the same."""
+    await load_project_statuses()
+    _broadcast(_STATUSES, None)
+
+
+def with_status(row) -> dict:
+    """Replace a row's status_id with its status code and label."""
+    result = dict(row)
+    status = _status_by_id.get(result.pop("status_id"))
+    result["status"] = status["code"] if status else None
+    result["status_label"] = status["label"] if status else None
+    return result
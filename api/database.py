@@ -1,16 +1,125 @@
 import asyncpg
+import logging
+from itertools import combinations
+from typing import Any
+
+logger = logging.getLogger(__name__)
 
 _pool = None
 
-async def get_pool() -> asyncpg.Pool:
-    global _pool
+# (sql, args) for statements issued on nearly every request; see warm()
+_warm_queries: list[tuple[str, tuple]] = []
+
+
+def json_array_sql(query: str) -> str:
+    """Wrap a SELECT so Postgres returns all of its rows as one JSON array (text)."""
+    return f"SELECT COALESCE(json_agg(t), '[]')::text FROM ({query}) t"
+
+
+def update_variants(table: str, fields: tuple[str, ...], where: tuple[str, ...], returning: str,
+                    touch_updated_at: bool = True, guard: str | None = None) -> dict[frozenset, tuple[str, tuple[str, ...]]]:
+    """Precompute an UPDATE statement for every non-empty subset of fields.
+
+    Each permutation maps to fixed SQL text, so asyncpg's per-connection
+    statement cache reuses the server-side plan instead of re-parsing.
+    Parameters are the supplied fields in declaration order, then `where`.
+    `guard` is an extra condition (e.g. a permission check) whose `{p}`
+    placeholders become the one parameter that follows `where`.
+    """
+    variants = {}
+    for n in range(1, len(fields) + 1):
+        for combo in combinations(fields, n):
+            sets = [f"{f} = ${i}" for i, f in enumerate(combo, 1)]
+            if touch_updated_at:
+                sets.append("updated_at = NOW()")
+            conds = [f"{c} = ${i}" for i, c in enumerate(where, n + 1)]
+            if guard:
+                conds.append(guard.format(p=f"${n + len(where) + 1}"))
+            sql = f"UPDATE {table} SET {', '.join(sets)} WHERE {' AND '.join(conds)} RETURNING {returning}"
+            variants[frozenset(combo)] = (sql, combo)
+    return variants
+
+
+def pick_update(variants: dict, values: dict[str, Any]) -> tuple[str, list] | None:
+    """Select the precomputed UPDATE for the given field values, or None if empty."""
+    if not values:
+        return None
+    sql, order = variants[frozenset(values)]
+    return sql, [values[f] for f in order]
+
+
+def provided(model, fields: tuple[str, ...]) -> dict[str, Any]:
+    """The fields of a request model that were supplied (not None)."""
+    return {f: v for f in fields if (v := getattr(model, f)) is not None}
+
+
+# Most rows a bulk create accepts in one request
+MAX_BULK_ITEMS = 5000
+
+# Above this many rows COPY beats a pipelined executemany
+_COPY_THRESHOLD = 500
+
+
+async def insert_many(table: str, columns: list[str], records: list[tuple]) -> None:
+    """Insert records into table, by COPY for large batches and executemany otherwise."""
+    async with get_pool().acquire() as conn:
+        if len(records) > _COPY_THRESHOLD:
+            await conn.copy_records_to_table(table, records=records, columns=columns)
+        else:
+            params = ", ".join(f"${i}" for i in range(1, len(columns) + 1))
+            await conn.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({params})",
+                records
+            )
+
+
+def warm(sql: str, *args) -> str:
+    """Register a hot query to be prepared on every new pool connection.
+
+    args must be parameters that match no rows: the query is run once with
+    them when a connection opens, which puts its plan in asyncpg's statement
+    cache so the first real request on that connection skips the Parse step.
+    Call at import time, before init_pool. Returns sql unchanged.
+    """
+    _warm_queries.append((sql, args))
+    return sql
+
+
+async def _warm_connection(conn: asyncpg.Connection) -> None:
+    for sql, args in _warm_queries:
+        try:
+            await conn.fetch(sql, *args)
+        except asyncpg.PostgresError as e:
+            logger.warning(f"Could not warm statement: {e}")
+
+
+def get_pool() -> asyncpg.Pool:
+    """The process-wide pool, bound once by init_pool at startup.
+
+    Plain function rather than a coroutine: handlers call this on every
+    request, and there is nothing to wait for once the pool exists.
+    """
     if _pool is None:
         raise RuntimeError("Database pool not initialized")
     return _pool
 
 async def init_pool(dsn: str, min_size: int = 2, max_size: int = 10):
     global _pool
-    _pool = await asyncpg.create_pool(dsn, min_size=min_size, max_size=max_size)
+    # Room for every distinct statement the routes issue, so hot queries
+    # stay prepared per connection instead of being evicted and re-parsed.
+    # JIT is off: every query here is short OLTP work where JIT compile time
+    # only adds latency.
+    _pool = await asyncpg.create_pool(
+        dsn, min_size=min_size, max_size=max_size,
+        statement_cache_size=1024, max_cacheable_statement_size=1024 * 16,
+        max_inactive_connection_lifetime=300,
+        # Recycle connections periodically so server-side memory stays bounded;
+        # no statement here should ever run anywhere near 30s
+        max_queries=50000, command_timeout=30,
+        init=_warm_connection,
+        # UTC so timestamps rendered by json_agg match orjson's encoding
+        server_settings={"jit": "off", "application_name": "lucyapi", "timezone": "UTC"},
+    )
 
 async def close_pool():
     global _pool
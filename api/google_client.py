@@ -5,11 +5,16 @@ OAuth2 credentials (refresh token) loaded from LucyAPI secrets store on first us
 
 import logging
 import asyncio
+import inspect
+from contextlib import asynccontextmanager
+from functools import wraps
+from itertools import groupby
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 
+from .cache import google_reads
 from .database import get_pool
 from .encryption import decrypt
 from . import doc_composer
@@ -26,6 +31,19 @@ _docs_service = None
 _drive_service = None
 _folder_id = None
 
+# Edits to one document are serialized: each reads the current end index
+# before writing, so two concurrent edits would otherwise compute the same
+# offsets. An entry holds the lock and how many callers hold or await it,
+# and is removed when the last one leaves, so idle documents keep no lock.
+_doc_locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+# Appends waiting to be written, per document, as (content, branding, future);
+# see append_to_document. Appends arriving within _APPEND_WINDOW seconds of
+# the first share one end-index read and one batchUpdate.
+_append_queues: dict[str, list[tuple[list[dict], str, asyncio.Future]]] = {}
+_append_tasks: set[asyncio.Task] = set()
+_APPEND_WINDOW = 0.01
+
 
 class GoogleApiError(Exception):
     """Wraps Google API errors with a clean message and status code."""
@@ -48,6 +66,33 @@ def _handle_http_error(e: HttpError, context: str = "") -> GoogleApiError:
     return GoogleApiError(f"{prefix}{reason}", 502)
 
 
+def _cache_arg(value):
+    """A hashable form of an argument for the cache key."""
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    if isinstance(value, list):
+        return tuple(value)
+    return value
+
+
+def _cached_read(fn):
+    """Serve a read from google_reads; concurrent identical calls share one upstream request.
+
+    The key is built from the call bound to fn's signature with defaults
+    applied, so positional, keyword and defaulted spellings of the same call
+    share one entry.
+    """
+    sig = inspect.signature(fn)
+
+    @wraps(fn)
+    async def wrap(*args, **kwargs):
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = (fn.__name__, *(_cache_arg(v) for v in bound.arguments.values()))
+        return await google_reads.get_or_load(key, lambda: fn(*bound.args, **bound.kwargs))
+    return wrap
+
+
 async def _load_secret(pool, user_id: int, key: str) -> str:
     """Load and decrypt a single secret by key."""
     row = await pool.fetchrow(
@@ -65,7 +110,7 @@ async def _ensure_initialized(user_id: int):
     if _docs_service is not None:
         return
 
-    pool = await get_pool()
+    pool = get_pool()
 
     refresh_token = await _load_secret(pool, user_id, "google_oauth_refresh_token")
     client_id = await _load_secret(pool, user_id, "google_oauth_client_id")
@@ -152,6 +197,7 @@ async def create_document(user_id: int, title: str, body_text: str = "") -> dict
             {"insertText": {"location": {"index": 1}, "text": body_text}}
         ])
 
+    google_reads.clear()
     return {
         "document_id": doc_id,
         "title": title,
@@ -159,6 +205,7 @@ async def create_document(user_id: int, title: str, body_text: str = "") -> dict
     }
 
 
+@_cached_read
 async def read_document(user_id: int, document_id: str) -> dict:
     """Read a Google Doc and return its plain text content."""
     await _ensure_initialized(user_id)
@@ -209,6 +256,7 @@ async def create_formatted_document(user_id: int, title: str,
         requests = doc_composer.compose(content, branding=branding, start_index=1)
         await _batch_update(doc_id, requests)
 
+    google_reads.clear()
     return {
         "document_id": doc_id,
         "title": title,
@@ -222,41 +270,70 @@ async def update_document(user_id: int, document_id: str,
     """Replace a document's content with new formatted content."""
     await _ensure_initialized(user_id)
 
-    # Get current document end index
-    end_index = await _get_doc_end_index(document_id)
-
-    # Delete all existing content (keep the final newline at end_index - 1)
-    if end_index > 2:
-        await _batch_update(document_id, [{
-            "deleteContentRange": {
-                "range": {"startIndex": 1, "endIndex": end_index - 1}
-            }
-        }])
-
-    # Insert new content
-    if content:
-        requests = doc_composer.compose(content, branding=branding, start_index=1)
+    requests = doc_composer.compose(content, branding=branding, start_index=1) if content else []
+
+    async with _doc_lock(document_id):
+        # Get current document end index
+        end_index = await _get_doc_end_index(document_id)
+
+        # Delete all existing content (keep the final newline at end_index - 1)
+        # and insert the new content in the same batchUpdate; Docs applies
+        # the requests in order
+        if end_index > 2:
+            requests.insert(0, {
+                "deleteContentRange": {
+                    "range": {"startIndex": 1, "endIndex": end_index - 1}
+                }
+            })
         await _batch_update(document_id, requests)
 
+    google_reads.clear()
     return {
         "document_id": document_id,
         "url": f"https://docs.google.com/document/d/{document_id}/edit",
     }
 
 
+@asynccontextmanager
+async def _doc_lock(document_id: str):
+    """Hold the edit lock for a document."""
+    lock, users = _doc_locks.get(document_id, (None, 0))
+    if lock is None:
+        lock = asyncio.Lock()
+    _doc_locks[document_id] = (lock, users + 1)
+    try:
+        async with lock:
+            yield
+    finally:
+        lock, users = _doc_locks[document_id]
+        if users == 1:
+            del _doc_locks[document_id]
+        else:
+            _doc_locks[document_id] = (lock, users - 1)
+
+
 async def append_to_document(user_id: int, document_id: str,
                              content: list[dict],
                              branding: str = "none") -> dict:
-    """Append formatted content blocks to an existing document."""
-    await _ensure_initialized(user_id)
+    """Append formatted content blocks to an existing document.
 
-    # Find the current end of content (insert before the final newline)
-    end_index = await _get_doc_end_index(document_id)
-    start = end_index - 1  # insert before trailing newline
+    Concurrent appends to the same document are queued and written together
+    by _flush_appends; this returns once its own content is in the document.
+    """
+    await _ensure_initialized(user_id)
 
     if content:
-        requests = doc_composer.compose(content, branding=branding, start_index=start)
-        await _batch_update(document_id, requests)
+        # Reject bad blocks here so they fail only this call, not the batch
+        doc_composer.compose(content, branding=branding, start_index=1)
+        future = asyncio.get_running_loop().create_future()
+        queue = _append_queues.get(document_id)
+        if queue is None:
+            queue = _append_queues[document_id] = []
+            task = asyncio.create_task(_flush_appends(document_id))
+            _append_tasks.add(task)
+            task.add_done_callback(_append_tasks.discard)
+        queue.append((content, branding, future))
+        await future
 
     return {
         "document_id": document_id,
@@ -264,20 +341,58 @@ async def append_to_document(user_id: int, document_id: str,
     }
 
 
+async def _flush_appends(document_id: str):
+    """Write every queued append for a document, one batchUpdate per branding run."""
+    await asyncio.sleep(_APPEND_WINDOW)
+    async with _doc_lock(document_id):
+        # Appends that arrived while waiting for the lock join this batch
+        batch = _append_queues.pop(document_id)
+        for branding, run in groupby(batch, key=lambda entry: entry[1]):
+            run = list(run)
+            try:
+                # Insert before the trailing newline
+                start = await _get_doc_end_index(document_id) - 1
+                blocks = [block for content, _, _ in run for block in content]
+                await _batch_update(document_id, doc_composer.compose(blocks, branding=branding, start_index=start))
+                google_reads.clear()
+            except Exception as e:
+                for _, _, future in run:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for _, _, future in run:
+                    if not future.done():
+                        future.set_result(None)
+
+
 # ---------------------------------------------------------------------------
 # Public API — Drive file management (Session 3)
 # ---------------------------------------------------------------------------
 
-async def list_files(user_id: int, folder_id: str = None) -> dict:
+# Extra per-file fields list_files can return, by include name. They are added
+# to the files.list field mask, so the listing stays one Drive round trip
+# instead of a files.get per file.
+LIST_INCLUDES = {
+    "metadata": "createdTime, size, parents",
+    "permissions": "permissions(id, type, role, emailAddress)",
+}
+
+
+@_cached_read
+async def list_files(user_id: int, folder_id: str = None, include: tuple[str, ...] = ()) -> dict:
     """List files in the target folder or a specified subfolder."""
+    unknown = set(include) - LIST_INCLUDES.keys()
+    if unknown:
+        raise ValueError(f"Unknown include: {', '.join(sorted(unknown))}")
     await _ensure_initialized(user_id)
 
     parent = folder_id or _folder_id
+    file_fields = ", ".join(["id, name, mimeType, modifiedTime, webViewLink"] + [LIST_INCLUDES[i] for i in include])
     try:
         results = await asyncio.to_thread(
             lambda: _drive_service.files().list(
                 q=f"'{parent}' in parents and trashed = false",
-                fields="files(id, name, mimeType, modifiedTime, webViewLink)",
+                fields=f"files({file_fields})",
                 orderBy="name",
                 pageSize=100,
             ).execute()
@@ -307,6 +422,7 @@ async def create_folder(user_id: int, name: str, parent_folder_id: str = None) -
     except HttpError as e:
         raise _handle_http_error(e, "create folder")
 
+    google_reads.clear()
     return {
         "folder_id": folder["id"],
         "name": folder["name"],
@@ -338,6 +454,7 @@ async def move_file(user_id: int, file_id: str, target_folder_id: str) -> dict:
     except HttpError as e:
         raise _handle_http_error(e, "move file")
 
+    google_reads.clear()
     return {
         "file_id": result["id"],
         "name": result["name"],
@@ -358,9 +475,11 @@ async def delete_file(user_id: int, file_id: str) -> dict:
     except HttpError as e:
         raise _handle_http_error(e, "delete file")
 
+    google_reads.clear()
     return {"file_id": file_id, "trashed": True}
 
 
+@_cached_read
 async def get_file_metadata(user_id: int, file_id: str) -> dict:
     """Get file metadata (title, type, dates, URL, parents)."""
     await _ensure_initialized(user_id)
@@ -0,0 +1,81 @@
+"""
+On-disk storage for generated images, shared by the public and admin image routes.
+Disk and PIL work runs in worker threads so a multi-MB PNG write or decode
+does not stall the event loop.
+"""
+
+import asyncio
+import os
+import logging
+from datetime import timedelta
+from io import BytesIO
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+IMAGES_DIR = "/opt/lucyapi/output/images"
+
+# Background generations give up well before this, so a row still pending
+# after STALE_PENDING belongs to a task that died with its process
+STALE_PENDING = timedelta(minutes=10)
+
+# Cleanup skips rows whose generation is still running, but not stale ones
+CLEANABLE_STATUS_SQL = (
+    f"(status <> 'pending' OR created_at < NOW() - interval '{int(STALE_PENDING.total_seconds())} seconds')"
+)
+
+# Caps concurrent unlinks across every caller, so a large cleanup cannot
+# occupy every worker thread
+_unlink_slots = asyncio.Semaphore(16)
+
+
+def _path(filename: str) -> str:
+    return os.path.join(IMAGES_DIR, filename)
+
+
+def _read(filepath: str) -> bytes:
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+def _write(filepath: str, data: bytes) -> None:
+    with open(filepath, "wb") as f:
+        f.write(data)
+
+
+def _size(data: bytes) -> tuple[int | None, int | None]:
+    try:
+        return Image.open(BytesIO(data)).size
+    except Exception:
+        return None, None
+
+
+async def read_image(filename: str) -> bytes:
+    """Image bytes; raises FileNotFoundError if the file is gone."""
+    return await asyncio.to_thread(_read, _path(filename))
+
+
+async def write_image(filename: str, data: bytes) -> None:
+    await asyncio.to_thread(_write, _path(filename), data)
+
+
+async def image_size(data: bytes) -> tuple[int | None, int | None]:
+    """(width, height) of encoded image bytes, or (None, None) if unreadable."""
+    return await asyncio.to_thread(_size, data)
+
+
+async def remove_image(filename: str) -> None:
+    """Unlink an image file; a missing file is not an error, others are logged."""
+    async with _unlink_slots:
+        try:
+            await asyncio.to_thread(os.remove, _path(filename))
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.error(f"Failed to delete image file {filename}: {e}")
+
+
+async def remove_images(filenames: list[str]) -> None:
+    """Unlink many image files concurrently, within the shared cap."""
+    await asyncio.gather(*(remove_image(f) for f in filenames))
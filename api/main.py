@@ -4,10 +4,12 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from starlette.routing import Mount
 from .database import init_pool, close_pool
+from .cache import load_project_statuses, start_invalidation_listener, stop_invalidation_listener
+from .responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .routes import time, context, memories, sessions, preferences, projects, save, secrets, handoffs, images, google_docs, hints, wikis, sharing
 from .routes import admin_auth, admin_agents, admin_resources
-from .mcp_server import create_mcp_session_manager
+from .mcp_server import create_mcp_session_manager, close_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -16,15 +18,25 @@ DATABASE_URL = os.environ.get(
     "postgresql://lucy@localhost:5432/lucyapi"
 )
 
+# Pool bounds per worker process; keep max_size x workers well under the
+# server's max_connections
+DB_POOL_MIN = int(os.environ.get("LUCYAPI_DB_POOL_MIN", "4"))
+DB_POOL_MAX = int(os.environ.get("LUCYAPI_DB_POOL_MAX", "20"))
+
 # Create MCP session manager at module level (stateless, no server-side state)
 mcp_session_manager = create_mcp_session_manager()
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await init_pool(DATABASE_URL)
+    await init_pool(DATABASE_URL, min_size=DB_POOL_MIN, max_size=DB_POOL_MAX)
+    await load_project_statuses()
+    await start_invalidation_listener(DATABASE_URL)
     async with mcp_session_manager.run():
         yield
+    await stop_invalidation_listener()
+    await close_http_client()
+    await images.close_http_client()
     await close_pool()
 
 
@@ -32,7 +44,8 @@ app = FastAPI(
     title="LucyAPI",
     description="Multi-user, multi-agent context service for Snowcap Systems",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -152,11 +165,11 @@ async def api_root():
                 {"method": "DELETE", "path": "/secrets/{key}", "auth": True, "description": "Delete a secret"}
             ],
             "handoffs": [
-                {"method": "GET", "path": "/agents/{name}/handoffs", "auth": True, "description": "List pending handoffs (picked_up_at IS NULL)"},
+                {"method": "GET", "path": "/agents/{name}/handoffs", "auth": True, "description": "List pending handoffs (picked_up_at IS NULL); ?compact=1 omits prompts"},
                 {"method": "GET", "path": "/agents/{name}/handoffs/{id}", "auth": True, "description": "Get a specific handoff"},
                 {"method": "POST", "path": "/agents/{name}/handoffs", "auth": True, "description": "Create a handoff (cross-agent OK)"},
                 {"method": "PUT", "path": "/agents/{name}/handoffs/{id}/pickup", "auth": True, "description": "Mark as picked up (named agent only)"},
-                {"method": "DELETE", "path": "/agents/{name}/handoffs/{id}", "auth": True, "description": "Delete a handoff (named agent only)"}
+                {"method": "DELETE", "path": "/agents/{name}/handoffs/{id}", "auth": True, "description": "Delete a handoff (named agent only); 204 No Content"}
             ],
             "hints": [
                 {"method": "GET", "path": "/hints", "auth": True, "description": "Full hints tree with descriptions"},
@@ -165,7 +178,7 @@ async def api_root():
                 {"method": "POST", "path": "/hint_categories", "auth": True, "description": "Create a new top-level hint category"},
                 {"method": "POST", "path": "/hints", "auth": True, "description": "Create a hint node (user-scoped write)"},
                 {"method": "PUT", "path": "/hints/{hint_id}", "auth": True, "description": "Update a hint (user-scoped write)"},
-                {"method": "DELETE", "path": "/hints/{hint_id}", "auth": True, "description": "Delete a hint node + descendants (user-scoped write)"}
+                {"method": "DELETE", "path": "/hints/{hint_id}", "auth": True, "description": "Delete a hint node + descendants (user-scoped write); 204 No Content"}
             ],
             "sharing": [
                 {"method": "POST", "path": "/sharing", "auth": True, "description": "Share an object with another user (owner only, upserts permission)"},
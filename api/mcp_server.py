@@ -8,18 +8,23 @@ Authentication: Each agent passes its own agent_key parameter on every tool
 call. The MCP server resolves caller identity from that key. No key = rejected.
 """
 
-import json
 import os
 import logging
+import importlib.util
 from datetime import datetime, timezone
 from typing import Any
 from zoneinfo import ZoneInfo
 
+import httpx
+import orjson
 from mcp import types
 from mcp.server.lowlevel import Server
 from mcp.server.streamable_http_manager import StreamableHTTPSessionManager
 
-from .database import get_pool
+from .auth import get_agent_by_name, lookup_api_key
+from .cache import always_load_tree, always_load_trees, always_load_item, handoff_lists, pending_handoffs, project_lists, hint_lists, wiki_lists, invalidate_shares, project_statuses, with_status
+from .database import get_pool, update_variants, pick_update
+from .responses import json_default
 from .encryption import encrypt, decrypt
 from . import google_client
 
@@ -31,6 +36,31 @@ TIMEZONE = ZoneInfo("America/Denver")
 
 BASE_URL = "https://lucyapi.snowcapsystems.com"
 
+# Long-lived client for the image tools' calls back into the REST API, so
+# each call reuses a kept-alive connection instead of a fresh TLS handshake
+_http_client: httpx.AsyncClient | None = None
+
+# Multiplex concurrent tool calls over one connection when httpx's optional
+# HTTP/2 support (the h2 package) is installed
+_HTTP2 = importlib.util.find_spec("h2") is not None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=BASE_URL, timeout=30, http2=_HTTP2,
+            limits=httpx.Limits(max_keepalive_connections=32),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
+
 
 def _browse_url(path: str, api_key: str) -> str:
     """Build a browser-ready URL with auth for a given API path."""
@@ -41,40 +71,45 @@ async def _get_caller(api_key: str | None = None) -> dict:
     """Resolve agent context from an API key. Requires explicit key."""
     if not api_key:
         raise ValueError("agent_key is required for authentication")
-    key = api_key
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        """
-        SELECT a.agent_id, a.name AS agent_name, a.user_id, u.name AS user_name
-        FROM agents a JOIN users u ON a.user_id = u.user_id
-        WHERE a.api_key = $1
-        """,
-        key,
-    )
-    if not row:
+    caller = await lookup_api_key(api_key)
+    if caller is None:
         raise ValueError("Invalid agent_key — agent not found")
-    return dict(row)
+    return caller
 
 
 async def _get_agent(agent_name: str, caller: dict) -> dict | None:
     """Look up an agent by name, verify same-user access."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
+    agent = await get_agent_by_name(agent_name)
     if not agent or agent["user_id"] != caller["user_id"]:
         return None
-    return dict(agent)
+    return agent
 
 
-def _json_serial(obj: Any) -> str:
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    raise TypeError(f"Type {type(obj)} not serializable")
+def _to_json(data: Any) -> str:
+    return orjson.dumps(data, default=json_default, option=orjson.OPT_INDENT_2).decode()
 
 
-def _to_json(data: Any) -> str:
-    return json.dumps(data, default=_json_serial, indent=2)
+def _pick_update(variants: dict, fields: tuple[str, ...], args: dict[str, Any]) -> tuple[str, list] | None:
+    """Select the precomputed UPDATE for the fields present in args."""
+    return pick_update(variants, {f: args[f] for f in fields if f in args})
+
+
+_PROJECT_FIELDS = ("title", "description", "status_id")
+_SECTION_FIELDS = ("title", "description", "file_path")
+_TEXT_FIELDS = ("title", "description")
+
+_PROJECT_UPDATES = update_variants("projects", _PROJECT_FIELDS, ("project_id",), "project_id, title, status_id")
+_SECTION_UPDATES = update_variants("project_sections", _SECTION_FIELDS, ("project_id", "section_id"), "section_id, title")
+_HINT_UPDATES = update_variants("hints", _TEXT_FIELDS, ("user_id", "hint_id"), "hint_id, title")
+_WIKI_UPDATES = update_variants("wikis", _TEXT_FIELDS, ("wiki_id",), "wiki_id, title")
+_ALWAYS_LOAD_UPDATES = update_variants("always_load", _TEXT_FIELDS, ("agent_id", "pkid"), "pkid, title")
+_MEMORY_UPDATES = update_variants("memories", _TEXT_FIELDS, ("agent_id", "pkid"), "pkid, title", touch_updated_at=False)
+_PREFERENCE_UPDATES = update_variants("preferences", _TEXT_FIELDS, ("agent_id", "pkid"), "pkid, title")
+# Section fields, tag set and wiki updated_at in one statement. Like the other
+# MCP updates, a field is written whenever its key is present in args (even as
+# null): $6/$7 say whether title/description were given. A None tag set is left
+# untouched. Otherwise mirrors routes.wikis.UPDATE_WIKI_SECTION_SQL.
+_UPDATE_WIKI_SECTION_SQL = "WITH s AS (UPDATE wiki_sections SET title = CASE WHEN $6 THEN $3 ELSE title END, description = CASE WHEN $7 THEN $4 ELSE description END, updated_at = NOW() WHERE wiki_id = $1 AND section_id = $2 RETURNING section_id, title), d AS (DELETE FROM wiki_section_tags WHERE section_id IN (SELECT section_id FROM s) AND $5::text[] IS NOT NULL AND tag <> ALL($5::text[])), i AS (INSERT INTO wiki_section_tags (section_id, tag) SELECT s.section_id, t FROM s, unnest($5::text[]) AS t ON CONFLICT (section_id, tag) DO NOTHING), w AS (UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1 AND EXISTS (SELECT 1 FROM s)) SELECT section_id, title FROM s"
 
 
 def _tool(name, desc, props=None, req=None):
@@ -208,6 +243,7 @@ def create_mcp_server() -> Server:
     async def call_tool(name: str, arguments: dict[str, Any]) -> list[types.ContentBlock]:
         try:
             result = await _dispatch(name, arguments)
+            _invalidate_lists(name)
             return [types.TextContent(type="text", text=_to_json(result))]
         except Exception as e:
             logger.error(f"MCP tool '{name}' failed: {e}")
@@ -216,8 +252,32 @@ def create_mcp_server() -> Server:
     return app
 
 
+# Write tools that change what the REST list endpoints return
+_ALWAYS_LOAD_WRITES = {"create_always_load", "update_always_load", "delete_always_load"}
+_PROJECT_WRITES = {"create_project", "update_project", "delete_project"}
+_HINT_WRITES = {"create_hint_category", "create_hint", "update_hint", "delete_hint"}
+_WIKI_WRITES = {"create_wiki", "update_wiki", "delete_wiki", "create_wiki_section", "update_wiki_section", "delete_wiki_section"}
+_SHARE_WRITES = {"share_object", "revoke_share"}
+_HANDOFF_WRITES = {"create_handoff", "pickup_handoff", "delete_handoff"}
+
+
+def _invalidate_lists(name: str) -> None:
+    if name in _ALWAYS_LOAD_WRITES:
+        always_load_trees.clear()
+    elif name in _PROJECT_WRITES:
+        project_lists.clear()
+    elif name in _HINT_WRITES:
+        hint_lists.clear()
+    elif name in _WIKI_WRITES:
+        wiki_lists.clear()
+    elif name in _SHARE_WRITES:
+        invalidate_shares()
+    elif name in _HANDOFF_WRITES:
+        handoff_lists.clear()
+
+
 async def _dispatch(name: str, args: dict[str, Any]) -> Any:
-    pool = await get_pool()
+    pool = get_pool()
     agent_key = args.pop("agent_key", None)
     caller = await _get_caller(agent_key)
 
@@ -232,27 +292,25 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
-        al = await pool.fetch("SELECT pkid, parent_id, title FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid", agent["agent_id"])
+        al = [{"pkid": r["pkid"], "parent_id": r["parent_id"], "title": r["title"]} for r in await always_load_tree(agent["agent_id"])]
         mem = await pool.fetch("SELECT pkid, title FROM memories WHERE agent_id = $1 ORDER BY pkid", agent["agent_id"])
         pref = await pool.fetch("SELECT pkid, title FROM preferences WHERE agent_id = $1 AND parent_id = 0 ORDER BY pkid", agent["agent_id"])
         proj = await pool.fetch("SELECT p.project_id, p.title, ps.code as status FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.user_id = $1 ORDER BY p.project_id", caller["user_id"])
-        return {"agent": args["agent_name"], "always_load": [dict(r) for r in al], "memories": [dict(r) for r in mem], "preferences_manifest": [dict(r) for r in pref], "projects_manifest": [dict(r) for r in proj]}
+        return {"agent": args["agent_name"], "always_load": al, "memories": mem, "preferences_manifest": pref, "projects_manifest": proj}
 
     # ── Always Load ───────────────────────────────────────────────
     if name == "get_always_load":
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
-        rows = await pool.fetch("SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid", agent["agent_id"])
-        return {"agent": args["agent_name"], "always_load": [dict(r) for r in rows]}
+        return {"agent": args["agent_name"], "always_load": await always_load_tree(agent["agent_id"])}
 
     if name == "get_always_load_item":
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
-        node = await pool.fetchrow("SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND pkid = $2", agent["agent_id"], args["pkid"])
-        children = await pool.fetch("SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid", agent["agent_id"], args["pkid"])
-        return {"node": dict(node) if node else None, "children": [dict(r) for r in children]}
+        node, children = await always_load_item(agent["agent_id"], args["pkid"])
+        return {"node": node, "children": children}
 
     if name == "create_always_load":
         agent = await _get_agent(args["agent_name"], caller)
@@ -261,7 +319,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may write to its always_load"}
         row = await pool.fetchrow("INSERT INTO always_load (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, parent_id, title", agent["agent_id"], args.get("parent_id", 0), args["title"], args.get("description"))
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "update_always_load":
         agent = await _get_agent(args["agent_name"], caller)
@@ -269,16 +327,12 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may modify its always_load"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_ALWAYS_LOAD_UPDATES, _TEXT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.extend([agent["agent_id"], args["pkid"]])
-        row = await pool.fetchrow(f"UPDATE always_load SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title", *values)
-        return {"updated": dict(row)} if row else {"error": "Node not found"}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, agent["agent_id"], args["pkid"])
+        return {"updated": row} if row else {"error": "Node not found"}
 
     if name == "delete_always_load":
         agent = await _get_agent(args["agent_name"], caller)
@@ -286,8 +340,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may delete its always_load"}
-        result = await pool.execute("WITH RECURSIVE subtree AS (SELECT pkid FROM always_load WHERE agent_id = $1 AND pkid = $2 UNION ALL SELECT a.pkid FROM always_load a INNER JOIN subtree s ON a.parent_id = s.pkid WHERE a.agent_id = $1) DELETE FROM always_load WHERE pkid IN (SELECT pkid FROM subtree)", agent["agent_id"], args["pkid"])
-        count = int(result.split()[-1])
+        count = await pool.fetchval("WITH d AS (DELETE FROM always_load WHERE agent_id = $1 AND path <@ (SELECT path FROM always_load WHERE agent_id = $1 AND pkid = $2) RETURNING pkid) SELECT count(*) FROM d", agent["agent_id"], args["pkid"])
         return {"deleted": args["pkid"], "descendants_deleted": count - 1} if count > 0 else {"error": "Node not found"}
 
     # ── Memories ──────────────────────────────────────────────────
@@ -296,14 +349,14 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if not agent:
             return {"error": "Agent not found or access denied"}
         rows = await pool.fetch("SELECT pkid, title, description, created_at FROM memories WHERE agent_id = $1 ORDER BY pkid", agent["agent_id"])
-        return {"agent": args["agent_name"], "memories": [dict(r) for r in rows]}
+        return {"agent": args["agent_name"], "memories": rows}
 
     if name == "get_memory":
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
         row = await pool.fetchrow("SELECT pkid, title, description, created_at FROM memories WHERE agent_id = $1 AND pkid = $2", agent["agent_id"], args["pkid"])
-        return dict(row) if row else {"error": "Memory not found"}
+        return row if row else {"error": "Memory not found"}
 
     if name == "create_memory":
         agent = await _get_agent(args["agent_name"], caller)
@@ -312,7 +365,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may write to its memories"}
         row = await pool.fetchrow("INSERT INTO memories (agent_id, title, description) VALUES ($1, $2, $3) RETURNING pkid, title, created_at", agent["agent_id"], args["title"], args.get("description"))
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "update_memory":
         agent = await _get_agent(args["agent_name"], caller)
@@ -320,15 +373,12 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may modify its memories"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_MEMORY_UPDATES, _TEXT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        values.extend([agent["agent_id"], args["pkid"]])
-        row = await pool.fetchrow(f"UPDATE memories SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title", *values)
-        return {"updated": dict(row)} if row else {"error": "Memory not found"}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, agent["agent_id"], args["pkid"])
+        return {"updated": row} if row else {"error": "Memory not found"}
 
     if name == "delete_memory":
         agent = await _get_agent(args["agent_name"], caller)
@@ -336,8 +386,8 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may delete its memories"}
-        result = await pool.execute("DELETE FROM memories WHERE agent_id = $1 AND pkid = $2", agent["agent_id"], args["pkid"])
-        return {"deleted": args["pkid"]} if result != "DELETE 0" else {"error": "Memory not found"}
+        deleted = await pool.fetchval("DELETE FROM memories WHERE agent_id = $1 AND pkid = $2 RETURNING 1", agent["agent_id"], args["pkid"])
+        return {"deleted": args["pkid"]} if deleted is not None else {"error": "Memory not found"}
 
     # ── Preferences ───────────────────────────────────────────────
     if name == "get_preferences":
@@ -345,7 +395,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if not agent:
             return {"error": "Agent not found or access denied"}
         rows = await pool.fetch("SELECT pkid, title FROM preferences WHERE agent_id = $1 AND parent_id = 0 ORDER BY pkid", agent["agent_id"])
-        return {"agent": args["agent_name"], "preferences": [dict(r) for r in rows]}
+        return {"agent": args["agent_name"], "preferences": rows}
 
     if name == "get_preference":
         agent = await _get_agent(args["agent_name"], caller)
@@ -355,7 +405,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if not node:
             return {"error": "Preference not found"}
         children = await pool.fetch("SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid", agent["agent_id"], args["pkid"])
-        return {"node": dict(node), "children": [dict(r) for r in children]}
+        return {"node": node, "children": children}
 
     if name == "create_preference":
         agent = await _get_agent(args["agent_name"], caller)
@@ -364,7 +414,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may write to its preferences"}
         row = await pool.fetchrow("INSERT INTO preferences (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, title", agent["agent_id"], args.get("parent_id", 0), args["title"], args.get("description"))
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "update_preference":
         agent = await _get_agent(args["agent_name"], caller)
@@ -372,16 +422,12 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may modify its preferences"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_PREFERENCE_UPDATES, _TEXT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.extend([agent["agent_id"], args["pkid"]])
-        row = await pool.fetchrow(f"UPDATE preferences SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title", *values)
-        return {"updated": dict(row)} if row else {"error": "Preference not found"}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, agent["agent_id"], args["pkid"])
+        return {"updated": row} if row else {"error": "Preference not found"}
 
     if name == "delete_preference":
         agent = await _get_agent(args["agent_name"], caller)
@@ -389,14 +435,12 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
             return {"error": "Only the named agent may delete its preferences"}
-        result = await pool.execute("WITH RECURSIVE subtree AS (SELECT pkid FROM preferences WHERE agent_id = $1 AND pkid = $2 UNION ALL SELECT p.pkid FROM preferences p INNER JOIN subtree s ON p.parent_id = s.pkid WHERE p.agent_id = $1) DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree)", agent["agent_id"], args["pkid"])
-        count = int(result.split()[-1])
+        count = await pool.fetchval("WITH RECURSIVE subtree AS (SELECT pkid FROM preferences WHERE agent_id = $1 AND pkid = $2 UNION ALL SELECT p.pkid FROM preferences p INNER JOIN subtree s ON p.parent_id = s.pkid WHERE p.agent_id = $1), d AS (DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree) RETURNING pkid) SELECT count(*) FROM d", agent["agent_id"], args["pkid"])
         return {"deleted": args["pkid"], "descendants_deleted": count - 1} if count > 0 else {"error": "Preference not found"}
 
     # ── Projects ──────────────────────────────────────────────────
     if name == "get_project_statuses":
-        rows = await pool.fetch("SELECT status_id, code, label, sort_order FROM project_statuses ORDER BY sort_order")
-        return {"statuses": [dict(r) for r in rows]}
+        return {"statuses": project_statuses}
 
     if name == "get_projects":
         status_filter = args.get("status")
@@ -423,7 +467,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         return {"project": proj, "sections": secs}
 
     if name == "get_section":
-        project = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
+        project = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
         if not project:
             return {"error": "Project not found"}
         pid = args["project_id"]
@@ -432,119 +476,92 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "Section not found"}
         sec = dict(node)
         children = await pool.fetch("SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 AND parent_id = $2 ORDER BY section_id", pid, args["section_id"])
-        return {"section": sec, "children": [dict(r) for r in children]}
+        return {"section": sec, "children": children}
 
     if name == "create_project":
         status_id = args.get("status_id")
         if status_id is not None:
-            row = await pool.fetchrow("INSERT INTO projects (user_id, title, description, status_id) VALUES ($1, $2, $3, $4) RETURNING project_id, title", caller["user_id"], args["title"], args.get("description"), status_id)
+            row = await pool.fetchrow("INSERT INTO projects (user_id, title, description, status_id) VALUES ($1, $2, $3, $4) RETURNING project_id, title, status_id", caller["user_id"], args["title"], args.get("description"), status_id)
         else:
-            row = await pool.fetchrow("INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title", caller["user_id"], args["title"], args.get("description"))
-        result = dict(row)
-        ps = await pool.fetchrow("SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1", result["project_id"])
-        if ps:
-            result["status"] = ps["status"]
-            result["status_label"] = ps["status_label"]
-        return {"created": result}
+            row = await pool.fetchrow("INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title, status_id", caller["user_id"], args["title"], args.get("description"))
+        return {"created": with_status(row)}
 
     if name == "create_section":
-        project = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
+        project = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
         if not project:
             return {"error": "Project not found"}
         row = await pool.fetchrow("INSERT INTO project_sections (project_id, parent_id, title, description, file_path) VALUES ($1, $2, $3, $4, $5) RETURNING section_id, title", args["project_id"], args.get("parent_id", 0), args["title"], args.get("description"), args.get("file_path"))
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "update_project":
-        existing = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
+        existing = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
         if not existing:
             return {"error": "Project not found"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if "status_id" in args:
-            updates.append(f"status_id = ${idx}"); values.append(args["status_id"]); idx += 1
-        if not updates:
+        update = _pick_update(_PROJECT_UPDATES, _PROJECT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.append(args["project_id"])
-        row = await pool.fetchrow(f"UPDATE projects SET {', '.join(updates)} WHERE project_id = ${idx} RETURNING project_id, title", *values)
-        result = dict(row)
-        ps = await pool.fetchrow("SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1", args["project_id"])
-        if ps:
-            result["status"] = ps["status"]
-            result["status_label"] = ps["status_label"]
-        return {"updated": result}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, args["project_id"])
+        return {"updated": with_status(row)}
 
     if name == "update_section":
-        project = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
+        project = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
         if not project:
             return {"error": "Project not found"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description", "file_path"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_SECTION_UPDATES, _SECTION_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.extend([args["project_id"], args["section_id"]])
-        row = await pool.fetchrow(f"UPDATE project_sections SET {', '.join(updates)} WHERE project_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title", *values)
-        return {"updated": dict(row)} if row else {"error": "Section not found"}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, args["project_id"], args["section_id"])
+        return {"updated": row} if row else {"error": "Section not found"}
 
     if name == "delete_project":
-        project = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
-        if not project:
+        count = await pool.fetchval("WITH p AS (DELETE FROM projects WHERE project_id = $1 AND user_id = $2 RETURNING project_id), s AS (DELETE FROM project_sections WHERE project_id IN (SELECT project_id FROM p) RETURNING 1) SELECT (SELECT count(*) FROM s) FROM p", args["project_id"], caller["user_id"])
+        if count is None:
             return {"error": "Project not found"}
-        sec_result = await pool.execute("DELETE FROM project_sections WHERE project_id = $1", args["project_id"])
-        await pool.execute("DELETE FROM projects WHERE project_id = $1", args["project_id"])
-        return {"deleted": args["project_id"], "sections_deleted": int(sec_result.split()[-1])}
+        return {"deleted": args["project_id"], "sections_deleted": count}
 
     if name == "delete_section":
-        project = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
+        project = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", args["project_id"], caller["user_id"])
         if not project:
             return {"error": "Project not found"}
-        result = await pool.execute("WITH RECURSIVE subtree AS (SELECT section_id FROM project_sections WHERE project_id = $1 AND section_id = $2 UNION ALL SELECT ps.section_id FROM project_sections ps INNER JOIN subtree s ON ps.parent_id = s.section_id WHERE ps.project_id = $1) DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree)", args["project_id"], args["section_id"])
-        count = int(result.split()[-1])
+        count = await pool.fetchval("WITH RECURSIVE subtree AS (SELECT section_id FROM project_sections WHERE project_id = $1 AND section_id = $2 UNION ALL SELECT ps.section_id FROM project_sections ps INNER JOIN subtree s ON ps.parent_id = s.section_id WHERE ps.project_id = $1), d AS (DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree) RETURNING 1) SELECT count(*) FROM d", args["project_id"], args["section_id"])
         return {"deleted": args["section_id"], "descendants_deleted": count - 1} if count > 0 else {"error": "Section not found"}
 
     # ── Hints (user-scoped) ────────────────────────────────────────
     if name == "get_hints":
         rows = await pool.fetch("SELECT hint_id, parent_id, title, description FROM hints WHERE user_id = $1 ORDER BY parent_id, hint_id", caller["user_id"])
-        return {"hints": [dict(r) for r in rows]}
+        return {"hints": rows}
 
     if name == "get_hints_compact":
         rows = await pool.fetch("SELECT hint_id, parent_id, title FROM hints WHERE user_id = $1 ORDER BY parent_id, hint_id", caller["user_id"])
-        return {"hints": [dict(r) for r in rows]}
+        return {"hints": rows}
 
     if name == "get_hint":
-        node = await pool.fetchrow("SELECT hint_id, parent_id, title, description FROM hints WHERE user_id = $1 AND hint_id = $2", caller["user_id"], args["hint_id"])
-        if not node:
+        # Node first, then its children, in one query
+        rows = await pool.fetch("SELECT hint_id, parent_id, title, description FROM hints WHERE user_id = $1 AND (hint_id = $2 OR parent_id = $2) ORDER BY hint_id <> $2, hint_id", caller["user_id"], args["hint_id"])
+        if not rows or rows[0]["hint_id"] != args["hint_id"]:
             return {"error": "Hint not found"}
-        children = await pool.fetch("SELECT hint_id, parent_id, title, description FROM hints WHERE user_id = $1 AND parent_id = $2 ORDER BY hint_id", caller["user_id"], args["hint_id"])
-        return {"node": dict(node), "children": [dict(r) for r in children]}
+        return {"node": rows[0], "children": rows[1:]}
 
     if name == "create_hint_category":
+        # The hints_root_category trigger sets hint_category_id to the new hint_id
         row = await pool.fetchrow(
-            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title",
+            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title, hint_category_id",
             caller["user_id"], args["title"], args.get("description")
         )
-        await pool.execute("UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1", row["hint_id"])
-        result = dict(row)
-        result["hint_category_id"] = row["hint_id"]
-        return {"created": result}
+        return {"created": row}
 
     if name == "create_hint":
         parent_id = args.get("parent_id", 0)
         if parent_id == 0:
             # Root category — use create_hint_category instead, but handle for backward compat
+            # The hints_root_category trigger sets hint_category_id to the new hint_id
             row = await pool.fetchrow(
-                "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title",
+                "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title, hint_category_id",
                 caller["user_id"], args["title"], args.get("description")
             )
-            await pool.execute("UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1", row["hint_id"])
-            result = dict(row)
-            result["hint_category_id"] = row["hint_id"]
-            return {"created": result}
+            return {"created": row}
         else:
             # Child hint — look up parent to get hint_category_id
             parent = await pool.fetchrow("SELECT hint_id, user_id, hint_category_id FROM hints WHERE hint_id = $1", parent_id)
@@ -556,23 +573,18 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
                 "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, $2, $3, $4, $5) RETURNING hint_id, parent_id, title, hint_category_id",
                 parent["user_id"], parent_id, args["title"], args.get("description"), parent["hint_category_id"]
             )
-            return {"created": dict(row)}
+            return {"created": row}
 
     if name == "update_hint":
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_HINT_UPDATES, _TEXT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.extend([caller["user_id"], args["hint_id"]])
-        row = await pool.fetchrow(f"UPDATE hints SET {', '.join(updates)} WHERE user_id = ${idx} AND hint_id = ${idx + 1} RETURNING hint_id, title", *values)
-        return {"updated": dict(row)} if row else {"error": "Hint not found"}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, caller["user_id"], args["hint_id"])
+        return {"updated": row} if row else {"error": "Hint not found"}
 
     if name == "delete_hint":
-        result = await pool.execute("WITH RECURSIVE subtree AS (SELECT hint_id FROM hints WHERE user_id = $1 AND hint_id = $2 UNION ALL SELECT h.hint_id FROM hints h INNER JOIN subtree s ON h.parent_id = s.hint_id WHERE h.user_id = $1) DELETE FROM hints WHERE hint_id IN (SELECT hint_id FROM subtree)", caller["user_id"], args["hint_id"])
-        count = int(result.split()[-1])
+        count = await pool.fetchval("WITH d AS (DELETE FROM hints WHERE user_id = $1 AND path <@ (SELECT path FROM hints WHERE user_id = $1 AND hint_id = $2) RETURNING 1) SELECT count(*) FROM d", caller["user_id"], args["hint_id"])
         return {"deleted": args["hint_id"], "descendants_deleted": count - 1} if count > 0 else {"error": "Hint not found"}
 
     # ── Wikis (user-scoped) ─────────────────────────────────────────
@@ -592,49 +604,32 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         wid = args["wiki_id"]
         wiki_dict = dict(wiki)
         wiki_dict["url"] = _browse_url(f"/wikis/{wid}/document", agent_key)
-        sections = await pool.fetch("SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 ORDER BY parent_id, section_id", wid)
-        section_ids = [r["section_id"] for r in sections]
-        tags_by_section: dict[int, list[str]] = {sid: [] for sid in section_ids}
-        if section_ids:
-            tag_rows = await pool.fetch("SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag", section_ids)
-            for tr in tag_rows:
-                tags_by_section[tr["section_id"]].append(tr["tag"])
-        section_list = []
-        for r in sections:
-            s = dict(r)
-            s["tags"] = tags_by_section.get(r["section_id"], [])
-            section_list.append(s)
-        return {"wiki": wiki_dict, "sections": section_list}
+        sections = await pool.fetch("SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at, COALESCE(array_agg(wst.tag ORDER BY wst.tag) FILTER (WHERE wst.tag IS NOT NULL), '{}') AS tags FROM wiki_sections ws LEFT JOIN wiki_section_tags wst ON wst.section_id = ws.section_id WHERE ws.wiki_id = $1 GROUP BY ws.section_id ORDER BY ws.parent_id, ws.section_id", wid)
+        return {"wiki": wiki_dict, "sections": sections}
 
     if name == "create_wiki":
         row = await pool.fetchrow("INSERT INTO wikis (user_id, title, description) VALUES ($1, $2, $3) RETURNING wiki_id, title", caller["user_id"], args["title"], args.get("description"))
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "update_wiki":
-        existing = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        existing = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not existing:
             return {"error": "Wiki not found"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        if not updates:
+        update = _pick_update(_WIKI_UPDATES, _TEXT_FIELDS, args)
+        if not update:
             return {"error": "No fields to update"}
-        updates.append("updated_at = NOW()")
-        values.append(args["wiki_id"])
-        row = await pool.fetchrow(f"UPDATE wikis SET {', '.join(updates)} WHERE wiki_id = ${idx} RETURNING wiki_id, title", *values)
-        return {"updated": dict(row)}
+        sql, values = update
+        row = await pool.fetchrow(sql, *values, args["wiki_id"])
+        return {"updated": row}
 
     if name == "delete_wiki":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
-        if not wiki:
+        count = await pool.fetchval("WITH w AS (DELETE FROM wikis WHERE wiki_id = $1 AND user_id = $2 RETURNING wiki_id), s AS (DELETE FROM wiki_sections WHERE wiki_id IN (SELECT wiki_id FROM w) RETURNING 1) SELECT (SELECT count(*) FROM s) FROM w", args["wiki_id"], caller["user_id"])
+        if count is None:
             return {"error": "Wiki not found"}
-        sec_result = await pool.execute("DELETE FROM wiki_sections WHERE wiki_id = $1", args["wiki_id"])
-        await pool.execute("DELETE FROM wikis WHERE wiki_id = $1", args["wiki_id"])
-        return {"deleted": args["wiki_id"], "sections_deleted": int(sec_result.split()[-1])}
+        return {"deleted": args["wiki_id"], "sections_deleted": count}
 
     if name == "create_wiki_section":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        wiki = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not wiki:
             return {"error": "Wiki not found"}
         tags = args.get("tags") or []
@@ -642,85 +637,66 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             async with conn.transaction():
                 row = await conn.fetchrow("INSERT INTO wiki_sections (wiki_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING section_id, title", args["wiki_id"], args.get("parent_id", 0), args["title"], args.get("description"))
                 if tags:
-                    await conn.executemany("INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)", [(row["section_id"], tag) for tag in tags])
+                    await conn.execute("INSERT INTO wiki_section_tags (section_id, tag) SELECT $1, unnest($2::text[])", row["section_id"], list(tags))
                 await conn.execute("UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1", args["wiki_id"])
         result = dict(row)
         result["tags"] = tags
         return {"created": result}
 
     if name == "get_wiki_section":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        wiki = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not wiki:
             return {"error": "Wiki not found"}
         wid = args["wiki_id"]
-        node = await pool.fetchrow("SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2", wid, args["section_id"])
+        node = await pool.fetchrow("SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at, EXISTS (SELECT 1 FROM wiki_section_tags wst WHERE wst.section_id = ws.section_id) AS has_tags FROM wiki_sections ws WHERE ws.wiki_id = $1 AND ws.section_id = $2", wid, args["section_id"])
         if not node:
             return {"error": "Section not found"}
-        children = await pool.fetch("SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 AND parent_id = $2 ORDER BY section_id", wid, args["section_id"])
-        all_ids = [node["section_id"]] + [c["section_id"] for c in children]
-        tag_rows = await pool.fetch("SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag", all_ids)
-        tags_by_sec: dict[int, list[str]] = {sid: [] for sid in all_ids}
-        for tr in tag_rows:
-            tags_by_sec[tr["section_id"]].append(tr["tag"])
+        children = await pool.fetch("SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at, EXISTS (SELECT 1 FROM wiki_section_tags wst WHERE wst.section_id = ws.section_id) AS has_tags FROM wiki_sections ws WHERE ws.wiki_id = $1 AND ws.parent_id = $2 ORDER BY ws.section_id", wid, args["section_id"])
+        all_rows = [node, *children]
+        tags_by_sec: dict[int, list[str]] = {r["section_id"]: [] for r in all_rows}
+        tagged_ids = [r["section_id"] for r in all_rows if r["has_tags"]]
+        if tagged_ids:
+            tag_rows = await pool.fetch("SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag", tagged_ids)
+            for tr in tag_rows:
+                tags_by_sec[tr["section_id"]].append(tr["tag"])
         section_dict = dict(node)
+        del section_dict["has_tags"]
         section_dict["tags"] = tags_by_sec[node["section_id"]]
         children_list = []
         for c in children:
             cd = dict(c)
+            del cd["has_tags"]
             cd["tags"] = tags_by_sec[c["section_id"]]
             children_list.append(cd)
         return {"section": section_dict, "children": children_list}
 
     if name == "update_wiki_section":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        wiki = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not wiki:
             return {"error": "Wiki not found"}
-        updates, values, idx = [], [], 1
-        for field in ("title", "description"):
-            if field in args:
-                updates.append(f"{field} = ${idx}"); values.append(args[field]); idx += 1
-        has_field_updates = bool(updates)
         has_tag_updates = "tags" in args
-        if not has_field_updates and not has_tag_updates:
+        if "title" not in args and "description" not in args and not has_tag_updates:
             return {"error": "No fields to update"}
-        async with pool.acquire() as conn:
-            async with conn.transaction():
-                if has_field_updates:
-                    updates.append("updated_at = NOW()")
-                    values.extend([args["wiki_id"], args["section_id"]])
-                    row = await conn.fetchrow(f"UPDATE wiki_sections SET {', '.join(updates)} WHERE wiki_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title", *values)
-                    if not row:
-                        return {"error": "Section not found"}
-                else:
-                    row = await conn.fetchrow("UPDATE wiki_sections SET updated_at = NOW() WHERE wiki_id = $1 AND section_id = $2 RETURNING section_id, title", args["wiki_id"], args["section_id"])
-                    if not row:
-                        return {"error": "Section not found"}
-                if has_tag_updates:
-                    await conn.execute("DELETE FROM wiki_section_tags WHERE section_id = $1", args["section_id"])
-                    tags = args.get("tags") or []
-                    if tags:
-                        await conn.executemany("INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)", [(args["section_id"], tag) for tag in tags])
-                await conn.execute("UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1", args["wiki_id"])
+        tags = (args.get("tags") or []) if has_tag_updates else None
+        row = await pool.fetchrow(_UPDATE_WIKI_SECTION_SQL, args["wiki_id"], args["section_id"], args.get("title"), args.get("description"), tags, "title" in args, "description" in args)
+        if not row:
+            return {"error": "Section not found"}
         result = dict(row)
         if has_tag_updates:
             result["tags"] = args.get("tags") or []
         return {"updated": result}
 
     if name == "delete_wiki_section":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        wiki = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not wiki:
             return {"error": "Wiki not found"}
-        async with pool.acquire() as conn:
-            async with conn.transaction():
-                result = await conn.execute("WITH RECURSIVE subtree AS (SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2 UNION ALL SELECT ws.section_id FROM wiki_sections ws INNER JOIN subtree s ON ws.parent_id = s.section_id WHERE ws.wiki_id = $1) DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree)", args["wiki_id"], args["section_id"])
-                deleted_count = int(result.split()[-1])
-                if deleted_count == 0:
-                    return {"error": "Section not found"}
-                await conn.execute("UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1", args["wiki_id"])
+        deleted_count = await pool.fetchval("WITH RECURSIVE subtree AS (SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2 UNION ALL SELECT ws.section_id FROM wiki_sections ws INNER JOIN subtree s ON ws.parent_id = s.section_id WHERE ws.wiki_id = $1), d AS (DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree) RETURNING 1), touch AS (UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1 AND EXISTS (SELECT 1 FROM d)) SELECT count(*) FROM d", args["wiki_id"], args["section_id"])
+        if deleted_count == 0:
+            return {"error": "Section not found"}
         return {"deleted": args["section_id"], "descendants_deleted": deleted_count - 1}
 
     if name == "get_wiki_tags":
-        wiki = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
+        wiki = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", args["wiki_id"], caller["user_id"])
         if not wiki:
             return {"error": "Wiki not found"}
         rows = await pool.fetch("SELECT DISTINCT wst.tag FROM wiki_section_tags wst JOIN wiki_sections ws ON wst.section_id = ws.section_id WHERE ws.wiki_id = $1 ORDER BY wst.tag", args["wiki_id"])
@@ -756,17 +732,17 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             return {"error": "permission_level must be 1, 2, or 3"}
         if args["shared_to_user_id"] == caller["user_id"]:
             return {"error": "Cannot share with yourself"}
-        target = await pool.fetchrow("SELECT user_id FROM users WHERE user_id = $1", args["shared_to_user_id"])
+        target = await pool.fetchval("SELECT 1 FROM users WHERE user_id = $1", args["shared_to_user_id"])
         if not target:
             return {"error": "Target user not found"}
         otype = args["object_type_id"]
         oid = args["object_id"]
         if otype == 1:
-            owner_check = await pool.fetchrow("SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2", oid, caller["user_id"])
+            owner_check = await pool.fetchval("SELECT 1 FROM projects WHERE project_id = $1 AND user_id = $2", oid, caller["user_id"])
         elif otype == 2:
-            owner_check = await pool.fetchrow("SELECT hint_id FROM hints WHERE hint_id = $1 AND user_id = $2 AND parent_id = 0", oid, caller["user_id"])
+            owner_check = await pool.fetchval("SELECT 1 FROM hints WHERE hint_id = $1 AND user_id = $2 AND parent_id = 0", oid, caller["user_id"])
         elif otype == 3:
-            owner_check = await pool.fetchrow("SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2", oid, caller["user_id"])
+            owner_check = await pool.fetchval("SELECT 1 FROM wikis WHERE wiki_id = $1 AND user_id = $2", oid, caller["user_id"])
         if not owner_check:
             return {"error": "Object not found or you don't own it"}
         row = await pool.fetchrow(
@@ -776,7 +752,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
                RETURNING share_id, object_type_id, object_id, shared_to_user_id, permission_level""",
             caller["user_id"], args["shared_to_user_id"], otype, oid, perm
         )
-        return {"shared": dict(row)}
+        return {"shared": row}
 
     if name == "revoke_share":
         row = await pool.fetchrow(
@@ -798,7 +774,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
                ORDER BY so.object_type_id, so.object_id""",
             caller["user_id"]
         )
-        return {"shared_by_me": [dict(r) for r in rows]}
+        return {"shared_by_me": rows}
 
     if name == "get_shared_to_me":
         rows = await pool.fetch(
@@ -811,18 +787,18 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
                ORDER BY so.object_type_id, so.object_id""",
             caller["user_id"]
         )
-        return {"shared_to_me": [dict(r) for r in rows]}
+        return {"shared_to_me": rows}
 
     # ── Sessions ──────────────────────────────────────────────────
     if name == "create_session":
         row = await pool.fetchrow("INSERT INTO sessions (agent_id, project) VALUES ($1, $2) RETURNING session_id, started_at", caller["agent_id"], args.get("project"))
-        return {"session_id": row["session_id"], "agent": caller["agent_name"], "started_at": row["started_at"].isoformat(), "project": args.get("project")}
+        return {"session_id": row["session_id"], "agent": caller["agent_name"], "started_at": row["started_at"], "project": args.get("project")}
 
     if name == "get_last_session":
         row = await pool.fetchrow("SELECT session_id, started_at, project FROM sessions WHERE agent_id = $1 ORDER BY started_at DESC LIMIT 1", caller["agent_id"])
         if not row:
             return {"last_session": None}
-        return {"agent": caller["agent_name"], "last_session": {"session_id": row["session_id"], "started_at": row["started_at"].isoformat(), "project": row["project"]}}
+        return {"agent": caller["agent_name"], "last_session": {"session_id": row["session_id"], "started_at": row["started_at"], "project": row["project"]}}
 
     # ── Save ──────────────────────────────────────────────────────
     if name == "save_notes":
@@ -862,7 +838,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
     # ── Secrets (user-scoped) ────────────────────────────────────
     if name == "list_secrets":
         rows = await pool.fetch("SELECT key, created_at, updated_at FROM secrets WHERE user_id = $1 ORDER BY key", caller["user_id"])
-        return {"secrets": [dict(r) for r in rows]}
+        return {"secrets": rows}
 
     if name == "get_secret":
         row = await pool.fetchrow("SELECT key, encrypted_value FROM secrets WHERE user_id = $1 AND key = $2", caller["user_id"], args["key"])
@@ -879,7 +855,7 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             "RETURNING secret_id, key, created_at, updated_at",
             caller["user_id"], args["key"], encrypted
         )
-        return {"saved": dict(row)}
+        return {"saved": row}
 
     if name == "delete_secret":
         result = await pool.execute("DELETE FROM secrets WHERE user_id = $1 AND key = $2", caller["user_id"], args["key"])
@@ -890,73 +866,65 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
-        rows = await pool.fetch("SELECT handoff_id, title, prompt, created_at FROM handoffs WHERE agent_id = $1 AND picked_up_at IS NULL ORDER BY created_at", agent["agent_id"])
-        return {"agent": args["agent_name"], "handoffs": [dict(r) for r in rows]}
+        return {"agent": args["agent_name"], "handoffs": await pending_handoffs(agent["agent_id"])}
 
     if name == "get_handoff":
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
         row = await pool.fetchrow("SELECT handoff_id, title, prompt, created_at, picked_up_at FROM handoffs WHERE agent_id = $1 AND handoff_id = $2", agent["agent_id"], args["handoff_id"])
-        return dict(row) if row else {"error": "Handoff not found"}
+        return row if row else {"error": "Handoff not found"}
 
     if name == "create_handoff":
         agent = await _get_agent(args["agent_name"], caller)
         if not agent:
             return {"error": "Agent not found or access denied"}
         row = await pool.fetchrow("INSERT INTO handoffs (agent_id, title, prompt) VALUES ($1, $2, $3) RETURNING handoff_id, title, created_at", agent["agent_id"], args["title"], args["prompt"])
-        return {"created": dict(row)}
+        return {"created": row}
 
     if name == "pickup_handoff":
-        agent = await _get_agent(args["agent_name"], caller)
-        if not agent:
-            return {"error": "Agent not found or access denied"}
+        # Only the caller itself may pickup, so its agent_id needs no lookup
         if caller["agent_name"] != args["agent_name"]:
+            if not await _get_agent(args["agent_name"], caller):
+                return {"error": "Agent not found or access denied"}
             return {"error": "Only the named agent may pickup its handoffs"}
-        row = await pool.fetchrow("UPDATE handoffs SET picked_up_at = NOW() WHERE agent_id = $1 AND handoff_id = $2 AND picked_up_at IS NULL RETURNING handoff_id, title, picked_up_at", agent["agent_id"], args["handoff_id"])
-        return {"picked_up": dict(row)} if row else {"error": "Handoff not found or already picked up"}
+        row = await pool.fetchrow("UPDATE handoffs SET picked_up_at = NOW() WHERE agent_id = $1 AND handoff_id = $2 AND picked_up_at IS NULL RETURNING handoff_id, title, picked_up_at", caller["agent_id"], args["handoff_id"])
+        return {"picked_up": row} if row else {"error": "Handoff not found or already picked up"}
 
     if name == "delete_handoff":
-        agent = await _get_agent(args["agent_name"], caller)
-        if not agent:
-            return {"error": "Agent not found or access denied"}
         if caller["agent_name"] != args["agent_name"]:
+            if not await _get_agent(args["agent_name"], caller):
+                return {"error": "Agent not found or access denied"}
             return {"error": "Only the named agent may delete its handoffs"}
-        result = await pool.execute("DELETE FROM handoffs WHERE agent_id = $1 AND handoff_id = $2", agent["agent_id"], args["handoff_id"])
-        return {"deleted": args["handoff_id"]} if result != "DELETE 0" else {"error": "Handoff not found"}
+        deleted = await pool.fetchval("DELETE FROM handoffs WHERE agent_id = $1 AND handoff_id = $2 RETURNING 1", caller["agent_id"], args["handoff_id"])
+        return {"deleted": args["handoff_id"]} if deleted is not None else {"error": "Handoff not found"}
 
     # ── Images (Gemini) ────────────────────────────────────────────
     if name == "generate_image":
-        import httpx
         body = {"prompt": args["prompt"], "model": args.get("model", "nano-banana"), "aspect_ratio": args.get("aspect_ratio", "1:1")}
-        async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(f"{BASE_URL}/genimage", json=body, params={"agent_key": agent_key})
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().post("/genimage", json=body, params={"agent_key": agent_key}, timeout=120)
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "edit_image":
-        import httpx
         body = {"prompt": args["prompt"], "model": args.get("model", "nano-banana")}
         if "image_id" in args:
             body["image_id"] = args["image_id"]
         if "image_url" in args:
             body["image_url"] = args["image_url"]
-        async with httpx.AsyncClient(timeout=120) as client:
-            resp = await client.post(f"{BASE_URL}/genimage/edit", json=body, params={"agent_key": agent_key})
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().post("/genimage/edit", json=body, params={"agent_key": agent_key}, timeout=120)
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "analyze_image":
-        import httpx
         body = {"prompt": args.get("prompt", "Describe this image in detail")}
         if "image_id" in args:
             body["image_id"] = args["image_id"]
         if "image_url" in args:
             body["image_url"] = args["image_url"]
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(f"{BASE_URL}/genimage/analyze", json=body)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().post("/genimage/analyze", json=body, timeout=60)
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "list_images":
         params = {"agent_key": agent_key}
@@ -964,35 +932,27 @@ async def _dispatch(name: str, args: dict[str, Any]) -> Any:
             params["keep"] = str(args["keep"]).lower()
         if "limit" in args:
             params["limit"] = args["limit"]
-        import httpx
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.get(f"{BASE_URL}/images", params=params)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().get("/images", params=params)
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "keep_image":
-        import httpx
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.patch(f"{BASE_URL}/images/{args['image_id']}", json={"keep": True})
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().patch(f"/images/{args['image_id']}", json={"keep": True})
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "delete_image":
-        import httpx
         params = {}
         if args.get("force"):
             params["force"] = "true"
-        async with httpx.AsyncClient(timeout=30) as client:
-            resp = await client.delete(f"{BASE_URL}/images/{args['image_id']}", params=params)
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().delete(f"/images/{args['image_id']}", params=params)
+        resp.raise_for_status()
+        return resp.json()
 
     if name == "cleanup_images":
-        import httpx
-        async with httpx.AsyncClient(timeout=60) as client:
-            resp = await client.post(f"{BASE_URL}/images/cleanup", params={"agent_key": agent_key})
-            resp.raise_for_status()
-            return resp.json()
+        resp = await _get_http_client().post("/images/cleanup", params={"agent_key": agent_key}, timeout=60)
+        resp.raise_for_status()
+        return resp.json()
 
     # ── Google Docs ─────────────────────────────────────────────────
     if name == "create_google_doc":
@@ -1054,6 +1014,6 @@ def create_mcp_session_manager() -> StreamableHTTPSessionManager:
     return StreamableHTTPSessionManager(
         app=create_mcp_server(),
         event_store=None,
-        json_response=False,
+        json_response=True,
         stateless=True,
     )
@@ -0,0 +1,33 @@
+import asyncpg
+import orjson
+from fastapi.responses import JSONResponse, Response
+
+
+def json_default(obj):
+    """orjson fallback for types it doesn't encode natively."""
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj)
+    raise TypeError(f"Type {type(obj)} not serializable")
+
+
+def dumps(content) -> bytes:
+    """Encode content exactly as ORJSONResponse would."""
+    return orjson.dumps(content, default=json_default)
+
+
+def json_object(key: str, array: str) -> bytes:
+    """Build {key: array} around a JSON array already rendered by Postgres."""
+    return b'{"' + key.encode() + b'":' + array.encode() + b"}"
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson (datetimes encoded natively)."""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(Response):
+    """Already-encoded JSON bytes (e.g. a cached dumps() result), sent as-is."""
+
+    media_type = "application/json"
@@ -1,36 +1,95 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from ..user_auth import verify_user_token
-from ..database import get_pool
+from ..cache import always_load_trees, handoff_lists
+from ..database import get_pool, update_variants, pick_update, provided
+from ..responses import ORJSONResponse
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
 # ── Helpers ──────────────────────────────────────────────────────
 
-async def _require_user_agent(agent_name: str, user: dict) -> dict:
-    """Look up agent by name, verify it belongs to the JWT user."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, name, user_id FROM agents WHERE name = $1 AND user_id = $2",
-        agent_name, user["user_id"]
-    )
-    if not agent:
+# Every agent-scoped query starts from this CTE ($1 = agent name, $2 = JWT
+# user_id) and LEFT JOINs its target onto it, so authorization and the
+# actual read/write share one round trip. No row back means the agent does
+# not belong to the user; a NULL first column means the target is missing.
+_AGENT_CTE = "a AS (SELECT agent_id FROM agents WHERE name = $1 AND user_id = $2)"
+
+
+def _iso(column: str) -> str:
+    """Format a timestamptz as an ISO 8601 UTC string inside Postgres."""
+    return f"""to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS.US"Z"') AS {column.split('.')[-1]}"""
+
+
+def _agent_row(row, detail: str):
+    """Unpack a single row from an `a LEFT JOIN target` query."""
+    if row is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if row[0] is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return row
+
+
+def _agent_rows(rows):
+    """Unpack a list from an `a LEFT JOIN target` query, dropping the NULL placeholder."""
+    if not rows:
         raise HTTPException(status_code=404, detail="Agent not found")
-    return dict(agent)
+    return [r for r in rows if r[0] is not None]
+
+
+_TEXT_FIELDS = ("title", "description")
+
+
+def _agent_update_variants(table: str, touch_updated_at: bool) -> dict:
+    """database.update_variants for an agent-scoped row, wrapped in the agent CTE.
+
+    Parameters follow update_variants: the supplied fields, then pkid, then
+    agent name and user_id, so pick_update's values come first. The CTE is
+    renumbered per variant to bind after them.
+    """
+    variants = update_variants(table, _TEXT_FIELDS, ("pkid",), "pkid, title", touch_updated_at,
+                               guard="agent_id = (SELECT agent_id FROM a)")
+    for key, (sql, order) in variants.items():
+        name = len(order) + 2
+        variants[key] = (f"""WITH a AS (SELECT agent_id FROM agents WHERE name = ${name} AND user_id = ${name + 1}),
+    upd AS ({sql})
+    SELECT upd.pkid, upd.title FROM a LEFT JOIN upd ON true""", order)
+    return variants
+
+
+def _tree_sql(table: str) -> str:
+    """Agent-scoped walk of a parent_id hierarchy, returned in depth-first order."""
+    return f"""WITH RECURSIVE {_AGENT_CTE},
+    t AS (
+        SELECT n.pkid, n.parent_id, n.title, n.description, ARRAY[n.pkid] AS path, 0 AS depth
+        FROM {table} n JOIN a ON n.agent_id = a.agent_id
+        WHERE n.parent_id = 0
+        UNION ALL
+        SELECT c.pkid, c.parent_id, c.title, c.description, t.path || c.pkid, t.depth + 1
+        FROM {table} c JOIN t ON c.parent_id = t.pkid JOIN a ON c.agent_id = a.agent_id
+    )
+    SELECT t.pkid, t.parent_id, t.title, t.description, t.depth
+    FROM a LEFT JOIN t ON true
+    ORDER BY t.path"""
 
 
 def _build_tree(rows):
-    """Build nested tree from flat rows with parent_id."""
-    nodes = {r["pkid"]: {**dict(r), "children": []} for r in rows}
+    """Nest rows from a _tree_sql query.
+
+    Rows arrive in depth-first order, so each node's parent is the last node
+    seen one level up; a stack indexed by depth is all the state needed.
+    """
     roots = []
-    for r in rows:
-        node = nodes[r["pkid"]]
-        if r["parent_id"] == 0:
-            roots.append(node)
-        elif r["parent_id"] in nodes:
-            nodes[r["parent_id"]]["children"].append(node)
+    stack = []
+    for pkid, parent_id, title, description, depth in rows:
+        node = {"pkid": pkid, "parent_id": parent_id, "title": title,
+                "description": description, "children": []}
+        del stack[depth:]
+        (stack[-1]["children"] if depth else roots).append(node)
+        stack.append(node)
     return roots
 
 
@@ -71,11 +130,11 @@ class HandoffCreate(BaseModel):
 
 @router.get("/agents")
 async def list_agents(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
-        """
+        f"""
         SELECT a.agent_id, a.name,
-               s.session_id, s.started_at, s.project
+               s.session_id, {_iso("s.started_at")}, s.project
         FROM agents a
         LEFT JOIN LATERAL (
             SELECT session_id, started_at, project
@@ -95,288 +154,297 @@ async def list_agents(user: dict = Depends(verify_user_token)):
         if r["session_id"]:
             agent["last_session"] = {
                 "session_id": r["session_id"],
-                "started_at": r["started_at"].isoformat(),
+                "started_at": r["started_at"],
                 "project": r["project"],
             }
         else:
             agent["last_session"] = None
         agents.append(agent)
-    return {"agents": agents}
+    return ORJSONResponse({"agents": agents})
 
 
 # ── Always Load ──────────────────────────────────────────────────
 
+_GET_ALWAYS_LOAD_SQL = _tree_sql("always_load")
+
+
 @router.get("/agents/{agent_name}/always-load")
 async def get_always_load(agent_name: str, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid",
-        agent["agent_id"]
+        _GET_ALWAYS_LOAD_SQL,
+        agent_name, user["user_id"]
     )
-    return {"agent": agent_name, "tree": _build_tree(rows)}
+    return ORJSONResponse({"agent": agent_name, "tree": _build_tree(_agent_rows(rows))})
+
+
+# The node and its children in one query, split apart in Python
+_GET_ALWAYS_LOAD_ITEM_SQL = f"""WITH {_AGENT_CTE}
+    SELECT al.pkid, al.parent_id, al.title, al.description
+    FROM a LEFT JOIN always_load al ON al.agent_id = a.agent_id AND (al.pkid = $3 OR al.parent_id = $3)
+    ORDER BY al.pkid"""
 
 
 @router.get("/agents/{agent_name}/always-load/{pkid}")
 async def get_always_load_item(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    node = await pool.fetchrow(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not node:
+    pool = get_pool()
+    rows = _agent_rows(await pool.fetch(_GET_ALWAYS_LOAD_ITEM_SQL, agent_name, user["user_id"], pkid))
+    node = next((r for r in rows if r["pkid"] == pkid), None)
+    if node is None:
         raise HTTPException(status_code=404, detail="Node not found")
-    children = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid",
-        agent["agent_id"], pkid
+    return {"node": dict(node), "children": [dict(r) for r in rows if r["parent_id"] == pkid]}
+
+
+_CREATE_ALWAYS_LOAD_SQL = f"""WITH {_AGENT_CTE},
+    ins AS (
+        INSERT INTO always_load (agent_id, parent_id, title, description)
+        SELECT agent_id, $3, $4, $5 FROM a
+        RETURNING pkid, parent_id, title
     )
-    return {"node": dict(node), "children": [dict(r) for r in children]}
+    SELECT ins.pkid, ins.parent_id, ins.title FROM a LEFT JOIN ins ON true"""
 
 
 @router.post("/agents/{agent_name}/always-load")
 async def create_always_load(agent_name: str, item: AlwaysLoadCreate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "INSERT INTO always_load (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, parent_id, title",
-        agent["agent_id"], item.parent_id, item.title, item.description
-    )
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _CREATE_ALWAYS_LOAD_SQL,
+        agent_name, user["user_id"], item.parent_id, item.title, item.description
+    ), "Node not found")
+    always_load_trees.clear()
     return {"created": dict(row)}
 
 
+_UPDATE_ALWAYS_LOAD_SQL = _agent_update_variants("always_load", touch_updated_at=True)
+
+
 @router.put("/agents/{agent_name}/always-load/{pkid}")
 async def update_always_load(agent_name: str, pkid: int, item: AlwaysLoadUpdate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT pkid FROM always_load WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Node not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if item.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(item.title)
-        idx += 1
-    if item.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(item.description)
-        idx += 1
-    if not updates:
+    pool = get_pool()
+    update = pick_update(_UPDATE_ALWAYS_LOAD_SQL, provided(item, _TEXT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
-
-    updates.append("updated_at = NOW()")
-    values.append(agent["agent_id"])
-    values.append(pkid)
-    sql = f"UPDATE always_load SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = _agent_row(await pool.fetchrow(
+        sql, *values, pkid, agent_name, user["user_id"]
+    ), "Node not found")
+    always_load_trees.clear()
     return {"updated": dict(row)}
 
 
+_DELETE_ALWAYS_LOAD_SQL = f"""
+    WITH {_AGENT_CTE},
+    del AS (
+        DELETE FROM always_load x USING a
+        WHERE x.agent_id = a.agent_id
+        AND x.path <@ (SELECT al.path FROM always_load al WHERE al.agent_id = a.agent_id AND al.pkid = $3)
+        RETURNING x.pkid
+    )
+    SELECT (SELECT count(*) FROM del) AS deleted_count FROM a
+"""
+
+
 @router.delete("/agents/{agent_name}/always-load/{pkid}")
 async def delete_always_load(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    result = await pool.execute(
-        """
-        WITH RECURSIVE subtree AS (
-            SELECT pkid FROM always_load WHERE agent_id = $1 AND pkid = $2
-            UNION ALL
-            SELECT a.pkid FROM always_load a
-            INNER JOIN subtree s ON a.parent_id = s.pkid
-            WHERE a.agent_id = $1
-        )
-        DELETE FROM always_load WHERE pkid IN (SELECT pkid FROM subtree)
-        """,
-        agent["agent_id"], pkid
+    pool = get_pool()
+    row = await pool.fetchrow(
+        _DELETE_ALWAYS_LOAD_SQL,
+        agent_name, user["user_id"], pkid
     )
-    deleted_count = int(result.split()[-1])
+    if row is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    deleted_count = row["deleted_count"]
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Node not found")
+    always_load_trees.clear()
     return {"deleted": pkid, "descendants_deleted": deleted_count - 1}
 
 
 # ── Memories ─────────────────────────────────────────────────────
 
+_GET_MEMORIES_SQL = f"""WITH {_AGENT_CTE}
+    SELECT m.pkid, m.title, m.description, {_iso("m.created_at")}
+    FROM a LEFT JOIN memories m ON m.agent_id = a.agent_id
+    ORDER BY m.pkid"""
+
+
 @router.get("/agents/{agent_name}/memories")
 async def get_memories(agent_name: str, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
-        "SELECT pkid, title, description, created_at FROM memories WHERE agent_id = $1 ORDER BY pkid",
-        agent["agent_id"]
+        _GET_MEMORIES_SQL,
+        agent_name, user["user_id"]
     )
-    return {"agent": agent_name, "memories": [dict(r) for r in rows]}
+    return ORJSONResponse({"agent": agent_name, "memories": _agent_rows(rows)})
+
+
+_GET_MEMORY_SQL = f"""WITH {_AGENT_CTE}
+    SELECT m.pkid, m.title, m.description, {_iso("m.created_at")}
+    FROM a LEFT JOIN memories m ON m.agent_id = a.agent_id AND m.pkid = $3"""
 
 
 @router.get("/agents/{agent_name}/memories/{pkid}")
 async def get_memory(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "SELECT pkid, title, description, created_at FROM memories WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Memory not found")
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _GET_MEMORY_SQL,
+        agent_name, user["user_id"], pkid
+    ), "Memory not found")
     return dict(row)
 
 
+_CREATE_MEMORY_SQL = f"""WITH {_AGENT_CTE},
+    ins AS (
+        INSERT INTO memories (agent_id, title, description)
+        SELECT agent_id, $3, $4 FROM a
+        RETURNING pkid, title, created_at
+    )
+    SELECT ins.pkid, ins.title, ins.created_at FROM a LEFT JOIN ins ON true"""
+
+
 @router.post("/agents/{agent_name}/memories")
 async def create_memory(agent_name: str, memory: MemoryCreate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "INSERT INTO memories (agent_id, title, description) VALUES ($1, $2, $3) RETURNING pkid, title, created_at",
-        agent["agent_id"], memory.title, memory.description
-    )
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _CREATE_MEMORY_SQL,
+        agent_name, user["user_id"], memory.title, memory.description
+    ), "Memory not found")
     return {"created": dict(row)}
 
 
+_UPDATE_MEMORY_SQL = _agent_update_variants("memories", touch_updated_at=False)
+
+
 @router.put("/agents/{agent_name}/memories/{pkid}")
 async def update_memory(agent_name: str, pkid: int, memory: MemoryUpdate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT pkid FROM memories WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Memory not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if memory.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(memory.title)
-        idx += 1
-    if memory.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(memory.description)
-        idx += 1
-    if not updates:
+    pool = get_pool()
+    update = pick_update(_UPDATE_MEMORY_SQL, provided(memory, _TEXT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
-
-    values.append(agent["agent_id"])
-    values.append(pkid)
-    sql = f"UPDATE memories SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = _agent_row(await pool.fetchrow(
+        sql, *values, pkid, agent_name, user["user_id"]
+    ), "Memory not found")
     return {"updated": dict(row)}
 
 
+_DELETE_MEMORY_SQL = f"""WITH {_AGENT_CTE},
+    del AS (
+        DELETE FROM memories m USING a
+        WHERE m.agent_id = a.agent_id AND m.pkid = $3
+        RETURNING m.pkid
+    )
+    SELECT del.pkid FROM a LEFT JOIN del ON true"""
+
+
 @router.delete("/agents/{agent_name}/memories/{pkid}")
 async def delete_memory(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    result = await pool.execute(
-        "DELETE FROM memories WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if result == "DELETE 0":
-        raise HTTPException(status_code=404, detail="Memory not found")
+    pool = get_pool()
+    _agent_row(await pool.fetchrow(
+        _DELETE_MEMORY_SQL,
+        agent_name, user["user_id"], pkid
+    ), "Memory not found")
     return {"deleted": pkid}
 
 
 # ── Preferences ──────────────────────────────────────────────────
 
+_GET_PREFERENCES_SQL = _tree_sql("preferences")
+
+
 @router.get("/agents/{agent_name}/preferences")
 async def get_preferences(agent_name: str, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 ORDER BY parent_id, pkid",
-        agent["agent_id"]
+        _GET_PREFERENCES_SQL,
+        agent_name, user["user_id"]
     )
-    return {"agent": agent_name, "tree": _build_tree(rows)}
+    return ORJSONResponse({"agent": agent_name, "tree": _build_tree(_agent_rows(rows))})
+
+
+_GET_PREFERENCE_SQL = f"""WITH {_AGENT_CTE}
+    SELECT p.pkid, p.parent_id, p.title, p.description
+    FROM a LEFT JOIN preferences p ON p.agent_id = a.agent_id AND p.pkid = $3"""
+
+_GET_PREFERENCE_CHILDREN_SQL = f"""WITH {_AGENT_CTE}
+    SELECT p.pkid, p.parent_id, p.title, p.description
+    FROM preferences p JOIN a ON p.agent_id = a.agent_id
+    WHERE p.parent_id = $3 ORDER BY p.pkid"""
 
 
 @router.get("/agents/{agent_name}/preferences/{pkid}")
 async def get_preference(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    node = await pool.fetchrow(
-        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not node:
-        raise HTTPException(status_code=404, detail="Preference not found")
-    children = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid",
-        agent["agent_id"], pkid
+    pool = get_pool()
+    # Both queries authorize via the agent CTE, so they can run concurrently
+    node, children = await asyncio.gather(
+        pool.fetchrow(_GET_PREFERENCE_SQL, agent_name, user["user_id"], pkid),
+        pool.fetch(_GET_PREFERENCE_CHILDREN_SQL, agent_name, user["user_id"], pkid),
     )
+    node = _agent_row(node, "Preference not found")
     return {"node": dict(node), "children": [dict(r) for r in children]}
 
 
+_CREATE_PREFERENCE_SQL = f"""WITH {_AGENT_CTE},
+    ins AS (
+        INSERT INTO preferences (agent_id, parent_id, title, description)
+        SELECT agent_id, $3, $4, $5 FROM a
+        RETURNING pkid, title
+    )
+    SELECT ins.pkid, ins.title FROM a LEFT JOIN ins ON true"""
+
+
 @router.post("/agents/{agent_name}/preferences")
 async def create_preference(agent_name: str, pref: PreferenceCreate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "INSERT INTO preferences (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, title",
-        agent["agent_id"], pref.parent_id, pref.title, pref.description
-    )
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _CREATE_PREFERENCE_SQL,
+        agent_name, user["user_id"], pref.parent_id, pref.title, pref.description
+    ), "Preference not found")
     return {"created": dict(row)}
 
 
+_UPDATE_PREFERENCE_SQL = _agent_update_variants("preferences", touch_updated_at=True)
+
+
 @router.put("/agents/{agent_name}/preferences/{pkid}")
 async def update_preference(agent_name: str, pkid: int, pref: PreferenceUpdate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT pkid FROM preferences WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Preference not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if pref.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(pref.title)
-        idx += 1
-    if pref.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(pref.description)
-        idx += 1
-    if not updates:
+    pool = get_pool()
+    update = pick_update(_UPDATE_PREFERENCE_SQL, provided(pref, _TEXT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
-
-    updates.append("updated_at = NOW()")
-    values.append(agent["agent_id"])
-    values.append(pkid)
-    sql = f"UPDATE preferences SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title"
-    row = await pool.fetchrow(sql, *values)
-    if not row:
-        raise HTTPException(status_code=404, detail="Preference not found")
+    sql, values = update
+    row = _agent_row(await pool.fetchrow(
+        sql, *values, pkid, agent_name, user["user_id"]
+    ), "Preference not found")
     return {"updated": dict(row)}
 
 
+_DELETE_PREFERENCE_SQL = f"""
+    WITH RECURSIVE {_AGENT_CTE},
+    subtree AS (
+        SELECT p.pkid FROM preferences p JOIN a ON p.agent_id = a.agent_id WHERE p.pkid = $3
+        UNION ALL
+        SELECT x.pkid FROM preferences x
+        INNER JOIN subtree s ON x.parent_id = s.pkid
+        INNER JOIN a ON x.agent_id = a.agent_id
+    ),
+    del AS (
+        DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree) RETURNING pkid
+    )
+    SELECT (SELECT count(*) FROM del) AS deleted_count FROM a
+"""
+
+
 @router.delete("/agents/{agent_name}/preferences/{pkid}")
 async def delete_preference(agent_name: str, pkid: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    result = await pool.execute(
-        """
-        WITH RECURSIVE subtree AS (
-            SELECT pkid FROM preferences WHERE agent_id = $1 AND pkid = $2
-            UNION ALL
-            SELECT p.pkid FROM preferences p
-            INNER JOIN subtree s ON p.parent_id = s.pkid
-            WHERE p.agent_id = $1
-        )
-        DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree)
-        """,
-        agent["agent_id"], pkid
+    pool = get_pool()
+    row = await pool.fetchrow(
+        _DELETE_PREFERENCE_SQL,
+        agent_name, user["user_id"], pkid
     )
-    deleted_count = int(result.split()[-1])
+    if row is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    deleted_count = row["deleted_count"]
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Preference not found")
     return {"deleted": pkid, "descendants_deleted": deleted_count - 1}
@@ -384,84 +452,123 @@ async def delete_preference(agent_name: str, pkid: int, user: dict = Depends(ver
 
 # ── Handoffs ─────────────────────────────────────────────────────
 
+_LIST_HANDOFFS_SQL = f"""WITH {_AGENT_CTE}
+    SELECT h.handoff_id, h.title, h.prompt, {_iso("h.created_at")}
+    FROM a LEFT JOIN handoffs h ON h.agent_id = a.agent_id AND h.picked_up_at IS NULL
+    ORDER BY h.created_at"""
+
+
 @router.get("/agents/{agent_name}/handoffs")
 async def list_handoffs(agent_name: str, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
-        "SELECT handoff_id, title, prompt, created_at FROM handoffs WHERE agent_id = $1 AND picked_up_at IS NULL ORDER BY created_at",
-        agent["agent_id"]
+        _LIST_HANDOFFS_SQL,
+        agent_name, user["user_id"]
     )
-    return {"agent": agent_name, "handoffs": [dict(r) for r in rows]}
+    return ORJSONResponse({"agent": agent_name, "handoffs": _agent_rows(rows)})
+
+
+_GET_HANDOFF_SQL = f"""WITH {_AGENT_CTE}
+    SELECT h.handoff_id, h.title, h.prompt, {_iso("h.created_at")}, {_iso("h.picked_up_at")}
+    FROM a LEFT JOIN handoffs h ON h.agent_id = a.agent_id AND h.handoff_id = $3"""
 
 
 @router.get("/agents/{agent_name}/handoffs/{handoff_id}")
 async def get_handoff(agent_name: str, handoff_id: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "SELECT handoff_id, title, prompt, created_at, picked_up_at FROM handoffs WHERE agent_id = $1 AND handoff_id = $2",
-        agent["agent_id"], handoff_id
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Handoff not found")
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _GET_HANDOFF_SQL,
+        agent_name, user["user_id"], handoff_id
+    ), "Handoff not found")
     return dict(row)
 
 
+_CREATE_HANDOFF_SQL = f"""WITH {_AGENT_CTE},
+    ins AS (
+        INSERT INTO handoffs (agent_id, title, prompt)
+        SELECT agent_id, $3, $4 FROM a
+        RETURNING handoff_id, title, created_at
+    )
+    SELECT ins.handoff_id, ins.title, ins.created_at FROM a LEFT JOIN ins ON true"""
+
+
 @router.post("/agents/{agent_name}/handoffs")
 async def create_handoff(agent_name: str, body: HandoffCreate, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "INSERT INTO handoffs (agent_id, title, prompt) VALUES ($1, $2, $3) RETURNING handoff_id, title, created_at",
-        agent["agent_id"], body.title, body.prompt
-    )
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _CREATE_HANDOFF_SQL,
+        agent_name, user["user_id"], body.title, body.prompt
+    ), "Handoff not found")
+    handoff_lists.clear()
     return {"created": dict(row)}
 
 
+_PICKUP_HANDOFF_SQL = f"""WITH {_AGENT_CTE},
+    upd AS (
+        UPDATE handoffs h SET picked_up_at = NOW()
+        FROM a WHERE h.agent_id = a.agent_id AND h.handoff_id = $3 AND h.picked_up_at IS NULL
+        RETURNING h.handoff_id, h.title, h.picked_up_at
+    )
+    SELECT upd.handoff_id, upd.title, upd.picked_up_at FROM a LEFT JOIN upd ON true"""
+
+
 @router.put("/agents/{agent_name}/handoffs/{handoff_id}/pickup")
 async def pickup_handoff(agent_name: str, handoff_id: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "UPDATE handoffs SET picked_up_at = NOW() WHERE agent_id = $1 AND handoff_id = $2 AND picked_up_at IS NULL RETURNING handoff_id, title, picked_up_at",
-        agent["agent_id"], handoff_id
-    )
-    if not row:
-        raise HTTPException(status_code=404, detail="Handoff not found or already picked up")
+    pool = get_pool()
+    row = _agent_row(await pool.fetchrow(
+        _PICKUP_HANDOFF_SQL,
+        agent_name, user["user_id"], handoff_id
+    ), "Handoff not found or already picked up")
+    handoff_lists.clear()
     return {"picked_up": dict(row)}
 
 
+_DELETE_HANDOFF_SQL = f"""WITH {_AGENT_CTE},
+    del AS (
+        DELETE FROM handoffs h USING a
+        WHERE h.agent_id = a.agent_id AND h.handoff_id = $3
+        RETURNING h.handoff_id
+    )
+    SELECT del.handoff_id FROM a LEFT JOIN del ON true"""
+
+
 @router.delete("/agents/{agent_name}/handoffs/{handoff_id}")
 async def delete_handoff(agent_name: str, handoff_id: int, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
-    result = await pool.execute(
-        "DELETE FROM handoffs WHERE agent_id = $1 AND handoff_id = $2",
-        agent["agent_id"], handoff_id
-    )
-    if result == "DELETE 0":
-        raise HTTPException(status_code=404, detail="Handoff not found")
+    pool = get_pool()
+    _agent_row(await pool.fetchrow(
+        _DELETE_HANDOFF_SQL,
+        agent_name, user["user_id"], handoff_id
+    ), "Handoff not found")
+    handoff_lists.clear()
     return {"deleted": handoff_id}
 
 
 # ── Sessions ─────────────────────────────────────────────────────
 
+_GET_LAST_SESSION_SQL = f"""WITH {_AGENT_CTE}
+    SELECT s.session_id, {_iso("s.started_at")}, s.project
+    FROM a LEFT JOIN LATERAL (
+        SELECT session_id, started_at, project FROM sessions
+        WHERE agent_id = a.agent_id ORDER BY started_at DESC LIMIT 1
+    ) s ON true"""
+
+
 @router.get("/agents/{agent_name}/sessions/last")
 async def get_last_session(agent_name: str, user: dict = Depends(verify_user_token)):
-    agent = await _require_user_agent(agent_name, user)
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
-        "SELECT session_id, started_at, project FROM sessions WHERE agent_id = $1 ORDER BY started_at DESC LIMIT 1",
-        agent["agent_id"]
+        _GET_LAST_SESSION_SQL,
+        agent_name, user["user_id"]
     )
-    if not row:
+    if row is None:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    if row["session_id"] is None:
         return {"agent": agent_name, "last_session": None}
     return {
         "agent": agent_name,
         "last_session": {
             "session_id": row["session_id"],
-            "started_at": row["started_at"].isoformat(),
+            "started_at": row["started_at"],
             "project": row["project"],
         }
     }
@@ -1,16 +1,27 @@
+import asyncio
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
+from ..cache import TTLCache
 from ..database import get_pool
+from ..responses import ORJSONResponse
 from ..user_auth import hash_password, verify_password, create_token, verify_user_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+# Unknown usernames (or users without a password) skip the DB for a short
+# while; they still pay a bcrypt check against a dummy hash so response
+# timing doesn't reveal whether a username exists.
+_unknown_users = TTLCache(ttl=30)
+_DUMMY_HASH = hash_password("lucyapi-dummy-password")
+
 
 class LoginRequest(BaseModel):
     username: str
     password: str
 
 
+# Documents the login/refresh payload; the handlers return ORJSONResponse
+# directly, so FastAPI neither validates nor re-serializes through it
 class TokenResponse(BaseModel):
     token: str
     user_id: int
@@ -20,44 +31,55 @@ class TokenResponse(BaseModel):
 
 @router.post("/login", response_model=TokenResponse)
 async def login(req: LoginRequest):
-    pool = await get_pool()
+    if _unknown_users.get(req.username):
+        await asyncio.to_thread(verify_password, req.password, _DUMMY_HASH)
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    pool = get_pool()
     row = await pool.fetchrow(
-        "SELECT user_id, name, username, password_hash FROM users WHERE username = $1",
+        "SELECT user_id, name, username, email, password_hash FROM users WHERE username = $1",
         req.username
     )
     if not row or not row["password_hash"]:
+        _unknown_users.set(req.username, True)
+        await asyncio.to_thread(verify_password, req.password, _DUMMY_HASH)
         raise HTTPException(status_code=401, detail="Invalid credentials")
-    if not verify_password(req.password, row["password_hash"]):
+    # bcrypt blocks for tens of ms; keep it off the event loop
+    if not await asyncio.to_thread(verify_password, req.password, row["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    token = create_token(row["user_id"], row["username"])
-    return TokenResponse(
-        token=token,
-        user_id=row["user_id"],
-        username=row["username"],
-        name=row["name"]
-    )
+    token = create_token(row["user_id"], row["username"], row["name"], row["email"])
+    return ORJSONResponse({
+        "token": token,
+        "user_id": row["user_id"],
+        "username": row["username"],
+        "name": row["name"],
+    })
 
 
 @router.post("/refresh", response_model=TokenResponse)
 async def refresh(user: dict = Depends(verify_user_token)):
-    token = create_token(user["user_id"], user["username"])
-    return TokenResponse(
-        token=token,
-        user_id=user["user_id"],
-        username=user["username"],
-        name=user["name"]
+    # Requests trust the token's claims, but a new token is built from the
+    # current users row so deletions and profile changes take effect here
+    pool = get_pool()
+    row = await pool.fetchrow(
+        "SELECT user_id, name, username, email FROM users WHERE user_id = $1",
+        user["user_id"]
     )
+    if not row:
+        raise HTTPException(status_code=401, detail="User not found")
+    token = create_token(row["user_id"], row["username"], row["name"], row["email"])
+    return ORJSONResponse({
+        "token": token,
+        "user_id": row["user_id"],
+        "username": row["username"],
+        "name": row["name"],
+    })
 
 
 @router.get("/me")
 async def get_me(user: dict = Depends(verify_user_token)):
-    return {
-        "user_id": user["user_id"],
-        "name": user["name"],
-        "username": user["username"],
-        "email": user.get("email")
-    }
+    return user
 
 
 class ChangePasswordRequest(BaseModel):
@@ -67,18 +89,18 @@ class ChangePasswordRequest(BaseModel):
 
 @router.put("/password")
 async def change_password(req: ChangePasswordRequest, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT password_hash FROM users WHERE user_id = $1",
         user["user_id"]
     )
-    if not row or not verify_password(req.current_password, row["password_hash"]):
+    if not row or not await asyncio.to_thread(verify_password, req.current_password, row["password_hash"]):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
 
     if len(req.new_password) < 8:
         raise HTTPException(status_code=400, detail="New password must be at least 8 characters")
 
-    new_hash = hash_password(req.new_password)
+    new_hash = await asyncio.to_thread(hash_password, req.new_password)
     await pool.execute(
         "UPDATE users SET password_hash = $1 WHERE user_id = $2",
         new_hash, user["user_id"]
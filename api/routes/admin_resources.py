@@ -1,43 +1,30 @@
-import os
-import hashlib
+import asyncio
+import secrets
 import logging
-from datetime import datetime, timezone
-from io import BytesIO
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
-from PIL import Image as PILImage
 
-from ..user_auth import verify_user_token
-from ..database import get_pool
-from .sharing import check_share_permission
+from ..user_auth import verify_user_token, verify_operator
+from ..cache import project_lists, hint_lists, wiki_lists, invalidate_shares, project_statuses, with_status, reload_all_project_statuses
+from ..database import get_pool, json_array_sql, update_variants, pick_update, provided, warm
+from ..responses import RawJSONResponse, json_object
+from .sharing import check_share_permission, access_level, SHARE_CHECK_SQL
+from .wikis import UPDATE_WIKI_SECTION_SQL
+from .hints import GET_HINT_SQL, HINT_UPDATES, DELETE_HINT_COUNT_SQL
 from ..encryption import encrypt, decrypt
 from ..gemini import generate_image as gemini_generate
+from .. import image_store
 
 logger = logging.getLogger(__name__)
 
-IMAGES_DIR = "/opt/lucyapi/output/images"
 IMAGES_BASE_URL = "https://lucyapi.snowcapsystems.com"
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
-# ── Helpers ──────────────────────────────────────────────────────
-
-def _build_tree(rows):
-    """Build nested tree from flat rows with parent_id."""
-    nodes = {r["pkid"]: {**dict(r), "children": []} for r in rows}
-    roots = []
-    for r in rows:
-        node = nodes[r["pkid"]]
-        if r["parent_id"] == 0:
-            roots.append(node)
-        elif r["parent_id"] in nodes:
-            nodes[r["parent_id"]]["children"].append(node)
-    return roots
-
-
 # ── Pydantic models ─────────────────────────────────────────────
 
 class ProjectCreate(BaseModel):
@@ -114,18 +101,32 @@ class KeepRequest(BaseModel):
     keep: bool
 
 
+_PROJECT_FIELDS = ("title", "description", "status_id")
+_SECTION_FIELDS = ("title", "description", "file_path")
+_WIKI_FIELDS = ("title", "description")
+_HINT_FIELDS = ("title", "description")
+_PROJECT_UPDATES = update_variants("projects", _PROJECT_FIELDS, ("project_id",), "project_id, title, status_id")
+_SECTION_UPDATES = update_variants("project_sections", _SECTION_FIELDS, ("project_id", "section_id"), "section_id, title")
+_WIKI_UPDATES = update_variants("wikis", _WIKI_FIELDS, ("wiki_id",), "wiki_id, title")
+
+
 # ── Projects ────────────────────────────────────────────────────
 
 @router.get("/project-statuses")
 async def list_project_statuses(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    rows = await pool.fetch("SELECT status_id, code, label, sort_order FROM project_statuses ORDER BY sort_order")
-    return {"statuses": [dict(r) for r in rows]}
+    return {"statuses": project_statuses}
+
+
+@router.post("/project-statuses/reload")
+async def reload_project_statuses(user: dict = Depends(verify_operator)):
+    """Reload the status table in every worker process. Operators only."""
+    await reload_all_project_statuses()
+    return {"statuses": project_statuses}
 
 
 @router.get("/projects")
 async def list_projects(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'owned' as access, 3 as permission_level
            FROM projects p
@@ -145,50 +146,33 @@ async def list_projects(user: dict = Depends(verify_user_token)):
 
 @router.get("/projects/{project_id}")
 async def get_project(project_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
+    # Access, permission and the owner's first agent key (for the document
+    # link) resolved in one round trip
     project = await pool.fetchrow(
-        """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label
+        """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label,
+                  CASE WHEN p.user_id = $2 THEN 'owned' ELSE 'shared' END as access,
+                  CASE WHEN p.user_id = $2 THEN 3 ELSE so.permission_level END as permission_level,
+                  a.api_key
            FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-           WHERE p.project_id = $1 AND p.user_id = $2""",
+           LEFT JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1 AND so.shared_to_user_id = $2
+           LEFT JOIN LATERAL (
+               SELECT api_key FROM agents WHERE user_id = p.user_id ORDER BY agent_id LIMIT 1
+           ) a ON true
+           WHERE p.project_id = $1 AND (p.user_id = $2 OR so.permission_level >= 1)""",
         project_id, user["user_id"]
     )
-    access = "owned"
-    permission_level = 3
     if not project:
-        perm = await check_share_permission(pool, user["user_id"], 1, project_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-        project = await pool.fetchrow(
-            """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label
-               FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-               WHERE p.project_id = $1""",
-            project_id
-        )
-        access = "shared"
-        permission_level = perm
+        raise HTTPException(status_code=404, detail="Project not found")
 
     sections = await pool.fetch(
         "SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 ORDER BY parent_id, section_id",
         project_id
     )
-    if access == "owned":
-        agent_row = await pool.fetchrow(
-            "SELECT api_key FROM agents WHERE user_id = $1 ORDER BY agent_id LIMIT 1",
-            user["user_id"]
-        )
-    else:
-        owner_row = await pool.fetchrow(
-            "SELECT user_id FROM projects WHERE project_id = $1", project_id
-        )
-        agent_row = await pool.fetchrow(
-            "SELECT api_key FROM agents WHERE user_id = $1 ORDER BY agent_id LIMIT 1",
-            owner_row["user_id"]
-        )
 
     result = dict(project)
-    result["access"] = access
-    result["permission_level"] = permission_level
-    result["document_url"] = f"https://lucyapi.snowcapsystems.com/projects/{project_id}/document?agent_key={agent_row['api_key']}" if agent_row else None
+    api_key = result.pop("api_key")
+    result["document_url"] = f"https://lucyapi.snowcapsystems.com/projects/{project_id}/document?agent_key={api_key}" if api_key else None
     return {
         "project": result,
         "sections": [dict(r) for r in sections]
@@ -197,107 +181,66 @@ async def get_project(project_id: int, user: dict = Depends(verify_user_token)):
 
 @router.post("/projects")
 async def create_project(project: ProjectCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     if project.status_id is not None:
         row = await pool.fetchrow(
-            "INSERT INTO projects (user_id, title, description, status_id) VALUES ($1, $2, $3, $4) RETURNING project_id, title",
+            "INSERT INTO projects (user_id, title, description, status_id) VALUES ($1, $2, $3, $4) RETURNING project_id, title, status_id",
             user["user_id"], project.title, project.description, project.status_id
         )
     else:
         row = await pool.fetchrow(
-            "INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title",
+            "INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title, status_id",
             user["user_id"], project.title, project.description
         )
-    result = dict(row)
-    ps = await pool.fetchrow(
-        "SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1",
-        result["project_id"]
-    )
-    if ps:
-        result["status"] = ps["status"]
-        result["status_label"] = ps["status_label"]
-    return {"created": result}
+    project_lists.clear()
+    return {"created": with_status(row)}
 
 
 @router.put("/projects/{project_id}")
 async def update_project(project_id: int, project: ProjectUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, user["user_id"]
-    )
-    if not existing:
-        perm = await check_share_permission(pool, user["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if project.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(project.title)
-        idx += 1
-    if project.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(project.description)
-        idx += 1
-    if project.status_id is not None:
-        updates.append(f"status_id = ${idx}")
-        values.append(project.status_id)
-        idx += 1
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
 
-    if not updates:
+    update = pick_update(_PROJECT_UPDATES, provided(project, _PROJECT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(project_id)
-    sql = f"UPDATE projects SET {', '.join(updates)} WHERE project_id = ${idx} RETURNING project_id, title"
-    row = await pool.fetchrow(sql, *values)
-    result = dict(row)
-    ps = await pool.fetchrow(
-        "SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1",
-        project_id
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, project_id)
+    project_lists.clear()
+    return {"updated": with_status(row)}
+
+
+# Owner check, section delete and project delete in one statement. Yields
+# NULL when no owned project matched; the FK check runs at statement end,
+# after both deletes.
+_DELETE_PROJECT_SQL = """
+    WITH p AS (
+        DELETE FROM projects WHERE project_id = $1 AND user_id = $2 RETURNING project_id
+    ),
+    s AS (
+        DELETE FROM project_sections WHERE project_id IN (SELECT project_id FROM p) RETURNING 1
     )
-    if ps:
-        result["status"] = ps["status"]
-        result["status_label"] = ps["status_label"]
-    return {"updated": result}
+    SELECT (SELECT count(*) FROM s) FROM p
+"""
 
 
 @router.delete("/projects/{project_id}")
 async def delete_project(project_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, user["user_id"]
-    )
-    if not project:
+    pool = get_pool()
+    sections_count = await pool.fetchval(_DELETE_PROJECT_SQL, project_id, user["user_id"])
+    if sections_count is None:
         raise HTTPException(status_code=404, detail="Project not found")
-
-    sections_result = await pool.execute(
-        "DELETE FROM project_sections WHERE project_id = $1",
-        project_id
-    )
-    await pool.execute(
-        "DELETE FROM projects WHERE project_id = $1",
-        project_id
-    )
-    sections_count = int(sections_result.split()[-1])
+    project_lists.clear()
     return {"deleted": project_id, "sections_deleted": sections_count}
 
 
 @router.post("/projects/{project_id}/sections")
 async def create_section(project_id: int, section: SectionCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, user["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, user["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
 
     row = await pool.fetchrow(
         "INSERT INTO project_sections (project_id, parent_id, title, description, file_path) VALUES ($1, $2, $3, $4, $5) RETURNING section_id, title",
@@ -308,40 +251,16 @@ async def create_section(project_id: int, section: SectionCreate, user: dict = D
 
 @router.put("/projects/{project_id}/sections/{section_id}")
 async def update_section(project_id: int, section_id: int, section: SectionUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, user["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, user["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if section.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(section.title)
-        idx += 1
-    if section.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(section.description)
-        idx += 1
-    if section.file_path is not None:
-        updates.append(f"file_path = ${idx}")
-        values.append(section.file_path)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    update = pick_update(_SECTION_UPDATES, provided(section, _SECTION_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(project_id)
-    values.append(section_id)
-    sql = f"UPDATE project_sections SET {', '.join(updates)} WHERE project_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, project_id, section_id)
     if not row:
         raise HTTPException(status_code=404, detail="Section not found")
     return {"updated": dict(row)}
@@ -349,17 +268,11 @@ async def update_section(project_id: int, section_id: int, section: SectionUpdat
 
 @router.delete("/projects/{project_id}/sections/{section_id}")
 async def delete_section(project_id: int, section_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, user["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, user["user_id"], 1, project_id, 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 1, project_id, 3):
+        raise HTTPException(status_code=404, detail="Project not found")
 
-    result = await pool.execute(
+    deleted_count = await pool.fetchval(
         """
         WITH RECURSIVE subtree AS (
             SELECT section_id FROM project_sections WHERE project_id = $1 AND section_id = $2
@@ -367,12 +280,15 @@ async def delete_section(project_id: int, section_id: int, user: dict = Depends(
             SELECT ps.section_id FROM project_sections ps
             INNER JOIN subtree s ON ps.parent_id = s.section_id
             WHERE ps.project_id = $1
+        ),
+        d AS (
+            DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree)
+            RETURNING 1
         )
-        DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree)
+        SELECT count(*) FROM d
         """,
         project_id, section_id
     )
-    deleted_count = int(result.split()[-1])
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
     return {"deleted": section_id, "descendants_deleted": deleted_count - 1}
@@ -382,7 +298,7 @@ async def delete_section(project_id: int, section_id: int, user: dict = Depends(
 
 @router.get("/wikis")
 async def list_wikis(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         """SELECT wiki_id, title, description, updated_at, 'owned' as access, 3 as permission_level
            FROM wikis WHERE user_id = $1
@@ -399,15 +315,9 @@ async def list_wikis(user: dict = Depends(verify_user_token)):
 
 @router.get("/wikis/{wiki_id}/tags")
 async def get_wiki_tags(wiki_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 3, wiki_id, 1):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     rows = await pool.fetch(
         """
@@ -424,23 +334,18 @@ async def get_wiki_tags(wiki_id: int, user: dict = Depends(verify_user_token)):
 
 @router.get("/wikis/{wiki_id}")
 async def get_wiki(wiki_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     wiki = await pool.fetchrow(
-        "SELECT wiki_id, title, description, updated_at FROM wikis WHERE wiki_id = $1 AND user_id = $2",
+        """SELECT w.wiki_id, w.title, w.description, w.updated_at,
+                  CASE WHEN w.user_id = $2 THEN 'owned' ELSE 'shared' END as access,
+                  CASE WHEN w.user_id = $2 THEN 3 ELSE so.permission_level END as permission_level
+           FROM wikis w
+           LEFT JOIN shared_objects so ON so.object_id = w.wiki_id AND so.object_type_id = 3 AND so.shared_to_user_id = $2
+           WHERE w.wiki_id = $1 AND (w.user_id = $2 OR so.permission_level >= 1)""",
         wiki_id, user["user_id"]
     )
-    access = "owned"
-    permission_level = 3
     if not wiki:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-        wiki = await pool.fetchrow(
-            "SELECT wiki_id, title, description, updated_at FROM wikis WHERE wiki_id = $1",
-            wiki_id
-        )
-        access = "shared"
-        permission_level = perm
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     sections = await pool.fetch(
         "SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 ORDER BY parent_id, section_id",
@@ -463,92 +368,67 @@ async def get_wiki(wiki_id: int, user: dict = Depends(verify_user_token)):
         s["tags"] = tags_by_section.get(r["section_id"], [])
         section_list.append(s)
 
-    result = dict(wiki)
-    result["access"] = access
-    result["permission_level"] = permission_level
     return {
-        "wiki": result,
+        "wiki": dict(wiki),
         "sections": section_list
     }
 
 
 @router.post("/wikis")
 async def create_wiki(wiki: WikiCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "INSERT INTO wikis (user_id, title, description) VALUES ($1, $2, $3) RETURNING wiki_id, title",
         user["user_id"], wiki.title, wiki.description
     )
+    wiki_lists.clear()
     return {"created": dict(row)}
 
 
 @router.put("/wikis/{wiki_id}")
 async def update_wiki(wiki_id: int, wiki: WikiUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not existing:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if wiki.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(wiki.title)
-        idx += 1
-    if wiki.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(wiki.description)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
+
+    update = pick_update(_WIKI_UPDATES, provided(wiki, _WIKI_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(wiki_id)
-    sql = f"UPDATE wikis SET {', '.join(updates)} WHERE wiki_id = ${idx} RETURNING wiki_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, wiki_id)
+    wiki_lists.clear()
     return {"updated": dict(row)}
 
 
+# Owner check, section delete and wiki delete in one statement. Yields NULL
+# when no owned wiki matched; tags go with the sections via ON DELETE CASCADE.
+_DELETE_WIKI_SQL = """
+    WITH w AS (
+        DELETE FROM wikis WHERE wiki_id = $1 AND user_id = $2 RETURNING wiki_id
+    ),
+    s AS (
+        DELETE FROM wiki_sections WHERE wiki_id IN (SELECT wiki_id FROM w) RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM s) FROM w
+"""
+
+
 @router.delete("/wikis/{wiki_id}")
 async def delete_wiki(wiki_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not wiki:
+    pool = get_pool()
+    sections_count = await pool.fetchval(_DELETE_WIKI_SQL, wiki_id, user["user_id"])
+    if sections_count is None:
         raise HTTPException(status_code=404, detail="Wiki not found")
-
-    sections_result = await pool.execute(
-        "DELETE FROM wiki_sections WHERE wiki_id = $1",
-        wiki_id
-    )
-    await pool.execute(
-        "DELETE FROM wikis WHERE wiki_id = $1",
-        wiki_id
-    )
-    sections_count = int(sections_result.split()[-1])
+    wiki_lists.clear()
     return {"deleted": wiki_id, "sections_deleted": sections_count}
 
 
 @router.post("/wikis/{wiki_id}/sections")
 async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     async with pool.acquire() as conn:
         async with conn.transaction():
@@ -557,9 +437,9 @@ async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, user: di
                 wiki_id, section.parent_id, section.title, section.description
             )
             if section.tags:
-                await conn.executemany(
-                    "INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)",
-                    [(row["section_id"], tag) for tag in section.tags]
+                await conn.execute(
+                    "INSERT INTO wiki_section_tags (section_id, tag) SELECT $1, unnest($2::text[])",
+                    row["section_id"], list(section.tags)
                 )
             await conn.execute(
                 "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
@@ -568,115 +448,67 @@ async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, user: di
 
     result = dict(row)
     result["tags"] = section.tags or []
+    wiki_lists.clear()
     return {"created": result}
 
 
 @router.put("/wikis/{wiki_id}/sections/{section_id}")
 async def update_wiki_section(wiki_id: int, section_id: int, section: WikiSectionUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if section.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(section.title)
-        idx += 1
-    if section.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(section.description)
-        idx += 1
-
-    has_field_updates = bool(updates)
-    has_tag_updates = section.tags is not None
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
-    if not has_field_updates and not has_tag_updates:
+    has_tag_updates = section.tags is not None
+    if section.title is None and section.description is None and not has_tag_updates:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            if has_field_updates:
-                updates.append("updated_at = NOW()")
-                values.append(wiki_id)
-                values.append(section_id)
-                sql = f"UPDATE wiki_sections SET {', '.join(updates)} WHERE wiki_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title"
-                row = await conn.fetchrow(sql, *values)
-                if not row:
-                    raise HTTPException(status_code=404, detail="Section not found")
-            else:
-                row = await conn.fetchrow(
-                    "UPDATE wiki_sections SET updated_at = NOW() WHERE wiki_id = $1 AND section_id = $2 RETURNING section_id, title",
-                    wiki_id, section_id
-                )
-                if not row:
-                    raise HTTPException(status_code=404, detail="Section not found")
-
-            if has_tag_updates:
-                await conn.execute(
-                    "DELETE FROM wiki_section_tags WHERE section_id = $1",
-                    section_id
-                )
-                if section.tags:
-                    await conn.executemany(
-                        "INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)",
-                        [(section_id, tag) for tag in section.tags]
-                    )
-
-            await conn.execute(
-                "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
-                wiki_id
-            )
+    row = await pool.fetchrow(
+        UPDATE_WIKI_SECTION_SQL,
+        wiki_id, section_id, section.title, section.description, section.tags
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Section not found")
 
     result = dict(row)
     if has_tag_updates:
         result["tags"] = section.tags
+    wiki_lists.clear()
     return {"updated": result}
 
 
 @router.delete("/wikis/{wiki_id}/sections/{section_id}")
 async def delete_wiki_section(wiki_id: int, section_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, user["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, user["user_id"], 3, wiki_id, 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            result = await conn.execute(
-                """
-                WITH RECURSIVE subtree AS (
-                    SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2
-                    UNION ALL
-                    SELECT ws.section_id FROM wiki_sections ws
-                    INNER JOIN subtree s ON ws.parent_id = s.section_id
-                    WHERE ws.wiki_id = $1
-                )
-                DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree)
-                """,
-                wiki_id, section_id
-            )
-            deleted_count = int(result.split()[-1])
-            if deleted_count == 0:
-                raise HTTPException(status_code=404, detail="Section not found")
+    pool = get_pool()
+    if not await access_level(pool, user["user_id"], 3, wiki_id, 3):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
-            await conn.execute(
-                "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
-                wiki_id
-            )
+    # Subtree delete and wiki touch in one statement; the touch only fires
+    # when something was actually deleted
+    deleted_count = await pool.fetchval(
+        """
+        WITH RECURSIVE subtree AS (
+            SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2
+            UNION ALL
+            SELECT ws.section_id FROM wiki_sections ws
+            INNER JOIN subtree s ON ws.parent_id = s.section_id
+            WHERE ws.wiki_id = $1
+        ),
+        d AS (
+            DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree)
+            RETURNING 1
+        ),
+        touch AS (
+            UPDATE wikis SET updated_at = NOW()
+            WHERE wiki_id = $1 AND EXISTS (SELECT 1 FROM d)
+        )
+        SELECT count(*) FROM d
+        """,
+        wiki_id, section_id
+    )
+    if deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Section not found")
 
+    wiki_lists.clear()
     return {"deleted": section_id, "descendants_deleted": deleted_count - 1}
 
 
@@ -684,7 +516,7 @@ async def delete_wiki_section(wiki_id: int, section_id: int, user: dict = Depend
 
 @router.get("/hints")
 async def list_hints(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         """SELECT hint_id, parent_id, title, description, hint_category_id, 'owned' as access, 3 as permission_level
            FROM hints WHERE user_id = $1
@@ -701,60 +533,37 @@ async def list_hints(user: dict = Depends(verify_user_token)):
 
 @router.get("/hints/{hint_id}")
 async def get_hint(hint_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    node = await pool.fetchrow(
-        "SELECT hint_id, user_id, parent_id, title, description, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not node:
+    pool = get_pool()
+    rows = await pool.fetch(GET_HINT_SQL, hint_id, user["user_id"])
+    if not rows:
         raise HTTPException(status_code=404, detail="Hint not found")
-
-    if node["user_id"] != user["user_id"]:
-        perm = await check_share_permission(pool, user["user_id"], 2, node["hint_category_id"], 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    children = await pool.fetch(
-        "SELECT hint_id, parent_id, title, description, hint_category_id FROM hints WHERE parent_id = $1 ORDER BY hint_id",
-        hint_id
-    )
-    result = dict(node)
-    del result["user_id"]
-    return {"node": result, "children": [dict(r) for r in children]}
+    return {"node": dict(rows[0]), "children": [dict(r) for r in rows[1:]]}
 
 
 @router.post("/hint-categories")
 async def create_hint_category(cat: HintCategoryCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
+    # The hints_root_category trigger sets hint_category_id to the new hint_id
     row = await pool.fetchrow(
-        "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title",
+        "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title, hint_category_id",
         user["user_id"], cat.title, cat.description
     )
-    await pool.execute(
-        "UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1",
-        row["hint_id"]
-    )
-    result = dict(row)
-    result["hint_category_id"] = row["hint_id"]
-    return {"created": result}
+    hint_lists.clear()
+    return {"created": dict(row)}
 
 
 @router.post("/hints")
 async def create_hint(hint: HintCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
 
     if hint.parent_id == 0:
+        # The hints_root_category trigger sets hint_category_id to the new hint_id
         row = await pool.fetchrow(
-            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title",
+            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title, hint_category_id",
             user["user_id"], hint.title, hint.description
         )
-        await pool.execute(
-            "UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1",
-            row["hint_id"]
-        )
-        result = dict(row)
-        result["hint_category_id"] = row["hint_id"]
-        return {"created": result}
+        hint_lists.clear()
+        return {"created": dict(row)}
     else:
         parent = await pool.fetchrow(
             "SELECT hint_id, user_id, hint_category_id FROM hints WHERE hint_id = $1",
@@ -772,94 +581,49 @@ async def create_hint(hint: HintCreate, user: dict = Depends(verify_user_token))
             "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, $2, $3, $4, $5) RETURNING hint_id, parent_id, title, hint_category_id",
             parent["user_id"], hint.parent_id, hint.title, hint.description, parent["hint_category_id"]
         )
+        hint_lists.clear()
         return {"created": dict(row)}
 
 
 @router.put("/hints/{hint_id}")
 async def update_hint(hint_id: int, hint: HintUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT hint_id, user_id, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Hint not found")
-
-    if existing["user_id"] != user["user_id"]:
-        perm = await check_share_permission(pool, user["user_id"], 2, existing["hint_category_id"], 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if hint.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(hint.title)
-        idx += 1
-    if hint.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(hint.description)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    update = pick_update(HINT_UPDATES, provided(hint, _HINT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(hint_id)
-    sql = f"UPDATE hints SET {', '.join(updates)} WHERE hint_id = ${idx} RETURNING hint_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, hint_id, user["user_id"])
+    if not row:
+        raise HTTPException(status_code=404, detail="Hint not found")
+    hint_lists.clear()
     return {"updated": dict(row)}
 
 
 @router.delete("/hints/{hint_id}")
 async def delete_hint(hint_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT hint_id, user_id, parent_id, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not existing:
+    pool = get_pool()
+    deleted_count = await pool.fetchval(DELETE_HINT_COUNT_SQL, hint_id, user["user_id"])
+    if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Hint not found")
-
-    if existing["user_id"] != user["user_id"]:
-        if existing["parent_id"] == 0:
-            raise HTTPException(status_code=404, detail="Hint not found")
-        perm = await check_share_permission(pool, user["user_id"], 2, existing["hint_category_id"], 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    result = await pool.execute(
-        """
-        WITH RECURSIVE subtree AS (
-            SELECT hint_id FROM hints WHERE hint_id = $1
-            UNION ALL
-            SELECT h.hint_id FROM hints h
-            INNER JOIN subtree s ON h.parent_id = s.hint_id
-        )
-        DELETE FROM hints WHERE hint_id IN (SELECT hint_id FROM subtree)
-        """,
-        hint_id
-    )
-    deleted_count = int(result.split()[-1])
+    hint_lists.clear()
     return {"deleted": hint_id, "descendants_deleted": deleted_count - 1}
 
 
 # ── Secrets ─────────────────────────────────────────────────────
 
+_LIST_SECRETS_SQL = json_array_sql("SELECT key, created_at, updated_at FROM secrets WHERE user_id = $1 ORDER BY key")
+
+
 @router.get("/secrets")
 async def list_secrets(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    rows = await pool.fetch(
-        "SELECT key, created_at, updated_at FROM secrets WHERE user_id = $1 ORDER BY key",
-        user["user_id"]
-    )
-    return {"secrets": [dict(r) for r in rows]}
+    pool = get_pool()
+    return RawJSONResponse(json_object("secrets", await pool.fetchval(_LIST_SECRETS_SQL, user["user_id"])))
 
 
 @router.get("/secrets/{key}")
 async def get_secret(key: str, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT secret_id, key, encrypted_value, created_at, updated_at FROM secrets WHERE user_id = $1 AND key = $2",
         user["user_id"], key
@@ -871,7 +635,7 @@ async def get_secret(key: str, user: dict = Depends(verify_user_token)):
 
 @router.put("/secrets/{key}")
 async def set_secret(key: str, body: SecretCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     encrypted = encrypt(body.value)
     row = await pool.fetchrow(
         """
@@ -888,7 +652,7 @@ async def set_secret(key: str, body: SecretCreate, user: dict = Depends(verify_u
 
 @router.delete("/secrets/{key}")
 async def delete_secret(key: str, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     result = await pool.execute(
         "DELETE FROM secrets WHERE user_id = $1 AND key = $2",
         user["user_id"], key
@@ -902,7 +666,7 @@ async def delete_secret(key: str, user: dict = Depends(verify_user_token)):
 
 @router.get("/users")
 async def list_users(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         "SELECT user_id, name, username FROM users WHERE user_id != $1 ORDER BY name",
         user["user_id"]
@@ -919,49 +683,49 @@ _OBJECT_TABLES = {
 }
 
 
-@router.get("/sharing/by-me")
-async def admin_shares_by_me(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    rows = await pool.fetch(
-        """SELECT so.share_id, so.object_type_id, ot.name as object_type, so.object_id,
-                  so.shared_to_user_id, u.name as shared_to_name, so.permission_level,
-                  COALESCE(p.title, h.title, w.title) as object_title
+def _shares_sql(user_col: str, other_col: str, other_name: str) -> str:
+    """Shares where user_col = $1, with the other party's name and the object title.
+
+    shared_objects is scanned once; per row, a LATERAL lookup whose branches
+    are gated on object_type_id probes only the table the object lives in.
+    """
+    titles = "\n                UNION ALL\n                ".join(
+        f"SELECT title FROM {table} WHERE so.object_type_id = {type_id} AND {pk} = so.object_id"
+        for type_id, (table, pk) in _OBJECT_TABLES.items()
+    )
+    return f"""SELECT so.share_id, so.object_type_id, ot.name as object_type, so.object_id,
+                  so.{other_col}, u.name as {other_name}, so.permission_level,
+                  t.title as object_title
            FROM shared_objects so
            JOIN object_types ot ON so.object_type_id = ot.object_type_id
-           JOIN users u ON so.shared_to_user_id = u.user_id
-           LEFT JOIN projects p ON so.object_type_id = 1 AND so.object_id = p.project_id
-           LEFT JOIN hints h ON so.object_type_id = 2 AND so.object_id = h.hint_id
-           LEFT JOIN wikis w ON so.object_type_id = 3 AND so.object_id = w.wiki_id
-           WHERE so.shared_by_user_id = $1
-           ORDER BY so.object_type_id, so.object_id""",
-        user["user_id"]
-    )
-    return {"shares": [dict(r) for r in rows]}
+           JOIN users u ON so.{other_col} = u.user_id
+           LEFT JOIN LATERAL (
+                {titles}
+           ) t ON true
+           WHERE so.{user_col} = $1
+           ORDER BY so.object_type_id, so.object_id"""
+
+
+# Rendered to a JSON array by Postgres, so rows are never materialized as Records
+_SHARES_BY_ME_SQL = json_array_sql(_shares_sql("shared_by_user_id", "shared_to_user_id", "shared_to_name"))
+_SHARES_TO_ME_SQL = json_array_sql(_shares_sql("shared_to_user_id", "shared_by_user_id", "shared_by_name"))
+
+
+@router.get("/sharing/by-me")
+async def admin_shares_by_me(user: dict = Depends(verify_user_token)):
+    pool = get_pool()
+    return RawJSONResponse(json_object("shares", await pool.fetchval(_SHARES_BY_ME_SQL, user["user_id"])))
 
 
 @router.get("/sharing/to-me")
 async def admin_shares_to_me(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    rows = await pool.fetch(
-        """SELECT so.share_id, so.object_type_id, ot.name as object_type, so.object_id,
-                  so.shared_by_user_id, u.name as shared_by_name, so.permission_level,
-                  COALESCE(p.title, h.title, w.title) as object_title
-           FROM shared_objects so
-           JOIN object_types ot ON so.object_type_id = ot.object_type_id
-           JOIN users u ON so.shared_by_user_id = u.user_id
-           LEFT JOIN projects p ON so.object_type_id = 1 AND so.object_id = p.project_id
-           LEFT JOIN hints h ON so.object_type_id = 2 AND so.object_id = h.hint_id
-           LEFT JOIN wikis w ON so.object_type_id = 3 AND so.object_id = w.wiki_id
-           WHERE so.shared_to_user_id = $1
-           ORDER BY so.object_type_id, so.object_id""",
-        user["user_id"]
-    )
-    return {"shares": [dict(r) for r in rows]}
+    pool = get_pool()
+    return RawJSONResponse(json_object("shares", await pool.fetchval(_SHARES_TO_ME_SQL, user["user_id"])))
 
 
 @router.post("/sharing")
 async def admin_create_share(share: ShareCreate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
 
     if share.object_type_id not in _OBJECT_TABLES:
         raise HTTPException(status_code=400, detail="object_type_id must be 1 (project), 2 (hint), or 3 (wiki)")
@@ -972,19 +736,13 @@ async def admin_create_share(share: ShareCreate, user: dict = Depends(verify_use
     if share.shared_to_user_id == user["user_id"]:
         raise HTTPException(status_code=400, detail="Cannot share to yourself")
 
-    target_user = await pool.fetchrow(
-        "SELECT user_id FROM users WHERE user_id = $1",
-        share.shared_to_user_id
+    check = await pool.fetchrow(
+        SHARE_CHECK_SQL,
+        share.object_type_id, share.object_id, user["user_id"], share.shared_to_user_id
     )
-    if not target_user:
+    if not check["target_exists"]:
         raise HTTPException(status_code=404, detail="Target user not found")
-
-    table, pk_col = _OBJECT_TABLES[share.object_type_id]
-    owner = await pool.fetchrow(
-        f"SELECT {pk_col} FROM {table} WHERE {pk_col} = $1 AND user_id = $2",
-        share.object_id, user["user_id"]
-    )
-    if not owner:
+    if not check["owner"]:
         raise HTTPException(status_code=404, detail="Object not found or you are not the owner")
 
     row = await pool.fetchrow(
@@ -995,12 +753,13 @@ async def admin_create_share(share: ShareCreate, user: dict = Depends(verify_use
            RETURNING share_id, object_type_id, object_id, shared_to_user_id, permission_level""",
         user["user_id"], share.shared_to_user_id, share.object_type_id, share.object_id, share.permission_level
     )
+    invalidate_shares()
     return {"shared": dict(row)}
 
 
 @router.put("/sharing/{share_id}")
 async def admin_update_share(share_id: int, body: ShareUpdate, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
 
     if body.permission_level not in (1, 2, 3):
         raise HTTPException(status_code=400, detail="permission_level must be 1, 2, or 3")
@@ -1013,18 +772,20 @@ async def admin_update_share(share_id: int, body: ShareUpdate, user: dict = Depe
     )
     if not row:
         raise HTTPException(status_code=404, detail="Share not found or you are not the owner")
+    invalidate_shares()
     return {"updated": dict(row)}
 
 
 @router.delete("/sharing/{share_id}")
 async def admin_revoke_share(share_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     result = await pool.execute(
         "DELETE FROM shared_objects WHERE share_id = $1 AND shared_by_user_id = $2",
         share_id, user["user_id"]
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Share not found or you are not the owner")
+    invalidate_shares()
     return {"revoked": share_id}
 
 
@@ -1032,8 +793,7 @@ async def admin_revoke_share(share_id: int, user: dict = Depends(verify_user_tok
 
 def _make_filename() -> str:
     ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    short_hash = hashlib.sha256(os.urandom(16)).hexdigest()[:8]
-    return f"gen_{ts}_{short_hash}.png"
+    return f"gen_{ts}_{secrets.token_hex(4)}.png"
 
 
 def _image_url(filename: str) -> str:
@@ -1041,113 +801,166 @@ def _image_url(filename: str) -> str:
 
 
 def _img_to_dict(row) -> dict:
-    return {
-        "image_id": row["image_id"],
-        "url": _image_url(row["filename"]),
-        "filename": row["filename"],
-        "prompt": row["prompt"],
-        "model": row["model"],
-        "keep": row["keep"],
-        "size_bytes": row["size_bytes"],
-        "width": row["width"],
-        "height": row["height"],
-        "created_at": row["created_at"].isoformat() if row["created_at"] else None,
-    }
+    # created_at stays a datetime: ORJSONResponse encodes it natively
+    img = dict(row)
+    img["url"] = _image_url(row["filename"])
+    return img
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _image_cursor(row) -> str:
+    """Opaque keyset cursor for the row after which the next page starts."""
+    micros = (row["created_at"] - _EPOCH) // timedelta(microseconds=1)
+    return f"{micros}.{row['image_id']}"
+
+
+def _parse_image_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        micros, image_id = cursor.split(".")
+        return _EPOCH + timedelta(microseconds=int(micros)), int(image_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _list_images_sql(by_keep: bool, after: bool) -> str:
+    # Keyset pagination over idx_images_user_created: each page seeks
+    # straight to the cursor instead of scanning and discarding an OFFSET
+    conds = ["user_id = $1"]
+    if by_keep:
+        conds.append(f"keep = ${len(conds) + 1}")
+    if after:
+        n = len(conds) + 1
+        conds.append(f"(created_at, image_id) < (${n}, ${n + 1})")
+    return f"""SELECT image_id, filename, prompt, model, created_at, keep,
+                      size_bytes, width, height, status
+               FROM images WHERE {' AND '.join(conds)}
+               ORDER BY created_at DESC, image_id DESC
+               LIMIT ${len(conds) + (2 if after else 1)}"""
+
+
+# Keyed by (keep filter given, cursor given)
+_LIST_IMAGES_SQL = {
+    (by_keep, after): _list_images_sql(by_keep, after)
+    for by_keep in (False, True) for after in (False, True)
+}
 
 
 @router.get("/images")
 async def admin_list_images(
     keep: Optional[bool] = Query(default=None),
     limit: int = Query(default=50, ge=1, le=500),
-    offset: int = Query(default=0, ge=0),
+    cursor: Optional[str] = Query(default=None),
     user: dict = Depends(verify_user_token),
 ):
-    pool = await get_pool()
+    pool = get_pool()
 
+    params = [user["user_id"]]
     if keep is not None:
-        rows = await pool.fetch(
-            """SELECT image_id, filename, prompt, model, created_at, keep,
-                      size_bytes, width, height
-               FROM images WHERE user_id = $1 AND keep = $2
-               ORDER BY created_at DESC
-               LIMIT $3 OFFSET $4""",
-            user["user_id"], keep, limit, offset,
-        )
-    else:
-        rows = await pool.fetch(
-            """SELECT image_id, filename, prompt, model, created_at, keep,
-                      size_bytes, width, height
-               FROM images WHERE user_id = $1
-               ORDER BY created_at DESC
-               LIMIT $2 OFFSET $3""",
-            user["user_id"], limit, offset,
-        )
+        params.append(keep)
+    if cursor:
+        params.extend(_parse_image_cursor(cursor))
+    params.append(limit)
+    rows = await pool.fetch(_LIST_IMAGES_SQL[keep is not None, bool(cursor)], *params)
 
-    return {"images": [_img_to_dict(r) for r in rows]}
+    return {
+        "images": [_img_to_dict(r) for r in rows],
+        "next_cursor": _image_cursor(rows[-1]) if len(rows) == limit else None,
+    }
 
 
 @router.get("/images/{image_id}")
 async def admin_get_image(image_id: int, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """SELECT image_id, filename, prompt, model, created_at, keep,
-                  size_bytes, width, height
+                  size_bytes, width, height, status
            FROM images WHERE image_id = $1 AND user_id = $2""",
         image_id, user["user_id"],
     )
     if not row:
         raise HTTPException(status_code=404, detail="Image not found")
-    return _img_to_dict(row)
+    img = _img_to_dict(row)
+    if img["status"] == "pending" and img["created_at"] < datetime.now(timezone.utc) - image_store.STALE_PENDING:
+        # Its generation task died (e.g. a restart) without finishing the row
+        await pool.execute("UPDATE images SET status = 'failed' WHERE image_id = $1 AND status = 'pending'", image_id)
+        img["status"] = "failed"
+    return img
 
 
-@router.post("/images/generate")
-async def admin_generate_image(req: GenImageRequest, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+# Strong references to in-flight generations so they are not garbage
+# collected before they finish
+_generation_tasks: set[asyncio.Task] = set()
+
+# Seconds before a generation is abandoned; must stay under image_store.STALE_PENDING
+_GENERATION_TIMEOUT = 300
+
+
+async def _run_generation(image_id: int, filename: str, req: GenImageRequest):
+    """Generate, store and finalize a pending image row; any failure marks it failed."""
+    pool = get_pool()
 
     try:
-        result = gemini_generate(
+        result = await asyncio.wait_for(asyncio.to_thread(
+            gemini_generate,
             prompt=req.prompt,
             model=req.model,
             aspect_ratio=req.aspect_ratio,
+        ), _GENERATION_TIMEOUT)
+
+        image_bytes = result["image_bytes"]
+        await image_store.write_image(filename, image_bytes)
+        width, height = await image_store.image_size(image_bytes)
+
+        updated = await pool.fetchval(
+            """UPDATE images SET status = 'ready', model = $2, size_bytes = $3, width = $4, height = $5
+               WHERE image_id = $1
+               RETURNING image_id""",
+            image_id, result["model_used"], len(image_bytes), width, height,
         )
     except Exception as e:
-        logger.error(f"Gemini image generation failed: {e}")
-        raise HTTPException(status_code=502, detail=str(e))
-
-    image_bytes = result["image_bytes"]
-    filename = _make_filename()
-    filepath = os.path.join(IMAGES_DIR, filename)
+        logger.error(f"Image generation failed for image_id={image_id}: {e!r}")
+        try:
+            await pool.execute("UPDATE images SET status = 'failed' WHERE image_id = $1", image_id)
+        except Exception as e:
+            # Left pending; reads treat it as failed once it is stale
+            logger.error(f"Could not mark image_id={image_id} failed: {e}")
+        await image_store.remove_image(filename)
+        return
 
-    with open(filepath, "wb") as f:
-        f.write(image_bytes)
+    if updated is None:
+        # Row was deleted (e.g. by cleanup) while generating
+        await image_store.remove_image(filename)
 
-    width, height = None, None
-    try:
-        img = PILImage.open(BytesIO(image_bytes))
-        width, height = img.size
-    except Exception:
-        pass
 
-    size_bytes = len(image_bytes)
+@router.post("/images/generate", status_code=202)
+async def admin_generate_image(req: GenImageRequest, user: dict = Depends(verify_user_token)):
+    """Start a generation and return the pending image; poll GET /images/{image_id} until ready."""
+    pool = get_pool()
 
     row = await pool.fetchrow(
-        """INSERT INTO images (user_id, filename, prompt, model, size_bytes, width, height)
-           VALUES ($1, $2, $3, $4, $5, $6, $7)
-           RETURNING image_id, filename, prompt, model, created_at, keep, size_bytes, width, height""",
-        user["user_id"], filename, req.prompt, result["model_used"], size_bytes, width, height,
+        """INSERT INTO images (user_id, filename, prompt, model, size_bytes, status)
+           VALUES ($1, $2, $3, $4, 0, 'pending')
+           RETURNING image_id, filename, prompt, model, created_at, keep, size_bytes, width, height, status""",
+        user["user_id"], _make_filename(), req.prompt, req.model,
     )
 
+    task = asyncio.create_task(_run_generation(row["image_id"], row["filename"], req))
+    _generation_tasks.add(task)
+    task.add_done_callback(_generation_tasks.discard)
+
     return _img_to_dict(row)
 
 
 @router.patch("/images/{image_id}")
 async def admin_update_image(image_id: int, req: KeepRequest, user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """UPDATE images SET keep = $1
            WHERE image_id = $2 AND user_id = $3
            RETURNING image_id, filename, prompt, model, created_at, keep,
-                     size_bytes, width, height""",
+                     size_bytes, width, height, status""",
         req.keep, image_id, user["user_id"],
     )
     if not row:
@@ -1161,140 +974,121 @@ async def admin_delete_image(
     force: bool = Query(default=False),
     user: dict = Depends(verify_user_token),
 ):
-    pool = await get_pool()
+    pool = get_pool()
 
-    row = await pool.fetchrow(
-        "SELECT image_id, filename, keep FROM images WHERE image_id = $1 AND user_id = $2",
-        image_id, user["user_id"],
+    filename = await pool.fetchval(
+        """DELETE FROM images
+           WHERE image_id = $1 AND user_id = $2 AND (keep = false OR $3)
+           RETURNING filename""",
+        image_id, user["user_id"], force,
     )
-    if not row:
-        raise HTTPException(status_code=404, detail="Image not found")
-
-    if row["keep"] and not force:
+    if filename is None:
+        # Nothing deleted: only now look up whether it is missing or kept
+        exists = await pool.fetchval(
+            "SELECT 1 FROM images WHERE image_id = $1 AND user_id = $2",
+            image_id, user["user_id"],
+        )
+        if not exists:
+            raise HTTPException(status_code=404, detail="Image not found")
         raise HTTPException(
             status_code=409,
             detail=f"Image {image_id} is marked keep=true. Use ?force=true to delete.",
         )
 
-    filepath = os.path.join(IMAGES_DIR, row["filename"])
-    try:
-        os.remove(filepath)
-    except FileNotFoundError:
-        pass
-
-    await pool.execute("DELETE FROM images WHERE image_id = $1", image_id)
+    await image_store.remove_image(filename)
     return {"deleted": True, "image_id": image_id}
 
 
 @router.post("/images/cleanup")
 async def admin_cleanup_images(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
+    pool = get_pool()
 
+    # Delete the rows first and unlink whatever they pointed at
     rows = await pool.fetch(
-        "SELECT image_id, filename FROM images WHERE user_id = $1 AND keep = false",
+        f"DELETE FROM images WHERE user_id = $1 AND keep = false AND {image_store.CLEANABLE_STATUS_SQL} RETURNING filename",
         user["user_id"]
     )
 
-    if not rows:
-        return {"deleted": 0}
+    await image_store.remove_images([row["filename"] for row in rows])
 
-    for row in rows:
-        filepath = os.path.join(IMAGES_DIR, row["filename"])
-        try:
-            os.remove(filepath)
-        except FileNotFoundError:
-            pass
+    return {"deleted": len(rows)}
 
-    result = await pool.execute(
-        "DELETE FROM images WHERE user_id = $1 AND keep = false",
-        user["user_id"]
-    )
-    count = int(result.split()[-1])
 
-    return {"deleted": count}
+# ── Dashboard ──────────────────────────────────────────────────
 
+# Both dashboard queries are independent, so they run concurrently on two
+# pool connections rather than back to back
+_DASHBOARD_STATS_SQL = warm("""
+    WITH agent_count AS (
+        SELECT count(*) AS n FROM agents WHERE user_id = $1
+    ),
+    project_count AS (
+        SELECT count(*) AS n FROM (
+            SELECT project_id FROM projects WHERE user_id = $1
+            UNION
+            SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 1
+        ) t
+    ),
+    wiki_count AS (
+        SELECT count(*) AS n FROM (
+            SELECT wiki_id FROM wikis WHERE user_id = $1
+            UNION
+            SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 3
+        ) t
+    ),
+    hint_cat_count AS (
+        SELECT count(*) AS n FROM (
+            SELECT DISTINCT hint_category_id FROM hints WHERE user_id = $1 AND parent_id = 0
+            UNION
+            SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 2
+        ) t
+    ),
+    secret_count AS (
+        SELECT count(*) AS n FROM secrets WHERE user_id = $1
+    ),
+    image_count AS (
+        SELECT count(*) AS n FROM images WHERE user_id = $1
+    ),
+    handoff_count AS (
+        SELECT count(*) AS n FROM handoffs
+        WHERE agent_id IN (SELECT agent_id FROM agents WHERE user_id = $1)
+        AND picked_up_at IS NULL
+    ),
+    shared_to_me_count AS (
+        SELECT count(*) AS n FROM shared_objects WHERE shared_to_user_id = $1
+    )
+    SELECT
+        (SELECT n FROM agent_count) AS agents,
+        (SELECT n FROM project_count) AS projects,
+        (SELECT n FROM wiki_count) AS wikis,
+        (SELECT n FROM hint_cat_count) AS hint_categories,
+        (SELECT n FROM secret_count) AS secrets,
+        (SELECT n FROM image_count) AS images,
+        (SELECT n FROM handoff_count) AS pending_handoffs,
+        (SELECT n FROM shared_to_me_count) AS shared_to_me
+""", 0)
+
+_RECENT_SESSIONS_SQL = """
+    SELECT s.session_id, a.name AS agent_name, s.started_at, s.project
+    FROM sessions s
+    JOIN agents a ON a.agent_id = s.agent_id
+    WHERE a.user_id = $1
+    ORDER BY s.started_at DESC
+    LIMIT 5
+"""
 
-# ── Dashboard ──────────────────────────────────────────────────
 
 @router.get("/dashboard")
 async def admin_dashboard(user: dict = Depends(verify_user_token)):
-    pool = await get_pool()
-    stats_row = await pool.fetchrow(
-        """
-        WITH agent_count AS (
-            SELECT count(*) AS n FROM agents WHERE user_id = $1
-        ),
-        project_count AS (
-            SELECT count(*) AS n FROM (
-                SELECT project_id FROM projects WHERE user_id = $1
-                UNION
-                SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 1
-            ) t
-        ),
-        wiki_count AS (
-            SELECT count(*) AS n FROM (
-                SELECT wiki_id FROM wikis WHERE user_id = $1
-                UNION
-                SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 3
-            ) t
-        ),
-        hint_cat_count AS (
-            SELECT count(*) AS n FROM (
-                SELECT DISTINCT hint_category_id FROM hints WHERE user_id = $1 AND parent_id = 0
-                UNION
-                SELECT object_id FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = 2
-            ) t
-        ),
-        secret_count AS (
-            SELECT count(*) AS n FROM secrets WHERE user_id = $1
-        ),
-        image_count AS (
-            SELECT count(*) AS n FROM images WHERE user_id = $1
-        ),
-        handoff_count AS (
-            SELECT count(*) AS n FROM handoffs
-            WHERE agent_id IN (SELECT agent_id FROM agents WHERE user_id = $1)
-            AND picked_up_at IS NULL
-        ),
-        shared_to_me_count AS (
-            SELECT count(*) AS n FROM shared_objects WHERE shared_to_user_id = $1
-        )
-        SELECT
-            (SELECT n FROM agent_count) AS agents,
-            (SELECT n FROM project_count) AS projects,
-            (SELECT n FROM wiki_count) AS wikis,
-            (SELECT n FROM hint_cat_count) AS hint_categories,
-            (SELECT n FROM secret_count) AS secrets,
-            (SELECT n FROM image_count) AS images,
-            (SELECT n FROM handoff_count) AS pending_handoffs,
-            (SELECT n FROM shared_to_me_count) AS shared_to_me
-        """,
-        user["user_id"]
-    )
-
-    session_rows = await pool.fetch(
-        """
-        SELECT s.session_id, a.name AS agent_name, s.started_at, s.project
-        FROM sessions s
-        JOIN agents a ON a.agent_id = s.agent_id
-        WHERE a.user_id = $1
-        ORDER BY s.started_at DESC
-        LIMIT 5
-        """,
-        user["user_id"]
+    pool = get_pool()
+    stats_row, session_rows = await asyncio.gather(
+        pool.fetchrow(_DASHBOARD_STATS_SQL, user["user_id"]),
+        pool.fetch(_RECENT_SESSIONS_SQL, user["user_id"]),
     )
 
     return {
-        "stats": {
-            "agents": stats_row["agents"],
-            "projects": stats_row["projects"],
-            "wikis": stats_row["wikis"],
-            "hint_categories": stats_row["hint_categories"],
-            "secrets": stats_row["secrets"],
-            "images": stats_row["images"],
-            "pending_handoffs": stats_row["pending_handoffs"],
-            "shared_to_me": stats_row["shared_to_me"],
-        },
+        # Column aliases in _DASHBOARD_STATS_SQL are the response keys
+        "stats": dict(stats_row),
         "recent_sessions": [
             {
                 "session_id": r["session_id"],
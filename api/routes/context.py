@@ -1,59 +1,67 @@
 import os
-from fastapi import APIRouter, Depends, HTTPException
+from functools import lru_cache
+from fastapi import APIRouter, Body, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional
-from ..auth import verify_api_key
-from ..database import get_pool
+from typing import List, Optional
+from ..auth import verify_api_key, get_agent_by_name, writer_agent_id
+from ..cache import always_load_tree, always_load_trees, always_load_item
+from ..database import get_pool, update_variants, pick_update, provided, insert_many, MAX_BULK_ITEMS
+from ..responses import ORJSONResponse
 
 SAVE_TOKEN = os.environ.get("LUCYAPI_SAVE_TOKEN", "")
 
 router = APIRouter()
 
 
+BOOT_BASE_URL = "https://lucyapi.snowcapsystems.com"
+
+# Endpoint paths advertised by /boot; {name} is the calling agent, the other
+# placeholders are left for the client to fill in
+_BOOT_PATHS = {
+    "context": "/agents/{name}/context",
+    "always_load": "/agents/{name}/context/always_load",
+    "always_load_item": "/agents/{name}/context/always_load/{pkid}",
+    "memories": "/agents/{name}/memories",
+    "memory_item": "/agents/{name}/memories/{pkid}",
+    "preferences": "/agents/{name}/preferences",
+    "preference_item": "/agents/{name}/preferences/{pkid}",
+    "projects": "/projects",
+    "project_item": "/projects/{project_id}",
+    "project_section": "/projects/{project_id}/sections/{section_id}",
+    "project_document": "/projects/{project_id}/document",
+    "session_start": "/sessions",
+    "session_last": "/sessions/last",
+}
+
+
+@lru_cache(maxsize=256)
+def _boot_endpoints(name: str, agent_key: str | None) -> dict:
+    """The /boot endpoints map for one agent and key, built once per pair."""
+    suffix = f"?agent_key={agent_key}" if agent_key else ""
+    endpoints = {"time": f"{BOOT_BASE_URL}/time"}
+    endpoints.update(
+        (k, f"{BOOT_BASE_URL}{path.replace('{name}', name)}{suffix}")
+        for k, path in _BOOT_PATHS.items()
+    )
+    endpoints["save"] = {
+        "url": f"{BOOT_BASE_URL}/save/{SAVE_TOKEN}",
+        "usage": "POST JSON {subject, content} or GET with ?subject=...&content=... (URL-encoded). Emails markdown attachment to Rick."
+    }
+    return endpoints
+
+
 @router.get("/boot")
 async def boot(agent_key: str = None, caller: dict = Depends(verify_api_key)):
     """Bootstrap endpoint for mobile/web agents. Returns always_load context plus fully qualified endpoint URLs with agent_key baked in."""
     result = await get_always_load(caller["agent_name"], caller)
-    
-    base = "https://lucyapi.snowcapsystems.com"
-    key = f"agent_key={agent_key}" if agent_key else ""
-    name = caller["agent_name"]
-    
-    def url(path, has_params=False):
-        sep = "&" if has_params else "?"
-        return f"{base}{path}{sep}{key}" if key else f"{base}{path}"
-    
-    endpoints = {
-        "time": f"{base}/time",
-        "context": url(f"/agents/{name}/context"),
-        "always_load": url(f"/agents/{name}/context/always_load"),
-        "always_load_item": url(f"/agents/{name}/context/always_load/{{pkid}}"),
-        "memories": url(f"/agents/{name}/memories"),
-        "memory_item": url(f"/agents/{name}/memories/{{pkid}}"),
-        "preferences": url(f"/agents/{name}/preferences"),
-        "preference_item": url(f"/agents/{name}/preferences/{{pkid}}"),
-        "projects": url("/projects"),
-        "project_item": url("/projects/{project_id}"),
-        "project_section": url("/projects/{project_id}/sections/{section_id}"),
-        "project_document": url("/projects/{project_id}/document"),
-        "session_start": url("/sessions"),
-        "session_last": url("/sessions/last"),
-        "save": {
-            "url": f"{base}/save/{SAVE_TOKEN}",
-            "usage": "POST JSON {subject, content} or GET with ?subject=...&content=... (URL-encoded). Emails markdown attachment to Rick."
-        },
-    }
-    
-    return {"endpoints": endpoints, **result}
+    return {"endpoints": _boot_endpoints(caller["agent_name"], agent_key), **result}
 
 
 @router.get("/agents/{agent_name}/context")
 async def get_agent_context(agent_name: str, caller: dict = Depends(verify_api_key)):
     """Full context payload: always-load titles, memory titles, preferences manifest, project manifest."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
+    pool = get_pool()
+    agent = await get_agent_by_name(agent_name)
     if not agent:
         return {"error": "Agent not found"}, 404
 
@@ -61,11 +69,11 @@ async def get_agent_context(agent_name: str, caller: dict = Depends(verify_api_k
     if agent["user_id"] != caller["user_id"]:
         return {"error": "Access denied"}, 403
 
-    # Always-load: full tree (titles + descriptions for root nodes, titles only for children)
-    always_load_rows = await pool.fetch(
-        "SELECT pkid, parent_id, title FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid",
-        agent["agent_id"]
-    )
+    # Always-load: full tree, titles only (projected from the cached rows)
+    always_load_rows = [
+        {"pkid": r["pkid"], "parent_id": r["parent_id"], "title": r["title"]}
+        for r in await always_load_tree(agent["agent_id"])
+    ]
 
     # Memory titles (always-load for ambient recall)
     memory_rows = await pool.fetch(
@@ -87,54 +95,34 @@ async def get_agent_context(agent_name: str, caller: dict = Depends(verify_api_k
         agent["user_id"]
     )
 
-    return {
+    return ORJSONResponse({
         "agent": agent_name,
-        "always_load": [dict(r) for r in always_load_rows],
-        "memories": [dict(r) for r in memory_rows],
-        "preferences_manifest": [dict(r) for r in pref_rows],
-        "projects_manifest": [dict(r) for r in project_rows]
-    }
+        "always_load": always_load_rows,
+        "memories": memory_rows,
+        "preferences_manifest": pref_rows,
+        "projects_manifest": project_rows
+    })
 
 
 @router.get("/agents/{agent_name}/context/always_load")
 async def get_always_load(agent_name: str, caller: dict = Depends(verify_api_key)):
     """Full always-load tree with descriptions."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
+    agent = await get_agent_by_name(agent_name)
     if not agent or agent["user_id"] != caller["user_id"]:
         return {"error": "Not found or access denied"}, 404
 
-    rows = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 ORDER BY parent_id, pkid",
-        agent["agent_id"]
-    )
-    return {"agent": agent_name, "always_load": [dict(r) for r in rows]}
+    return {"agent": agent_name, "always_load": await always_load_tree(agent["agent_id"])}
 
 
 @router.get("/agents/{agent_name}/context/always_load/{pkid}")
 async def get_always_load_item(agent_name: str, pkid: int, caller: dict = Depends(verify_api_key)):
     """Single always-load node with its children."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
+    agent = await get_agent_by_name(agent_name)
     if not agent or agent["user_id"] != caller["user_id"]:
         return {"error": "Not found or access denied"}, 404
 
-    node = await pool.fetchrow(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    children = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM always_load WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid",
-        agent["agent_id"], pkid
-    )
-    return {
-        "node": dict(node) if node else None,
-        "children": [dict(r) for r in children]
-    }
+    node, children = await always_load_item(agent["agent_id"], pkid)
+    return {"node": node, "children": children}
 
 
 class AlwaysLoadCreate(BaseModel):
@@ -148,95 +136,77 @@ class AlwaysLoadUpdate(BaseModel):
     description: Optional[str] = None
 
 
+_ALWAYS_LOAD_FIELDS = ("title", "description")
+_ALWAYS_LOAD_UPDATES = update_variants("always_load", _ALWAYS_LOAD_FIELDS, ("agent_id", "pkid"), "pkid, title")
+
+
 @router.post("/agents/{agent_name}/context/always_load")
 async def create_always_load(agent_name: str, item: AlwaysLoadCreate, caller: dict = Depends(verify_api_key)):
     """Create an always_load node. Agent-scoped write."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may write to its always_load")
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may write to its always_load")
 
     row = await pool.fetchrow(
         "INSERT INTO always_load (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, parent_id, title",
-        agent["agent_id"], item.parent_id, item.title, item.description
+        agent_id, item.parent_id, item.title, item.description
     )
+    always_load_trees.pop(agent_id)
     return {"created": dict(row)}
 
 
+@router.post("/agents/{agent_name}/context/always_load/bulk")
+async def create_always_load_bulk(agent_name: str, items: List[AlwaysLoadCreate] = Body(..., max_length=MAX_BULK_ITEMS),
+                                  caller: dict = Depends(verify_api_key)):
+    """Create many always_load nodes in one request. Agent-scoped write."""
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may write to its always_load")
+    if not items:
+        raise HTTPException(status_code=400, detail="No items to create")
+
+    records = [(agent_id, i.parent_id, i.title, i.description) for i in items]
+    await insert_many("always_load", ["agent_id", "parent_id", "title", "description"], records)
+    always_load_trees.pop(agent_id)
+    return {"created": len(records)}
+
+
 @router.put("/agents/{agent_name}/context/always_load/{pkid}")
 async def update_always_load(agent_name: str, pkid: int, item: AlwaysLoadUpdate, caller: dict = Depends(verify_api_key)):
     """Update an always_load node. Agent-scoped write."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may modify its always_load")
-
-    existing = await pool.fetchrow(
-        "SELECT pkid FROM always_load WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Node not found")
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may modify its always_load")
 
-    updates = []
-    values = []
-    idx = 1
-    if item.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(item.title)
-        idx += 1
-    if item.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(item.description)
-        idx += 1
-
-    if not updates:
+    update = pick_update(_ALWAYS_LOAD_UPDATES, provided(item, _ALWAYS_LOAD_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(agent["agent_id"])
-    values.append(pkid)
-    sql = f"UPDATE always_load SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, agent_id, pkid)
+    if not row:
+        raise HTTPException(status_code=404, detail="Node not found")
+    always_load_trees.pop(agent_id)
     return {"updated": dict(row)}
 
 
 @router.delete("/agents/{agent_name}/context/always_load/{pkid}")
 async def delete_always_load(agent_name: str, pkid: int, caller: dict = Depends(verify_api_key)):
     """Delete an always_load node and its children. Agent-scoped write."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may delete its always_load")
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may delete its always_load")
 
-    # Recursive delete: collect entire subtree then delete in one shot
-    result = await pool.execute(
+    # Subtree delete: every row whose materialized path descends from the node
+    deleted_count = await pool.fetchval(
         """
-        WITH RECURSIVE subtree AS (
-            SELECT pkid FROM always_load WHERE agent_id = $1 AND pkid = $2
-            UNION ALL
-            SELECT a.pkid FROM always_load a
-            INNER JOIN subtree s ON a.parent_id = s.pkid
-            WHERE a.agent_id = $1
+        WITH d AS (
+            DELETE FROM always_load
+            WHERE agent_id = $1
+            AND path <@ (SELECT path FROM always_load WHERE agent_id = $1 AND pkid = $2)
+            RETURNING pkid
         )
-        DELETE FROM always_load WHERE pkid IN (SELECT pkid FROM subtree)
+        SELECT count(*) FROM d
         """,
-        agent["agent_id"], pkid
+        agent_id, pkid
     )
-    deleted_count = int(result.split()[-1])
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Node not found")
 
+    always_load_trees.pop(agent_id)
     return {"deleted": pkid, "descendants_deleted": deleted_count - 1}
@@ -5,7 +5,9 @@ Session 2: formatted documents via composition engine.
 Session 3: Drive file operations (list, create folder, move, delete, metadata).
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from functools import wraps
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel, Field
 from typing import Optional
 
@@ -50,9 +52,23 @@ class MoveFileRequest(BaseModel):
 # Helpers
 # ---------------------------------------------------------------------------
 
-def _raise_api_error(e: GoogleApiError):
-    """Convert a GoogleApiError into an HTTPException."""
-    raise HTTPException(status_code=e.status_code, detail=str(e))
+def google_errors(fn):
+    """Translate google_client failures into HTTPExceptions for a route.
+
+    GoogleApiError keeps its status, ValueError (bad composition content) is
+    a 400, and anything else from upstream is a 502.
+    """
+    @wraps(fn)
+    async def wrap(*args, **kwargs):
+        try:
+            return await fn(*args, **kwargs)
+        except GoogleApiError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=str(e))
+    return wrap
 
 
 # ---------------------------------------------------------------------------
@@ -60,70 +76,43 @@ def _raise_api_error(e: GoogleApiError):
 # ---------------------------------------------------------------------------
 
 @router.post("/google/docs")
+@google_errors
 async def create_document(request: CreateDocRequest, caller: dict = Depends(verify_api_key)):
     """Create a new Google Doc. Accepts plain text (body) or formatted content blocks."""
-    try:
-        if request.content:
-            result = await google_client.create_formatted_document(
-                caller["user_id"], request.title, request.content, request.branding or "none"
-            )
-        else:
-            result = await google_client.create_document(
-                caller["user_id"], request.title, request.body or ""
-            )
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    if request.content:
+        return await google_client.create_formatted_document(
+            caller["user_id"], request.title, request.content, request.branding or "none"
+        )
+    return await google_client.create_document(
+        caller["user_id"], request.title, request.body or ""
+    )
 
 
 @router.get("/google/docs/{doc_id}")
+@google_errors
 async def read_document(doc_id: str, caller: dict = Depends(verify_api_key)):
     """Read a Google Doc's plain text content."""
-    try:
-        result = await google_client.read_document(caller["user_id"], doc_id)
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.read_document(caller["user_id"], doc_id)
 
 
 @router.put("/google/docs/{doc_id}")
+@google_errors
 async def update_document(doc_id: str, request: UpdateDocRequest,
                           caller: dict = Depends(verify_api_key)):
     """Replace a document's content with new formatted content."""
-    try:
-        result = await google_client.update_document(
-            caller["user_id"], doc_id, request.content, request.branding or "none"
-        )
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.update_document(
+        caller["user_id"], doc_id, request.content, request.branding or "none"
+    )
 
 
 @router.patch("/google/docs/{doc_id}/append")
+@google_errors
 async def append_to_document(doc_id: str, request: AppendDocRequest,
                              caller: dict = Depends(verify_api_key)):
     """Append formatted content blocks to an existing document."""
-    try:
-        result = await google_client.append_to_document(
-            caller["user_id"], doc_id, request.content, request.branding or "none"
-        )
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.append_to_document(
+        caller["user_id"], doc_id, request.content, request.branding or "none"
+    )
 
 
 # ---------------------------------------------------------------------------
@@ -131,66 +120,44 @@ async def append_to_document(doc_id: str, request: AppendDocRequest,
 # ---------------------------------------------------------------------------
 
 @router.get("/google/drive/files")
+@google_errors
 async def list_files(folder_id: Optional[str] = Query(None, description="Subfolder ID (defaults to root shared folder)"),
+                     include: Optional[str] = Query(None, description="Extra per-file fields: metadata, permissions (comma-separated)"),
                      caller: dict = Depends(verify_api_key)):
     """List files in the target folder or a specified subfolder."""
-    try:
-        result = await google_client.list_files(caller["user_id"], folder_id)
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    includes = tuple(sorted({i.strip() for i in include.split(",") if i.strip()})) if include else ()
+    return await google_client.list_files(caller["user_id"], folder_id, includes)
 
 
 @router.post("/google/drive/folders")
+@google_errors
 async def create_folder(request: CreateFolderRequest, caller: dict = Depends(verify_api_key)):
     """Create a subfolder within the target folder."""
-    try:
-        result = await google_client.create_folder(
-            caller["user_id"], request.name, request.parent_folder_id
-        )
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.create_folder(
+        caller["user_id"], request.name, request.parent_folder_id
+    )
 
 
 @router.put("/google/drive/files/{file_id}/move")
+@google_errors
 async def move_file(file_id: str, request: MoveFileRequest,
                     caller: dict = Depends(verify_api_key)):
     """Move a file to a different folder."""
-    try:
-        result = await google_client.move_file(
-            caller["user_id"], file_id, request.target_folder_id
-        )
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.move_file(
+        caller["user_id"], file_id, request.target_folder_id
+    )
 
 
-@router.delete("/google/drive/files/{file_id}")
+@router.delete("/google/drive/files/{file_id}", status_code=204)
+@google_errors
 async def delete_file(file_id: str, caller: dict = Depends(verify_api_key)):
     """Move a file to trash."""
-    try:
-        result = await google_client.delete_file(caller["user_id"], file_id)
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    await google_client.delete_file(caller["user_id"], file_id)
+    return Response(status_code=204)
 
 
 @router.get("/google/drive/files/{file_id}/meta")
+@google_errors
 async def get_file_metadata(file_id: str, caller: dict = Depends(verify_api_key)):
     """Get file metadata (title, type, dates, URL)."""
-    try:
-        result = await google_client.get_file_metadata(caller["user_id"], file_id)
-        return result
-    except GoogleApiError as e:
-        _raise_api_error(e)
-    except Exception as e:
-        raise HTTPException(status_code=502, detail=str(e))
+    return await google_client.get_file_metadata(caller["user_id"], file_id)
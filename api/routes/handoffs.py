@@ -1,7 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Body, Depends, HTTPException, Response
 from pydantic import BaseModel
-from ..auth import verify_api_key
-from ..database import get_pool
+from typing import List
+from ..auth import verify_api_key, reader_agent_id, writer_agent_id
+from ..cache import handoff_lists, pending_handoffs
+from ..database import get_pool, insert_many, MAX_BULK_ITEMS
+from ..responses import ORJSONResponse
 
 router = APIRouter()
 
@@ -11,84 +14,90 @@ class HandoffCreate(BaseModel):
     prompt: str
 
 
-async def _get_agent_for_user(agent_name: str, caller: dict) -> dict:
-    """Look up agent by name, verify same-user access."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent or agent["user_id"] != caller["user_id"]:
-        raise HTTPException(status_code=404, detail="Agent not found or access denied")
-    return dict(agent)
+_NOT_FOUND = "Agent not found or access denied"
 
 
 @router.get("/agents/{agent_name}/handoffs")
-async def list_handoffs(agent_name: str, caller: dict = Depends(verify_api_key)):
-    """List pending handoffs (where picked_up_at IS NULL). Any user agent may read."""
-    agent = await _get_agent_for_user(agent_name, caller)
-    pool = await get_pool()
-    rows = await pool.fetch(
-        "SELECT handoff_id, title, prompt, created_at FROM handoffs WHERE agent_id = $1 AND picked_up_at IS NULL ORDER BY created_at",
-        agent["agent_id"]
-    )
-    return {"agent": agent_name, "handoffs": [dict(r) for r in rows]}
+async def list_handoffs(agent_name: str, compact: bool = False, caller: dict = Depends(verify_api_key)):
+    """List pending handoffs (where picked_up_at IS NULL). Any user agent may read.
+
+    compact=1 leaves out each prompt, for polling whether anything is pending.
+    """
+    agent_id = await reader_agent_id(agent_name, caller, _NOT_FOUND)
+    rows = await pending_handoffs(agent_id)
+    if compact:
+        rows = [{"handoff_id": r["handoff_id"], "title": r["title"], "created_at": r["created_at"]} for r in rows]
+    return ORJSONResponse({"agent": agent_name, "handoffs": rows})
 
 
 @router.get("/agents/{agent_name}/handoffs/{handoff_id}")
 async def get_handoff(agent_name: str, handoff_id: int, caller: dict = Depends(verify_api_key)):
     """Get a specific handoff. Any user agent may read."""
-    agent = await _get_agent_for_user(agent_name, caller)
-    pool = await get_pool()
+    agent_id = await reader_agent_id(agent_name, caller, _NOT_FOUND)
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT handoff_id, title, prompt, created_at, picked_up_at FROM handoffs WHERE agent_id = $1 AND handoff_id = $2",
-        agent["agent_id"], handoff_id
+        agent_id, handoff_id
     )
     if not row:
         raise HTTPException(status_code=404, detail="Handoff not found")
-    return dict(row)
+    return ORJSONResponse(row)
 
 
 @router.post("/agents/{agent_name}/handoffs")
 async def create_handoff(agent_name: str, body: HandoffCreate, caller: dict = Depends(verify_api_key)):
     """Create a handoff prompt. Any user agent may create (cross-agent delegation)."""
-    agent = await _get_agent_for_user(agent_name, caller)
-    pool = await get_pool()
+    agent_id = await reader_agent_id(agent_name, caller, _NOT_FOUND)
+    pool = get_pool()
     row = await pool.fetchrow(
         "INSERT INTO handoffs (agent_id, title, prompt) VALUES ($1, $2, $3) RETURNING handoff_id, title, created_at",
-        agent["agent_id"], body.title, body.prompt
+        agent_id, body.title, body.prompt
     )
+    handoff_lists.pop(agent_id)
     return {"created": dict(row)}
 
 
+@router.post("/agents/{agent_name}/handoffs/bulk")
+async def create_handoffs_bulk(agent_name: str, items: List[HandoffCreate] = Body(..., max_length=MAX_BULK_ITEMS),
+                               caller: dict = Depends(verify_api_key)):
+    """Create many handoff prompts in one request. Same access as create_handoff."""
+    agent_id = await reader_agent_id(agent_name, caller, _NOT_FOUND)
+    if not items:
+        raise HTTPException(status_code=400, detail="No items to create")
+
+    records = [(agent_id, i.title, i.prompt) for i in items]
+    await insert_many("handoffs", ["agent_id", "title", "prompt"], records)
+    handoff_lists.pop(agent_id)
+    return {"created": len(records)}
+
+
 @router.put("/agents/{agent_name}/handoffs/{handoff_id}/pickup")
 async def pickup_handoff(agent_name: str, handoff_id: int, caller: dict = Depends(verify_api_key)):
     """Mark a handoff as picked up. Only the named agent may pickup its own handoffs."""
-    agent = await _get_agent_for_user(agent_name, caller)
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may pickup its handoffs")
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may pickup its handoffs")
 
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "UPDATE handoffs SET picked_up_at = NOW() WHERE agent_id = $1 AND handoff_id = $2 AND picked_up_at IS NULL RETURNING handoff_id, title, picked_up_at",
-        agent["agent_id"], handoff_id
+        agent_id, handoff_id
     )
     if not row:
         raise HTTPException(status_code=404, detail="Handoff not found or already picked up")
+    handoff_lists.pop(agent_id)
     return {"picked_up": dict(row)}
 
 
-@router.delete("/agents/{agent_name}/handoffs/{handoff_id}")
+@router.delete("/agents/{agent_name}/handoffs/{handoff_id}", status_code=204)
 async def delete_handoff(agent_name: str, handoff_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a handoff. Only the named agent may delete its own handoffs."""
-    agent = await _get_agent_for_user(agent_name, caller)
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may delete its handoffs")
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may delete its handoffs")
 
-    pool = await get_pool()
+    pool = get_pool()
     result = await pool.execute(
         "DELETE FROM handoffs WHERE agent_id = $1 AND handoff_id = $2",
-        agent["agent_id"], handoff_id
+        agent_id, handoff_id
     )
     if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Handoff not found")
-    return {"deleted": handoff_id}
+    handoff_lists.pop(agent_id)
+    return Response(status_code=204)
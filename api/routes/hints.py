@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from pydantic import BaseModel
 from typing import Optional
 from ..auth import verify_api_key
-from ..database import get_pool
+from ..cache import hint_lists
+from ..database import get_pool, json_array_sql, update_variants, pick_update, provided, warm
+from ..responses import ORJSONResponse, RawJSONResponse, json_object
 from .sharing import check_share_permission
 
 router = APIRouter()
@@ -24,104 +26,136 @@ class HintUpdate(BaseModel):
     description: Optional[str] = None
 
 
+_HINT_FIELDS = ("title", "description")
+# Callers other than the owner need a share on the hint's category at
+# permission_level >= 2; folded into the UPDATE so the check and the write
+# are one statement. Parameters: fields, hint_id, caller's user_id.
+HINT_UPDATES = update_variants(
+    "hints", _HINT_FIELDS, ("hint_id",), "hint_id, title",
+    guard="""(user_id = {p} OR EXISTS (
+        SELECT 1 FROM shared_objects so
+        WHERE so.object_type_id = 2 AND so.object_id = hints.hint_category_id
+        AND so.shared_to_user_id = {p} AND so.permission_level >= 2))""",
+)
+
+# Subtree delete, allowed to the owner, or for non-root hints to a user whose
+# share on the category is at permission_level 3. $1 hint_id, $2 user_id.
+_DELETE_TARGET_CTE = """
+    WITH target AS (
+        SELECT h.path FROM hints h
+        WHERE h.hint_id = $1 AND (h.user_id = $2 OR (h.parent_id <> 0 AND EXISTS (
+            SELECT 1 FROM shared_objects so
+            WHERE so.object_type_id = 2 AND so.object_id = h.hint_category_id
+            AND so.shared_to_user_id = $2 AND so.permission_level >= 3)))
+    )"""
+
+# Deletes a hint and its descendants; the agent route only needs "DELETE 0" or not
+DELETE_HINT_SQL = _DELETE_TARGET_CTE + """
+    DELETE FROM hints WHERE path <@ (SELECT path FROM target)
+"""
+
+# Same delete, returning how many rows (the hint plus descendants) went
+DELETE_HINT_COUNT_SQL = _DELETE_TARGET_CTE + """,
+    d AS (
+        DELETE FROM hints WHERE path <@ (SELECT path FROM target)
+        RETURNING 1
+    )
+    SELECT count(*) FROM d
+"""
+
+
 @router.get("/hints")
 async def get_hints(caller: dict = Depends(verify_api_key)):
     """Full hints tree with descriptions, including shared hint categories."""
-    pool = await get_pool()
-    rows = await pool.fetch(
-        """SELECT hint_id, parent_id, title, description, hint_category_id, 'owned' as access, 3 as permission_level
-           FROM hints WHERE user_id = $1
-           UNION ALL
-           SELECT h.hint_id, h.parent_id, h.title, h.description, h.hint_category_id, 'shared' as access, so.permission_level
-           FROM hints h
-           JOIN shared_objects so ON so.object_id = h.hint_category_id AND so.object_type_id = 2
-           WHERE so.shared_to_user_id = $1
-           ORDER BY parent_id, hint_id""",
-        caller["user_id"]
-    )
-    return {"hints": [dict(r) for r in rows]}
+    return RawJSONResponse(await hint_lists.get_or_load(("full", caller["user_id"]), lambda: _load_hints(caller["user_id"])))
+
+
+_LIST_HINTS_SQL = warm(json_array_sql("""SELECT hint_id, parent_id, title, description, hint_category_id, 'owned' as access, 3 as permission_level
+   FROM hints WHERE user_id = $1
+   UNION ALL
+   SELECT h.hint_id, h.parent_id, h.title, h.description, h.hint_category_id, 'shared' as access, so.permission_level
+   FROM hints h
+   JOIN shared_objects so ON so.object_id = h.hint_category_id AND so.object_type_id = 2
+   WHERE so.shared_to_user_id = $1
+   ORDER BY parent_id, hint_id"""), 0)
+
+
+async def _load_hints(user_id: int) -> bytes:
+    pool = get_pool()
+    return json_object("hints", await pool.fetchval(_LIST_HINTS_SQL, user_id))
 
 
 @router.get("/hints/compact")
 async def get_hints_compact(caller: dict = Depends(verify_api_key)):
     """Hint tree with titles only — no descriptions. For quick category/hint discovery."""
-    pool = await get_pool()
-    rows = await pool.fetch(
-        """SELECT hint_id, parent_id, title
-           FROM hints WHERE user_id = $1
-           UNION ALL
-           SELECT h.hint_id, h.parent_id, h.title
-           FROM hints h
-           JOIN shared_objects so ON so.object_id = h.hint_category_id AND so.object_type_id = 2
-           WHERE so.shared_to_user_id = $1
-           ORDER BY parent_id, hint_id""",
-        caller["user_id"]
-    )
-    return {"hints": [dict(r) for r in rows]}
+    return RawJSONResponse(await hint_lists.get_or_load(("compact", caller["user_id"]), lambda: _load_hints_compact(caller["user_id"])))
+
+
+_LIST_HINTS_COMPACT_SQL = warm(json_array_sql("""SELECT hint_id, parent_id, title
+   FROM hints WHERE user_id = $1
+   UNION ALL
+   SELECT h.hint_id, h.parent_id, h.title
+   FROM hints h
+   JOIN shared_objects so ON so.object_id = h.hint_category_id AND so.object_type_id = 2
+   WHERE so.shared_to_user_id = $1
+   ORDER BY parent_id, hint_id"""), 0)
+
+
+async def _load_hints_compact(user_id: int) -> bytes:
+    pool = get_pool()
+    return json_object("hints", await pool.fetchval(_LIST_HINTS_COMPACT_SQL, user_id))
+
+
+# A hint followed by its children, visible to the owner or any share on the
+# hint's category; no rows if missing or off-limits. $1 hint_id, $2 user_id.
+GET_HINT_SQL = warm("""SELECT h.hint_id, h.parent_id, h.title, h.description, h.hint_category_id
+   FROM hints h
+   WHERE (h.hint_id = $1 OR h.parent_id = $1) AND EXISTS (
+       SELECT 1 FROM hints n
+       WHERE n.hint_id = $1 AND (n.user_id = $2 OR EXISTS (
+           SELECT 1 FROM shared_objects so
+           WHERE so.object_type_id = 2 AND so.object_id = n.hint_category_id
+           AND so.shared_to_user_id = $2 AND so.permission_level >= 1)))
+   ORDER BY h.hint_id <> $1, h.hint_id""", 0, 0)
 
 
 @router.get("/hints/{hint_id}")
 async def get_hint(hint_id: int, caller: dict = Depends(verify_api_key)):
     """A hint node and its immediate children."""
-    pool = await get_pool()
-    node = await pool.fetchrow(
-        "SELECT hint_id, user_id, parent_id, title, description, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not node:
+    pool = get_pool()
+    rows = await pool.fetch(GET_HINT_SQL, hint_id, caller["user_id"])
+    if not rows:
         raise HTTPException(status_code=404, detail="Hint not found")
-
-    if node["user_id"] != caller["user_id"]:
-        perm = await check_share_permission(pool, caller["user_id"], 2, node["hint_category_id"], 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    children = await pool.fetch(
-        "SELECT hint_id, parent_id, title, description, hint_category_id FROM hints WHERE parent_id = $1 ORDER BY hint_id",
-        hint_id
-    )
-    result = dict(node)
-    del result["user_id"]
-    return {"node": result, "children": [dict(r) for r in children]}
+    return ORJSONResponse({"node": rows[0], "children": rows[1:]})
 
 
 @router.post("/hint_categories")
 async def create_hint_category(cat: HintCategoryCreate, caller: dict = Depends(verify_api_key)):
     """Create a new top-level hint category."""
-    pool = await get_pool()
+    pool = get_pool()
+    # The hints_root_category trigger sets hint_category_id to the new hint_id
     row = await pool.fetchrow(
-        "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title",
+        "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, title, hint_category_id",
         caller["user_id"], cat.title, cat.description
     )
-    # Set hint_category_id to self (root categories are their own category)
-    await pool.execute(
-        "UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1",
-        row["hint_id"]
-    )
-    result = dict(row)
-    result["hint_category_id"] = row["hint_id"]
-    return {"created": result}
+    hint_lists.clear()
+    return {"created": dict(row)}
 
 
 @router.post("/hints")
 async def create_hint(hint: HintCreate, caller: dict = Depends(verify_api_key)):
     """Create a hint node. User approval enforced by agent behavior."""
-    pool = await get_pool()
+    pool = get_pool()
 
     if hint.parent_id == 0:
         # New root category — must be the caller's own
+        # The hints_root_category trigger sets hint_category_id to the new hint_id
         row = await pool.fetchrow(
-            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title",
+            "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, 0, $2, $3, 0) RETURNING hint_id, parent_id, title, hint_category_id",
             caller["user_id"], hint.title, hint.description
         )
-        # Set hint_category_id to the newly created hint_id
-        await pool.execute(
-            "UPDATE hints SET hint_category_id = $1 WHERE hint_id = $1",
-            row["hint_id"]
-        )
-        result = dict(row)
-        result["hint_category_id"] = row["hint_id"]
-        return {"created": result}
+        hint_lists.clear()
+        return {"created": dict(row)}
     else:
         # Child hint — look up parent to get hint_category_id
         parent = await pool.fetchrow(
@@ -141,80 +175,35 @@ async def create_hint(hint: HintCreate, caller: dict = Depends(verify_api_key)):
             "INSERT INTO hints (user_id, parent_id, title, description, hint_category_id) VALUES ($1, $2, $3, $4, $5) RETURNING hint_id, parent_id, title, hint_category_id",
             parent["user_id"], hint.parent_id, hint.title, hint.description, parent["hint_category_id"]
         )
+        hint_lists.clear()
         return {"created": dict(row)}
 
 
 @router.put("/hints/{hint_id}")
 async def update_hint(hint_id: int, hint: HintUpdate, caller: dict = Depends(verify_api_key)):
     """Update a hint node. User approval enforced by agent behavior."""
-    pool = await get_pool()
+    pool = get_pool()
 
     # Check ownership or shared permission >= 2
-    existing = await pool.fetchrow(
-        "SELECT hint_id, user_id, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not existing:
-        raise HTTPException(status_code=404, detail="Hint not found")
-
-    if existing["user_id"] != caller["user_id"]:
-        perm = await check_share_permission(pool, caller["user_id"], 2, existing["hint_category_id"], 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if hint.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(hint.title)
-        idx += 1
-    if hint.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(hint.description)
-        idx += 1
-
-    if not updates:
+    update = pick_update(HINT_UPDATES, provided(hint, _HINT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(hint_id)
-    sql = f"UPDATE hints SET {', '.join(updates)} WHERE hint_id = ${idx} RETURNING hint_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, hint_id, caller["user_id"])
+    if not row:
+        raise HTTPException(status_code=404, detail="Hint not found")
+    hint_lists.clear()
     return {"updated": dict(row)}
 
 
-@router.delete("/hints/{hint_id}")
+@router.delete("/hints/{hint_id}", status_code=204)
 async def delete_hint(hint_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a hint node and all descendants. User approval enforced by agent behavior."""
-    pool = await get_pool()
+    pool = get_pool()
 
-    existing = await pool.fetchrow(
-        "SELECT hint_id, user_id, parent_id, hint_category_id FROM hints WHERE hint_id = $1",
-        hint_id
-    )
-    if not existing:
+    result = await pool.execute(DELETE_HINT_SQL, hint_id, caller["user_id"])
+    if result == "DELETE 0":
         raise HTTPException(status_code=404, detail="Hint not found")
-
-    if existing["user_id"] != caller["user_id"]:
-        if existing["parent_id"] == 0:
-            # Root hints: owner only
-            raise HTTPException(status_code=404, detail="Hint not found")
-        perm = await check_share_permission(pool, caller["user_id"], 2, existing["hint_category_id"], 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Hint not found")
-
-    result = await pool.execute(
-        """
-        WITH RECURSIVE subtree AS (
-            SELECT hint_id FROM hints WHERE hint_id = $1
-            UNION ALL
-            SELECT h.hint_id FROM hints h
-            INNER JOIN subtree s ON h.parent_id = s.hint_id
-        )
-        DELETE FROM hints WHERE hint_id IN (SELECT hint_id FROM subtree)
-        """,
-        hint_id
-    )
-    deleted_count = int(result.split()[-1])
-    return {"deleted": hint_id, "descendants_deleted": deleted_count - 1}
+    hint_lists.clear()
+    return Response(status_code=204)
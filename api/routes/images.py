@@ -3,28 +3,48 @@ Image generation and management routes for LucyAPI.
 Uses Gemini API via the gemini.py wrapper module.
 """
 
-import hashlib
-import os
+import asyncio
+import secrets
 import logging
 from datetime import datetime, timezone
-from io import BytesIO
 from typing import Optional
 
 import httpx
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field
-from PIL import Image
 
+from ..auth import lookup_api_key
 from ..database import get_pool
 from ..gemini import generate_image, edit_image, analyze_image
+from .. import image_store
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-IMAGES_DIR = "/opt/lucyapi/output/images"
 BASE_URL = "https://lucyapi.snowcapsystems.com"
 
+# Shared client for source-image downloads, so repeated edit/analyze calls
+# reuse kept-alive connections instead of a fresh pool and TLS handshake
+_http_client: httpx.AsyncClient | None = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=30,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+        )
+    return _http_client
+
+
+async def close_http_client():
+    global _http_client
+    if _http_client:
+        await _http_client.aclose()
+        _http_client = None
+
 
 # ── Request/Response Models ───────────────────────────────────────
 
@@ -57,18 +77,14 @@ async def _resolve_user_id(agent_key: Optional[str]) -> Optional[int]:
     """Resolve user_id from an agent_key. Returns None if not provided or invalid."""
     if not agent_key:
         return None
-    pool = await get_pool()
-    row = await pool.fetchrow(
-        "SELECT user_id FROM agents WHERE api_key = $1", agent_key
-    )
-    return row["user_id"] if row else None
+    caller = await lookup_api_key(agent_key)
+    return caller["user_id"] if caller else None
 
 
 def _make_filename() -> str:
-    """Generate a unique filename: gen_{timestamp}_{short_hash}.png"""
+    """Generate a unique filename: gen_{timestamp}_{random_hex}.png"""
     ts = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-    short_hash = hashlib.sha256(os.urandom(16)).hexdigest()[:8]
-    return f"gen_{ts}_{short_hash}.png"
+    return f"gen_{ts}_{secrets.token_hex(4)}.png"
 
 
 def _image_url(filename: str) -> str:
@@ -80,24 +96,21 @@ async def _load_source_image(image_id: Optional[int], image_url: Optional[str])
     Returns (image_bytes, source_description).
     """
     if image_id is not None:
-        pool = await get_pool()
+        pool = get_pool()
         row = await pool.fetchrow(
             "SELECT filename FROM images WHERE image_id = $1", image_id
         )
         if not row:
             raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
-        filepath = os.path.join(IMAGES_DIR, row["filename"])
         try:
-            with open(filepath, "rb") as f:
-                return f.read(), f"image_id={image_id}"
+            return await image_store.read_image(row["filename"]), f"image_id={image_id}"
         except FileNotFoundError:
             raise HTTPException(status_code=404, detail=f"Image file not found on disk for image_id={image_id}")
     elif image_url is not None:
         try:
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.get(image_url)
-                resp.raise_for_status()
-                return resp.content, f"url={image_url}"
+            resp = await _get_http_client().get(image_url)
+            resp.raise_for_status()
+            return resp.content, f"url={image_url}"
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Failed to download image from URL: {e}")
     else:
@@ -106,18 +119,10 @@ async def _load_source_image(image_id: Optional[int], image_url: Optional[str])
 
 def _row_to_dict(row) -> dict:
     """Convert a database row to a response dict with URL."""
-    return {
-        "image_id": row["image_id"],
-        "url": _image_url(row["filename"]),
-        "filename": row["filename"],
-        "prompt": row["prompt"],
-        "model": row["model"],
-        "keep": row["keep"],
-        "size_bytes": row["size_bytes"],
-        "width": row["width"],
-        "height": row["height"],
-        "created_at": row["created_at"].isoformat(),
-    }
+    # created_at stays a datetime: ORJSONResponse encodes it natively
+    img = dict(row)
+    img["url"] = _image_url(row["filename"])
+    return img
 
 
 # ── Generation ────────────────────────────────────────────────────
@@ -127,7 +132,8 @@ async def gen_image(req: GenImageRequest, agent_key: Optional[str] = Query(defau
     """Generate an image from a text prompt via Gemini."""
     user_id = await _resolve_user_id(agent_key)
     try:
-        result = generate_image(
+        result = await asyncio.to_thread(
+            generate_image,
             prompt=req.prompt,
             model=req.model,
             aspect_ratio=req.aspect_ratio,
@@ -138,21 +144,13 @@ async def gen_image(req: GenImageRequest, agent_key: Optional[str] = Query(defau
 
     image_bytes = result["image_bytes"]
     filename = _make_filename()
-    filepath = os.path.join(IMAGES_DIR, filename)
 
-    with open(filepath, "wb") as f:
-        f.write(image_bytes)
-
-    width, height = None, None
-    try:
-        img = Image.open(BytesIO(image_bytes))
-        width, height = img.size
-    except Exception:
-        pass
+    await image_store.write_image(filename, image_bytes)
+    width, height = await image_store.image_size(image_bytes)
 
     size_bytes = len(image_bytes)
 
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """
         INSERT INTO images (user_id, filename, prompt, model, size_bytes, width, height)
@@ -174,7 +172,8 @@ async def gen_image_edit(req: EditImageRequest, agent_key: Optional[str] = Query
     source_bytes, source_desc = await _load_source_image(req.image_id, req.image_url)
 
     try:
-        result = edit_image(
+        result = await asyncio.to_thread(
+            edit_image,
             source_bytes=source_bytes,
             prompt=req.prompt,
             model=req.model,
@@ -185,22 +184,14 @@ async def gen_image_edit(req: EditImageRequest, agent_key: Optional[str] = Query
 
     image_bytes = result["image_bytes"]
     filename = _make_filename()
-    filepath = os.path.join(IMAGES_DIR, filename)
 
-    with open(filepath, "wb") as f:
-        f.write(image_bytes)
-
-    width, height = None, None
-    try:
-        img = Image.open(BytesIO(image_bytes))
-        width, height = img.size
-    except Exception:
-        pass
+    await image_store.write_image(filename, image_bytes)
+    width, height = await image_store.image_size(image_bytes)
 
     size_bytes = len(image_bytes)
     edit_prompt = f"[edit] {req.prompt}"
 
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """
         INSERT INTO images (user_id, filename, prompt, model, size_bytes, width, height)
@@ -221,7 +212,8 @@ async def gen_image_analyze(req: AnalyzeImageRequest):
     source_bytes, source_desc = await _load_source_image(req.image_id, req.image_url)
 
     try:
-        result = analyze_image(
+        result = await asyncio.to_thread(
+            analyze_image,
             image_bytes=source_bytes,
             prompt=req.prompt,
         )
@@ -241,38 +233,23 @@ async def gen_image_analyze(req: AnalyzeImageRequest):
 @router.post("/images/cleanup")
 async def cleanup_images(agent_key: Optional[str] = Query(default=None)):
     """Bulk delete all images where keep=false. Returns count deleted."""
-    pool = await get_pool()
+    pool = get_pool()
     user_id = await _resolve_user_id(agent_key)
 
+    # Delete the rows first and unlink whatever they pointed at
     if user_id is not None:
         rows = await pool.fetch(
-            "SELECT image_id, filename FROM images WHERE keep = false AND user_id = $1",
+            f"DELETE FROM images WHERE keep = false AND user_id = $1 AND {image_store.CLEANABLE_STATUS_SQL} RETURNING filename",
             user_id,
         )
     else:
         rows = await pool.fetch(
-            "SELECT image_id, filename FROM images WHERE keep = false"
+            f"DELETE FROM images WHERE keep = false AND {image_store.CLEANABLE_STATUS_SQL} RETURNING filename"
         )
 
-    if not rows:
-        return {"deleted": 0}
+    await image_store.remove_images([row["filename"] for row in rows])
 
-    for row in rows:
-        filepath = os.path.join(IMAGES_DIR, row["filename"])
-        try:
-            os.remove(filepath)
-        except FileNotFoundError:
-            pass
-        except Exception as e:
-            logger.error(f"Failed to delete image file {row['filename']}: {e}")
-
-    image_ids = [row["image_id"] for row in rows]
-    result = await pool.execute(
-        "DELETE FROM images WHERE image_id = ANY($1)", image_ids
-    )
-    count = int(result.split()[-1])
-
-    return {"deleted": count}
+    return {"deleted": len(rows)}
 
 
 # ── List ──────────────────────────────────────────────────────────
@@ -285,7 +262,7 @@ async def list_images(
     agent_key: Optional[str] = Query(default=None),
 ):
     """List images with optional filtering."""
-    pool = await get_pool()
+    pool = get_pool()
     user_id = await _resolve_user_id(agent_key)
 
     conditions = []
@@ -324,7 +301,7 @@ async def list_images(
 @router.get("/images/{image_id}")
 async def get_image(image_id: int):
     """Get metadata for a single image."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """
         SELECT image_id, filename, prompt, model, created_at, keep,
@@ -343,7 +320,7 @@ async def get_image(image_id: int):
 @router.patch("/images/{image_id}")
 async def update_image(image_id: int, req: KeepRequest):
     """Update the keep flag on an image."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         """
         UPDATE images SET keep = $1 WHERE image_id = $2
@@ -365,29 +342,21 @@ async def delete_image(
     force: bool = Query(default=False, description="Force delete even if keep=true"),
 ):
     """Delete an image file and DB row. Rejects if keep=true unless force=true."""
-    pool = await get_pool()
+    pool = get_pool()
 
-    row = await pool.fetchrow(
-        "SELECT image_id, filename, keep FROM images WHERE image_id = $1",
-        image_id,
+    filename = await pool.fetchval(
+        "DELETE FROM images WHERE image_id = $1 AND (keep = false OR $2) RETURNING filename",
+        image_id, force,
     )
-    if not row:
-        raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
-
-    if row["keep"] and not force:
+    if filename is None:
+        # Nothing deleted: only now look up whether it is missing or kept
+        if not await pool.fetchval("SELECT 1 FROM images WHERE image_id = $1", image_id):
+            raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
         raise HTTPException(
             status_code=409,
             detail=f"Image {image_id} is marked keep=true. Use ?force=true to delete.",
         )
 
-    filepath = os.path.join(IMAGES_DIR, row["filename"])
-    try:
-        os.remove(filepath)
-    except FileNotFoundError:
-        pass
-    except Exception as e:
-        logger.error(f"Failed to delete image file {row['filename']}: {e}")
-
-    await pool.execute("DELETE FROM images WHERE image_id = $1", image_id)
+    await image_store.remove_image(filename)
 
     return {"deleted": True, "image_id": image_id}
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from ..auth import verify_api_key
-from ..database import get_pool
+from ..auth import verify_api_key, reader_agent_id, writer_agent_id
+from ..database import get_pool, update_variants, pick_update, provided
+from ..responses import ORJSONResponse
 
 router = APIRouter()
 
@@ -18,65 +19,52 @@ class PreferenceUpdate(BaseModel):
     description: Optional[str] = None
 
 
+_PREFERENCE_FIELDS = ("title", "description")
+_PREFERENCE_UPDATES = update_variants("preferences", _PREFERENCE_FIELDS, ("agent_id", "pkid"), "pkid, title")
+
+
 @router.get("/agents/{agent_name}/preferences")
 async def get_preferences_tree(agent_name: str, caller: dict = Depends(verify_api_key)):
     """Top-level preference categories (manifest)."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent or agent["user_id"] != caller["user_id"]:
-        raise HTTPException(status_code=404, detail="Not found or access denied")
+    pool = get_pool()
+    agent_id = await reader_agent_id(agent_name, caller)
 
     rows = await pool.fetch(
         "SELECT pkid, title FROM preferences WHERE agent_id = $1 AND parent_id = 0 ORDER BY pkid",
-        agent["agent_id"]
+        agent_id
     )
-    return {"agent": agent_name, "preferences": [dict(r) for r in rows]}
+    return ORJSONResponse({"agent": agent_name, "preferences": rows})
 
 
 @router.get("/agents/{agent_name}/preferences/{pkid}")
 async def get_preference_branch(agent_name: str, pkid: int, caller: dict = Depends(verify_api_key)):
     """A preference node and its immediate children."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent or agent["user_id"] != caller["user_id"]:
-        raise HTTPException(status_code=404, detail="Not found or access denied")
+    pool = get_pool()
+    agent_id = await reader_agent_id(agent_name, caller)
 
-    node = await pool.fetchrow(
-        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND pkid = $2",
-        agent["agent_id"], pkid
+    # Node first, then its children, in one query
+    rows = await pool.fetch(
+        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND (pkid = $2 OR parent_id = $2) ORDER BY pkid <> $2, pkid",
+        agent_id, pkid
     )
-    if not node:
+    if not rows or rows[0]["pkid"] != pkid:
         raise HTTPException(status_code=404, detail="Preference not found")
 
-    children = await pool.fetch(
-        "SELECT pkid, parent_id, title, description FROM preferences WHERE agent_id = $1 AND parent_id = $2 ORDER BY pkid",
-        agent["agent_id"], pkid
-    )
     return {
-        "node": dict(node),
-        "children": [dict(r) for r in children]
+        "node": dict(rows[0]),
+        "children": [dict(r) for r in rows[1:]]
     }
 
 
 @router.post("/agents/{agent_name}/preferences")
 async def create_preference(agent_name: str, pref: PreferenceCreate, caller: dict = Depends(verify_api_key)):
     """Create a preference node. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may write to its preferences")
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may write to its preferences")
 
     row = await pool.fetchrow(
         "INSERT INTO preferences (agent_id, parent_id, title, description) VALUES ($1, $2, $3, $4) RETURNING pkid, title",
-        agent["agent_id"], pref.parent_id, pref.title, pref.description
+        agent_id, pref.parent_id, pref.title, pref.description
     )
     return {"created": dict(row)}
 
@@ -84,35 +72,15 @@ async def create_preference(agent_name: str, pref: PreferenceCreate, caller: dic
 @router.put("/agents/{agent_name}/preferences/{pkid}")
 async def update_preference(agent_name: str, pkid: int, pref: PreferenceUpdate, caller: dict = Depends(verify_api_key)):
     """Update a preference. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may modify its preferences")
-
-    updates = []
-    values = []
-    idx = 1
-    if pref.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(pref.title)
-        idx += 1
-    if pref.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(pref.description)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may modify its preferences")
+
+    update = pick_update(_PREFERENCE_UPDATES, provided(pref, _PREFERENCE_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append(f"updated_at = NOW()")
-    values.append(agent["agent_id"])
-    values.append(pkid)
-    sql = f"UPDATE preferences SET {', '.join(updates)} WHERE agent_id = ${idx} AND pkid = ${idx + 1} RETURNING pkid, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, agent_id, pkid)
     if not row:
         raise HTTPException(status_code=404, detail="Preference not found")
     return {"updated": dict(row)}
@@ -121,17 +89,11 @@ async def update_preference(agent_name: str, pkid: int, pref: PreferenceUpdate,
 @router.delete("/agents/{agent_name}/preferences/{pkid}")
 async def delete_preference(agent_name: str, pkid: int, caller: dict = Depends(verify_api_key)):
     """Delete a preference. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    agent = await pool.fetchrow(
-        "SELECT agent_id, user_id FROM agents WHERE name = $1", agent_name
-    )
-    if not agent:
-        raise HTTPException(status_code=404, detail="Agent not found")
-    if caller["agent_name"] != agent_name:
-        raise HTTPException(status_code=403, detail="Only the named agent may delete its preferences")
+    pool = get_pool()
+    agent_id = await writer_agent_id(agent_name, caller, "Only the named agent may delete its preferences")
 
     # Recursive delete: collect entire subtree then delete in one shot
-    result = await pool.execute(
+    deleted_count = await pool.fetchval(
         """
         WITH RECURSIVE subtree AS (
             SELECT pkid FROM preferences WHERE agent_id = $1 AND pkid = $2
@@ -139,12 +101,12 @@ async def delete_preference(agent_name: str, pkid: int, caller: dict = Depends(v
             SELECT p.pkid FROM preferences p
             INNER JOIN subtree s ON p.parent_id = s.pkid
             WHERE p.agent_id = $1
-        )
-        DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree)
+        ),
+        d AS (DELETE FROM preferences WHERE pkid IN (SELECT pkid FROM subtree) RETURNING pkid)
+        SELECT count(*) FROM d
         """,
-        agent["agent_id"], pkid
+        agent_id, pkid
     )
-    deleted_count = int(result.split()[-1])
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Preference not found")
 
@@ -1,3 +1,4 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import HTMLResponse
 from html import escape
@@ -6,8 +7,10 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone
 from ..auth import verify_api_key
-from ..database import get_pool
-from .sharing import check_share_permission
+from ..cache import project_lists, project_statuses, with_status
+from ..database import get_pool, json_array_sql, update_variants, pick_update, provided
+from ..responses import ORJSONResponse, RawJSONResponse, json_object
+from .sharing import access_level
 
 router = APIRouter()
 
@@ -37,101 +40,85 @@ class SectionUpdate(BaseModel):
     file_path: Optional[str] = None
 
 
+_PROJECT_FIELDS = ("title", "description", "status_id")
+_SECTION_FIELDS = ("title", "description", "file_path")
+_PROJECT_UPDATES = update_variants("projects", _PROJECT_FIELDS, ("project_id",), "project_id, title, status_id")
+_SECTION_UPDATES = update_variants("project_sections", _SECTION_FIELDS, ("project_id", "section_id"), "section_id, title")
+
+
 @router.get("/project-statuses")
 async def get_project_statuses():
     """All project status options (no auth required — lookup table)."""
-    pool = await get_pool()
-    rows = await pool.fetch("SELECT status_id, code, label, sort_order FROM project_statuses ORDER BY sort_order")
-    return {"statuses": [dict(r) for r in rows]}
+    return {"statuses": project_statuses}
+
+
+# Owned plus shared projects; the status filter variant adds "AND ps.code = $2"
+_LIST_PROJECTS_SQL = """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'owned' as access, 3 as permission_level
+   FROM projects p
+   JOIN project_statuses ps ON p.status_id = ps.status_id
+   WHERE p.user_id = $1{status}
+   UNION ALL
+   SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'shared' as access, so.permission_level
+   FROM projects p
+   JOIN project_statuses ps ON p.status_id = ps.status_id
+   JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1
+   WHERE so.shared_to_user_id = $1{status}
+   ORDER BY project_id"""
+_GET_PROJECTS_SQL = json_array_sql(_LIST_PROJECTS_SQL.format(status=""))
+_GET_PROJECTS_BY_STATUS_SQL = json_array_sql(_LIST_PROJECTS_SQL.format(status=" AND ps.code = $2"))
 
 
 @router.get("/projects")
 async def get_projects(status: Optional[str] = None, caller: dict = Depends(verify_api_key)):
     """All projects for the caller's user, including shared projects."""
-    pool = await get_pool()
+    return RawJSONResponse(await project_lists.get_or_load((caller["user_id"], status), lambda: _load_projects(caller["user_id"], status)))
+
+
+async def _load_projects(user_id: int, status: Optional[str]) -> bytes:
+    pool = get_pool()
     if status:
-        rows = await pool.fetch(
-            """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'owned' as access, 3 as permission_level
-               FROM projects p
-               JOIN project_statuses ps ON p.status_id = ps.status_id
-               WHERE p.user_id = $1 AND ps.code = $2
-               UNION ALL
-               SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'shared' as access, so.permission_level
-               FROM projects p
-               JOIN project_statuses ps ON p.status_id = ps.status_id
-               JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1
-               WHERE so.shared_to_user_id = $1 AND ps.code = $2
-               ORDER BY project_id""",
-            caller["user_id"], status
-        )
+        body = await pool.fetchval(_GET_PROJECTS_BY_STATUS_SQL, user_id, status)
     else:
-        rows = await pool.fetch(
-            """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'owned' as access, 3 as permission_level
-               FROM projects p
-               JOIN project_statuses ps ON p.status_id = ps.status_id
-               WHERE p.user_id = $1
-               UNION ALL
-               SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label, 'shared' as access, so.permission_level
-               FROM projects p
-               JOIN project_statuses ps ON p.status_id = ps.status_id
-               JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1
-               WHERE so.shared_to_user_id = $1
-               ORDER BY project_id""",
-            caller["user_id"]
-        )
-    return {"projects": [dict(r) for r in rows]}
+        body = await pool.fetchval(_GET_PROJECTS_SQL, user_id)
+    return json_object("projects", body)
 
 
 @router.get("/projects/{project_id}")
 async def get_project(project_id: int, caller: dict = Depends(verify_api_key)):
     """Project header with section tree."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label
-           FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-           WHERE p.project_id = $1 AND p.user_id = $2""",
-        project_id, caller["user_id"]
-    )
-    access = "owned"
-    permission_level = 3
-    if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-        project = await pool.fetchrow(
-            """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label
+    pool = get_pool()
+    # Ownership and share permission resolved in one round trip; sections are
+    # fetched alongside it and simply dropped if access is denied
+    project, sections = await asyncio.gather(
+        pool.fetchrow(
+            """SELECT p.project_id, p.title, p.description, ps.code as status, ps.label as status_label,
+                      CASE WHEN p.user_id = $2 THEN 'owned' ELSE 'shared' END as access,
+                      CASE WHEN p.user_id = $2 THEN 3 ELSE so.permission_level END as permission_level
                FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-               WHERE p.project_id = $1""",
+               LEFT JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1 AND so.shared_to_user_id = $2
+               WHERE p.project_id = $1 AND (p.user_id = $2 OR so.permission_level >= 1)""",
+            project_id, caller["user_id"]
+        ),
+        pool.fetch(
+            "SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 ORDER BY parent_id, section_id",
             project_id
-        )
-        access = "shared"
-        permission_level = perm
-
-    sections = await pool.fetch(
-        "SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 ORDER BY parent_id, section_id",
-        project_id
+        ),
     )
-    result = dict(project)
-    result["access"] = access
-    result["permission_level"] = permission_level
-    return {
-        "project": result,
-        "sections": [dict(r) for r in sections]
-    }
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    return ORJSONResponse({
+        "project": project,
+        "sections": sections
+    })
 
 
 @router.get("/projects/{project_id}/sections/{section_id}")
 async def get_section(project_id: int, section_id: int, caller: dict = Depends(verify_api_key)):
     """A section and its immediate children."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 1, project_id, 1):
+        raise HTTPException(status_code=404, detail="Project not found")
 
     node = await pool.fetchrow(
         "SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 AND section_id = $2",
@@ -153,41 +140,28 @@ async def get_section(project_id: int, section_id: int, caller: dict = Depends(v
 @router.post("/projects")
 async def create_project(project: ProjectCreate, caller: dict = Depends(verify_api_key)):
     """Create a project. User approval enforced by agent behavior."""
-    pool = await get_pool()
+    pool = get_pool()
     if project.status_id is not None:
         row = await pool.fetchrow(
             """INSERT INTO projects (user_id, title, description, status_id) VALUES ($1, $2, $3, $4)
-               RETURNING project_id, title""",
+               RETURNING project_id, title, status_id""",
             caller["user_id"], project.title, project.description, project.status_id
         )
     else:
         row = await pool.fetchrow(
-            "INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title",
+            "INSERT INTO projects (user_id, title, description) VALUES ($1, $2, $3) RETURNING project_id, title, status_id",
             caller["user_id"], project.title, project.description
         )
-    result = dict(row)
-    ps = await pool.fetchrow(
-        "SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1",
-        result["project_id"]
-    )
-    if ps:
-        result["status"] = ps["status"]
-        result["status_label"] = ps["status_label"]
-    return {"created": result}
+    project_lists.clear()
+    return {"created": with_status(row)}
 
 
 @router.post("/projects/{project_id}/sections")
 async def create_section(project_id: int, section: SectionCreate, caller: dict = Depends(verify_api_key)):
     """Create a project section. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
 
     row = await pool.fetchrow(
         "INSERT INTO project_sections (project_id, parent_id, title, description, file_path) VALUES ($1, $2, $3, $4, $5) RETURNING section_id, title",
@@ -199,130 +173,72 @@ async def create_section(project_id: int, section: SectionCreate, caller: dict =
 @router.put("/projects/{project_id}")
 async def update_project(project_id: int, project: ProjectUpdate, caller: dict = Depends(verify_api_key)):
     """Update project header. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not existing:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if project.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(project.title)
-        idx += 1
-    if project.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(project.description)
-        idx += 1
-    if project.status_id is not None:
-        updates.append(f"status_id = ${idx}")
-        values.append(project.status_id)
-        idx += 1
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
 
-    if not updates:
+    update = pick_update(_PROJECT_UPDATES, provided(project, _PROJECT_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(project_id)
-    sql = f"UPDATE projects SET {', '.join(updates)} WHERE project_id = ${idx} RETURNING project_id, title"
-    row = await pool.fetchrow(sql, *values)
-    result = dict(row)
-    ps = await pool.fetchrow(
-        "SELECT ps.code as status, ps.label as status_label FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id WHERE p.project_id = $1",
-        project_id
-    )
-    if ps:
-        result["status"] = ps["status"]
-        result["status_label"] = ps["status_label"]
-    return {"updated": result}
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, project_id)
+    project_lists.clear()
+    return {"updated": with_status(row)}
 
 
 @router.put("/projects/{project_id}/sections/{section_id}")
 async def update_section(project_id: int, section_id: int, section: SectionUpdate, caller: dict = Depends(verify_api_key)):
     """Update a section. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if section.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(section.title)
-        idx += 1
-    if section.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(section.description)
-        idx += 1
-    if section.file_path is not None:
-        updates.append(f"file_path = ${idx}")
-        values.append(section.file_path)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 1, project_id, 2):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+    update = pick_update(_SECTION_UPDATES, provided(section, _SECTION_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(project_id)
-    values.append(section_id)
-    sql = f"UPDATE project_sections SET {', '.join(updates)} WHERE project_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, project_id, section_id)
     if not row:
         raise HTTPException(status_code=404, detail="Section not found")
     return {"updated": dict(row)}
 
 
+# Owner check, section delete and project delete in one statement. Yields
+# NULL when no owned project matched; the FK check runs at statement end,
+# after both deletes.
+_DELETE_PROJECT_SQL = """
+    WITH p AS (
+        DELETE FROM projects WHERE project_id = $1 AND user_id = $2 RETURNING project_id
+    ),
+    s AS (
+        DELETE FROM project_sections WHERE project_id IN (SELECT project_id FROM p) RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM s) FROM p
+"""
+
+
 @router.delete("/projects/{project_id}")
 async def delete_project(project_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a project and all its sections. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not project:
+    pool = get_pool()
+    sections_count = await pool.fetchval(_DELETE_PROJECT_SQL, project_id, caller["user_id"])
+    if sections_count is None:
         raise HTTPException(status_code=404, detail="Project not found")
-
-    sections_result = await pool.execute(
-        "DELETE FROM project_sections WHERE project_id = $1",
-        project_id
-    )
-    await pool.execute(
-        "DELETE FROM projects WHERE project_id = $1",
-        project_id
-    )
-    sections_count = int(sections_result.split()[-1])
+    project_lists.clear()
     return {"deleted": project_id, "sections_deleted": sections_count}
 
 
 @router.delete("/projects/{project_id}/sections/{section_id}")
 async def delete_section(project_id: int, section_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a section. User approval enforced by agent behavior."""
-    pool = await get_pool()
-    project = await pool.fetchrow(
-        "SELECT project_id FROM projects WHERE project_id = $1 AND user_id = $2",
-        project_id, caller["user_id"]
-    )
-    if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 1, project_id, 3):
+        raise HTTPException(status_code=404, detail="Project not found")
 
     # Recursive delete: collect entire subtree then delete in one shot
-    result = await pool.execute(
+    deleted_count = await pool.fetchval(
         """
         WITH RECURSIVE subtree AS (
             SELECT section_id FROM project_sections WHERE project_id = $1 AND section_id = $2
@@ -330,12 +246,15 @@ async def delete_section(project_id: int, section_id: int, caller: dict = Depend
             SELECT ps.section_id FROM project_sections ps
             INNER JOIN subtree s ON ps.parent_id = s.section_id
             WHERE ps.project_id = $1
+        ),
+        d AS (
+            DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree)
+            RETURNING 1
         )
-        DELETE FROM project_sections WHERE section_id IN (SELECT section_id FROM subtree)
+        SELECT count(*) FROM d
         """,
         project_id, section_id
     )
-    deleted_count = int(result.split()[-1])
     if deleted_count == 0:
         raise HTTPException(status_code=404, detail="Section not found")
 
@@ -347,15 +266,26 @@ async def delete_section(project_id: int, section_id: int, caller: dict = Depend
 # ---------------------------------------------------------------------------
 
 def _build_tree(sections: list[dict]) -> list[dict]:
-    """Organize flat sections into a tree by parent_id."""
-    by_id = {s["section_id"]: {**s, "children": []} for s in sections}
+    """Organize flat sections into a tree by parent_id, in place.
+
+    Single pass: a child seen before its parent waits in `pending` until the
+    parent arrives. Sections whose parent never shows up become roots.
+    """
+    by_id = {}
+    pending: dict[int, list[dict]] = {}
     roots = []
     for s in sections:
-        node = by_id[s["section_id"]]
-        if s["parent_id"] == 0 or s["parent_id"] not in by_id:
-            roots.append(node)
+        s["children"] = pending.pop(s["section_id"], [])
+        by_id[s["section_id"]] = s
+        parent_id = s["parent_id"]
+        if parent_id == 0:
+            roots.append(s)
+        elif parent_id in by_id:
+            by_id[parent_id]["children"].append(s)
         else:
-            by_id[s["parent_id"]]["children"].append(node)
+            pending.setdefault(parent_id, []).append(s)
+    for orphans in pending.values():
+        roots.extend(orphans)
     return roots
 
 
@@ -705,23 +635,16 @@ _HTML_TEMPLATE = """<!DOCTYPE html>
 @router.get("/projects/{project_id}/document", response_class=HTMLResponse)
 async def get_project_document(project_id: int, caller: dict = Depends(verify_api_key)):
     """Reconstitute a project as a self-contained HTML document."""
-    pool = await get_pool()
+    pool = get_pool()
     project = await pool.fetchrow(
         """SELECT p.project_id, p.title, p.description, p.created_at, p.updated_at, ps.label as status_label
            FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-           WHERE p.project_id = $1 AND p.user_id = $2""",
+           LEFT JOIN shared_objects so ON so.object_id = p.project_id AND so.object_type_id = 1 AND so.shared_to_user_id = $2
+           WHERE p.project_id = $1 AND (p.user_id = $2 OR so.permission_level >= 1)""",
         project_id, caller["user_id"]
     )
     if not project:
-        perm = await check_share_permission(pool, caller["user_id"], 1, project_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Project not found")
-        project = await pool.fetchrow(
-            """SELECT p.project_id, p.title, p.description, p.created_at, p.updated_at, ps.label as status_label
-               FROM projects p JOIN project_statuses ps ON p.status_id = ps.status_id
-               WHERE p.project_id = $1""",
-            project_id
-        )
+        raise HTTPException(status_code=404, detail="Project not found")
 
     sections = await pool.fetch(
         "SELECT section_id, parent_id, title, description, file_path FROM project_sections WHERE project_id = $1 ORDER BY parent_id, section_id",
@@ -14,7 +14,7 @@ class SecretCreate(BaseModel):
 @router.get("/secrets")
 async def list_secrets(caller: dict = Depends(verify_api_key)):
     """List secret keys (names only, no values)."""
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         "SELECT key, created_at, updated_at FROM secrets WHERE user_id = $1 ORDER BY key",
         caller["user_id"]
@@ -25,7 +25,7 @@ async def list_secrets(caller: dict = Depends(verify_api_key)):
 @router.get("/secrets/{key}")
 async def get_secret(key: str, caller: dict = Depends(verify_api_key)):
     """Get decrypted value for a secret."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT secret_id, key, encrypted_value, created_at, updated_at FROM secrets WHERE user_id = $1 AND key = $2",
         caller["user_id"], key
@@ -38,7 +38,7 @@ async def get_secret(key: str, caller: dict = Depends(verify_api_key)):
 @router.put("/secrets/{key}")
 async def set_secret(key: str, body: SecretCreate, caller: dict = Depends(verify_api_key)):
     """Create or update a secret (encrypts on write)."""
-    pool = await get_pool()
+    pool = get_pool()
     encrypted = encrypt(body.value)
     row = await pool.fetchrow(
         """
@@ -56,7 +56,7 @@ async def set_secret(key: str, body: SecretCreate, caller: dict = Depends(verify
 @router.delete("/secrets/{key}")
 async def delete_secret(key: str, caller: dict = Depends(verify_api_key)):
     """Delete a secret."""
-    pool = await get_pool()
+    pool = get_pool()
     result = await pool.execute(
         "DELETE FROM secrets WHERE user_id = $1 AND key = $2",
         caller["user_id"], key
@@ -14,7 +14,7 @@ class SessionCreate(BaseModel):
 @router.post("/sessions")
 async def create_session(session: SessionCreate, caller: dict = Depends(verify_api_key)):
     """Log a session start. Agent inferred from API key."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "INSERT INTO sessions (agent_id, project) VALUES ($1, $2) RETURNING session_id, started_at",
         caller["agent_id"], session.project
@@ -22,7 +22,7 @@ async def create_session(session: SessionCreate, caller: dict = Depends(verify_a
     return {
         "session_id": row["session_id"],
         "agent": caller["agent_name"],
-        "started_at": row["started_at"].isoformat(),
+        "started_at": row["started_at"],
         "project": session.project
     }
 
@@ -30,7 +30,7 @@ async def create_session(session: SessionCreate, caller: dict = Depends(verify_a
 @router.get("/sessions/last")
 async def get_last_session(caller: dict = Depends(verify_api_key)):
     """Get the most recent session for the calling agent."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT session_id, started_at, project FROM sessions WHERE agent_id = $1 ORDER BY started_at DESC LIMIT 1",
         caller["agent_id"]
@@ -41,7 +41,7 @@ async def get_last_session(caller: dict = Depends(verify_api_key)):
         "agent": caller["agent_name"],
         "last_session": {
             "session_id": row["session_id"],
-            "started_at": row["started_at"].isoformat(),
+            "started_at": row["started_at"],
             "project": row["project"]
         }
     }
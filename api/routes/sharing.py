@@ -1,24 +1,67 @@
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from ..auth import verify_api_key
+from ..cache import share_lists, invalidate_shares
 from ..database import get_pool
+from ..responses import RawJSONResponse, dumps
 
 router = APIRouter()
 
 
 # ---------------------------------------------------------------------------
-# Permission helper (importable by other route modules)
+# Object type -> table/column mapping for ownership verification
+# ---------------------------------------------------------------------------
+
+_OBJECT_TABLES = {
+    1: ("projects", "project_id"),
+    2: ("hints", "hint_id"),
+    3: ("wikis", "wiki_id"),
+}
+
+
+# Pre-share checks in one fixed statement: does the target user exist, and
+# does $3 own object $2 of type $1? Each branch is gated on the type, so only
+# the matching table is probed.
+SHARE_CHECK_SQL = (
+    "SELECT EXISTS (SELECT 1 FROM users WHERE user_id = $4) AS target_exists, EXISTS ("
+    + " UNION ALL ".join(
+        f"SELECT 1 FROM {table} WHERE $1 = {object_type_id} AND {pk_col} = $2 AND user_id = $3"
+        for object_type_id, (table, pk_col) in _OBJECT_TABLES.items()
+    )
+    + ") AS owner"
+)
+
+
+# ---------------------------------------------------------------------------
+# Permission helpers (importable by other route modules)
 # ---------------------------------------------------------------------------
 
 async def check_share_permission(pool, user_id: int, object_type_id: int, object_id: int, required_level: int) -> int | None:
     """Check if user has shared access to an object.
     Returns the permission_level if granted, None if no share exists.
     Only returns the permission if it meets or exceeds required_level."""
-    row = await pool.fetchrow(
+    return await pool.fetchval(
         "SELECT permission_level FROM shared_objects WHERE shared_to_user_id = $1 AND object_type_id = $2 AND object_id = $3 AND permission_level >= $4",
         user_id, object_type_id, object_id, required_level
     )
-    return row["permission_level"] if row else None
+
+
+# Ownership and share lookups folded into one statement. Hints are left out:
+# their shares hang off hint_category_id rather than the hint's own id.
+_ACCESS_SQL = {
+    object_type_id: f"""SELECT CASE WHEN t.user_id = $1 THEN 3 ELSE so.permission_level END
+           FROM {table} t
+           LEFT JOIN shared_objects so ON so.object_id = t.{pk_col} AND so.object_type_id = {object_type_id} AND so.shared_to_user_id = $1
+           WHERE t.{pk_col} = $2 AND (t.user_id = $1 OR so.permission_level >= $3)"""
+    for object_type_id, (table, pk_col) in _OBJECT_TABLES.items()
+    if object_type_id != 2
+}
+
+
+async def access_level(pool, user_id: int, object_type_id: int, object_id: int, required_level: int) -> int | None:
+    """Return 3 if the user owns a project or wiki, their share permission_level
+    if it meets required_level, or None if the object is missing or off-limits."""
+    return await pool.fetchval(_ACCESS_SQL[object_type_id], user_id, object_id, required_level)
 
 
 # ---------------------------------------------------------------------------
@@ -32,17 +75,6 @@ class ShareCreate(BaseModel):
     permission_level: int = 1  # 1=read, 2=read+edit, 3=full
 
 
-# ---------------------------------------------------------------------------
-# Object type -> table/column mapping for ownership verification
-# ---------------------------------------------------------------------------
-
-_OBJECT_TABLES = {
-    1: ("projects", "project_id"),
-    2: ("hints", "hint_id"),
-    3: ("wikis", "wiki_id"),
-}
-
-
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
@@ -50,7 +82,7 @@ _OBJECT_TABLES = {
 @router.post("/sharing")
 async def create_share(share: ShareCreate, caller: dict = Depends(verify_api_key)):
     """Share an object with another user. Only the object owner can share."""
-    pool = await get_pool()
+    pool = get_pool()
 
     if share.object_type_id not in _OBJECT_TABLES:
         raise HTTPException(status_code=400, detail="object_type_id must be 1 (project), 2 (hint), or 3 (wiki)")
@@ -61,21 +93,14 @@ async def create_share(share: ShareCreate, caller: dict = Depends(verify_api_key
     if share.shared_to_user_id == caller["user_id"]:
         raise HTTPException(status_code=400, detail="Cannot share to yourself")
 
-    # Verify target user exists
-    target_user = await pool.fetchrow(
-        "SELECT user_id FROM users WHERE user_id = $1",
-        share.shared_to_user_id
+    # Verify target user exists and caller owns the object
+    check = await pool.fetchrow(
+        SHARE_CHECK_SQL,
+        share.object_type_id, share.object_id, caller["user_id"], share.shared_to_user_id
     )
-    if not target_user:
+    if not check["target_exists"]:
         raise HTTPException(status_code=404, detail="Target user not found")
-
-    # Verify caller owns the object
-    table, pk_col = _OBJECT_TABLES[share.object_type_id]
-    owner = await pool.fetchrow(
-        f"SELECT {pk_col} FROM {table} WHERE {pk_col} = $1 AND user_id = $2",
-        share.object_id, caller["user_id"]
-    )
-    if not owner:
+    if not check["owner"]:
         raise HTTPException(status_code=404, detail="Object not found or you are not the owner")
 
     # Upsert: insert or update permission_level on conflict
@@ -87,27 +112,32 @@ async def create_share(share: ShareCreate, caller: dict = Depends(verify_api_key
            RETURNING share_id, object_type_id, object_id, shared_to_user_id, permission_level""",
         caller["user_id"], share.shared_to_user_id, share.object_type_id, share.object_id, share.permission_level
     )
+    invalidate_shares()
     return {"shared": dict(row)}
 
 
 @router.delete("/sharing/{share_id}")
 async def revoke_share(share_id: int, caller: dict = Depends(verify_api_key)):
     """Revoke a share. Only the user who shared it can revoke."""
-    pool = await get_pool()
-    result = await pool.execute(
-        "DELETE FROM shared_objects WHERE share_id = $1 AND shared_by_user_id = $2",
+    pool = get_pool()
+    revoked = await pool.fetchval(
+        "DELETE FROM shared_objects WHERE share_id = $1 AND shared_by_user_id = $2 RETURNING share_id",
         share_id, caller["user_id"]
     )
-    deleted_count = int(result.split()[-1])
-    if deleted_count == 0:
+    if revoked is None:
         raise HTTPException(status_code=404, detail="Share not found or you are not the owner")
+    invalidate_shares()
     return {"revoked": share_id}
 
 
 @router.get("/sharing/by-me")
 async def shares_by_me(caller: dict = Depends(verify_api_key)):
     """List objects I've shared out."""
-    pool = await get_pool()
+    return RawJSONResponse(await share_lists.get_or_load(("by", caller["user_id"]), lambda: _load_shares_by(caller["user_id"])))
+
+
+async def _load_shares_by(user_id: int) -> bytes:
+    pool = get_pool()
     rows = await pool.fetch(
         """SELECT so.share_id, so.object_type_id, ot.name as object_type, so.object_id,
                   so.shared_to_user_id, u.name as shared_to_name, so.permission_level
@@ -116,15 +146,19 @@ async def shares_by_me(caller: dict = Depends(verify_api_key)):
            JOIN users u ON so.shared_to_user_id = u.user_id
            WHERE so.shared_by_user_id = $1
            ORDER BY so.object_type_id, so.object_id""",
-        caller["user_id"]
+        user_id
     )
-    return {"shares": [dict(r) for r in rows]}
+    return dumps({"shares": rows})
 
 
 @router.get("/sharing/to-me")
 async def shares_to_me(caller: dict = Depends(verify_api_key)):
     """List objects shared to me."""
-    pool = await get_pool()
+    return RawJSONResponse(await share_lists.get_or_load(("to", caller["user_id"]), lambda: _load_shares_to(caller["user_id"])))
+
+
+async def _load_shares_to(user_id: int) -> bytes:
+    pool = get_pool()
     rows = await pool.fetch(
         """SELECT so.share_id, so.object_type_id, ot.name as object_type, so.object_id,
                   so.shared_by_user_id, u.name as shared_by_name, so.permission_level
@@ -133,6 +167,6 @@ async def shares_to_me(caller: dict = Depends(verify_api_key)):
            JOIN users u ON so.shared_by_user_id = u.user_id
            WHERE so.shared_to_user_id = $1
            ORDER BY so.object_type_id, so.object_id""",
-        caller["user_id"]
+        user_id
     )
-    return {"shares": [dict(r) for r in rows]}
+    return dumps({"shares": rows})
@@ -23,7 +23,7 @@ async def get_time():
 @router.get("/health")
 async def get_health():
     try:
-        pool = await get_pool()
+        pool = get_pool()
         row = await pool.fetchrow("SELECT 1 AS ok")
         db_status = "connected" if row else "error"
     except Exception:
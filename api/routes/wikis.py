@@ -6,8 +6,10 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime, timezone
 from ..auth import verify_api_key
-from ..database import get_pool
-from .sharing import check_share_permission
+from ..cache import wiki_lists
+from ..database import get_pool, json_array_sql, update_variants, pick_update, provided
+from ..responses import ORJSONResponse, RawJSONResponse, json_object
+from .sharing import access_level
 
 router = APIRouter()
 
@@ -35,6 +37,10 @@ class WikiSectionUpdate(BaseModel):
     tags: Optional[list[str]] = None
 
 
+_WIKI_FIELDS = ("title", "description")
+_WIKI_UPDATES = update_variants("wikis", _WIKI_FIELDS, ("wiki_id",), "wiki_id, title")
+
+
 # ---------------------------------------------------------------------------
 # Wiki CRUD
 # ---------------------------------------------------------------------------
@@ -42,19 +48,22 @@ class WikiSectionUpdate(BaseModel):
 @router.get("/wikis")
 async def get_wikis(caller: dict = Depends(verify_api_key)):
     """All wikis for the caller's user, including shared wikis."""
-    pool = await get_pool()
-    rows = await pool.fetch(
-        """SELECT wiki_id, title, description, updated_at, 'owned' as access, 3 as permission_level
-           FROM wikis WHERE user_id = $1
-           UNION ALL
-           SELECT w.wiki_id, w.title, w.description, w.updated_at, 'shared' as access, so.permission_level
-           FROM wikis w
-           JOIN shared_objects so ON so.object_id = w.wiki_id AND so.object_type_id = 3
-           WHERE so.shared_to_user_id = $1
-           ORDER BY wiki_id""",
-        caller["user_id"]
-    )
-    return {"wikis": [dict(r) for r in rows]}
+    return RawJSONResponse(await wiki_lists.get_or_load(caller["user_id"], lambda: _load_wikis(caller["user_id"])))
+
+
+_LIST_WIKIS_SQL = json_array_sql("""SELECT wiki_id, title, description, updated_at, 'owned' as access, 3 as permission_level
+   FROM wikis WHERE user_id = $1
+   UNION ALL
+   SELECT w.wiki_id, w.title, w.description, w.updated_at, 'shared' as access, so.permission_level
+   FROM wikis w
+   JOIN shared_objects so ON so.object_id = w.wiki_id AND so.object_type_id = 3
+   WHERE so.shared_to_user_id = $1
+   ORDER BY wiki_id""")
+
+
+async def _load_wikis(user_id: int) -> bytes:
+    pool = get_pool()
+    return json_object("wikis", await pool.fetchval(_LIST_WIKIS_SQL, user_id))
 
 
 # ---------------------------------------------------------------------------
@@ -65,7 +74,7 @@ async def get_wikis(caller: dict = Depends(verify_api_key)):
 @router.get("/wikis/tags/{tag}")
 async def search_wiki_tag(tag: str, caller: dict = Depends(verify_api_key)):
     """Find all sections across owned and shared wikis matching a tag."""
-    pool = await get_pool()
+    pool = get_pool()
     rows = await pool.fetch(
         """
         SELECT w.wiki_id, w.title AS wiki_title,
@@ -105,142 +114,106 @@ async def search_wiki_tag(tag: str, caller: dict = Depends(verify_api_key)):
     return {"tag": tag, "sections": sections}
 
 
+_WIKI_TAGS_SQL = """SELECT DISTINCT wst.tag
+   FROM wiki_section_tags wst
+   JOIN wiki_sections ws ON wst.section_id = ws.section_id
+   WHERE ws.wiki_id = $1
+   ORDER BY wst.tag"""
+
+
 @router.get("/wikis/{wiki_id}/tags")
 async def get_wiki_tags(wiki_id: int, caller: dict = Depends(verify_api_key)):
     """List all unique tags used in a specific wiki."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 1):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
-    rows = await pool.fetch(
-        """
-        SELECT DISTINCT wst.tag
-        FROM wiki_section_tags wst
-        JOIN wiki_sections ws ON wst.section_id = ws.section_id
-        WHERE ws.wiki_id = $1
-        ORDER BY wst.tag
-        """,
-        wiki_id
-    )
+    rows = await pool.fetch(_WIKI_TAGS_SQL, wiki_id)
     return {"wiki_id": wiki_id, "tags": [r["tag"] for r in rows]}
 
 
 @router.get("/wikis/{wiki_id}")
 async def get_wiki(wiki_id: int, caller: dict = Depends(verify_api_key)):
     """Wiki header with full section tree including tags and updated_at."""
-    pool = await get_pool()
+    pool = get_pool()
     wiki = await pool.fetchrow(
-        "SELECT wiki_id, title, description, updated_at FROM wikis WHERE wiki_id = $1 AND user_id = $2",
+        """SELECT w.wiki_id, w.title, w.description, w.updated_at
+           FROM wikis w
+           LEFT JOIN shared_objects so ON so.object_id = w.wiki_id AND so.object_type_id = 3 AND so.shared_to_user_id = $2
+           WHERE w.wiki_id = $1 AND (w.user_id = $2 OR so.permission_level >= 1)""",
         wiki_id, caller["user_id"]
     )
     if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-        wiki = await pool.fetchrow(
-            "SELECT wiki_id, title, description, updated_at FROM wikis WHERE wiki_id = $1",
-            wiki_id
-        )
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
+    # Tags aggregated per section in Postgres; asyncpg hands back a list
     sections = await pool.fetch(
-        "SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 ORDER BY parent_id, section_id",
+        """SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at,
+                  COALESCE(array_agg(wst.tag ORDER BY wst.tag) FILTER (WHERE wst.tag IS NOT NULL), '{}') AS tags
+           FROM wiki_sections ws
+           LEFT JOIN wiki_section_tags wst ON wst.section_id = ws.section_id
+           WHERE ws.wiki_id = $1
+           GROUP BY ws.section_id
+           ORDER BY ws.parent_id, ws.section_id""",
         wiki_id
     )
 
-    section_ids = [r["section_id"] for r in sections]
-    tags_by_section: dict[int, list[str]] = {sid: [] for sid in section_ids}
-    if section_ids:
-        tag_rows = await pool.fetch(
-            "SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag",
-            section_ids
-        )
-        for tr in tag_rows:
-            tags_by_section[tr["section_id"]].append(tr["tag"])
-
-    section_list = []
-    for r in sections:
-        s = dict(r)
-        s["tags"] = tags_by_section.get(r["section_id"], [])
-        section_list.append(s)
-
-    return {
-        "wiki": dict(wiki),
-        "sections": section_list
-    }
+    return ORJSONResponse({
+        "wiki": wiki,
+        "sections": sections
+    })
 
 
 @router.post("/wikis")
 async def create_wiki(wiki: WikiCreate, caller: dict = Depends(verify_api_key)):
     """Create a wiki."""
-    pool = await get_pool()
+    pool = get_pool()
     row = await pool.fetchrow(
         "INSERT INTO wikis (user_id, title, description) VALUES ($1, $2, $3) RETURNING wiki_id, title",
         caller["user_id"], wiki.title, wiki.description
     )
+    wiki_lists.clear()
     return {"created": dict(row)}
 
 
 @router.put("/wikis/{wiki_id}")
 async def update_wiki(wiki_id: int, wiki: WikiUpdate, caller: dict = Depends(verify_api_key)):
     """Update wiki title/description."""
-    pool = await get_pool()
-    existing = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not existing:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if wiki.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(wiki.title)
-        idx += 1
-    if wiki.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(wiki.description)
-        idx += 1
-
-    if not updates:
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
+
+    update = pick_update(_WIKI_UPDATES, provided(wiki, _WIKI_FIELDS))
+    if not update:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    updates.append("updated_at = NOW()")
-    values.append(wiki_id)
-    sql = f"UPDATE wikis SET {', '.join(updates)} WHERE wiki_id = ${idx} RETURNING wiki_id, title"
-    row = await pool.fetchrow(sql, *values)
+    sql, values = update
+    row = await pool.fetchrow(sql, *values, wiki_id)
+    wiki_lists.clear()
     return {"updated": dict(row)}
 
 
+# Owner check, section delete and wiki delete in one statement. Yields NULL
+# when no owned wiki matched; tags go with the sections via ON DELETE CASCADE.
+_DELETE_WIKI_SQL = """
+    WITH w AS (
+        DELETE FROM wikis WHERE wiki_id = $1 AND user_id = $2 RETURNING wiki_id
+    ),
+    s AS (
+        DELETE FROM wiki_sections WHERE wiki_id IN (SELECT wiki_id FROM w) RETURNING 1
+    )
+    SELECT (SELECT count(*) FROM s) FROM w
+"""
+
+
 @router.delete("/wikis/{wiki_id}")
 async def delete_wiki(wiki_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a wiki and all sections/tags (cascade)."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
+    pool = get_pool()
+    sections_count = await pool.fetchval(_DELETE_WIKI_SQL, wiki_id, caller["user_id"])
+    if sections_count is None:
         raise HTTPException(status_code=404, detail="Wiki not found")
-
-    sections_result = await pool.execute(
-        "DELETE FROM wiki_sections WHERE wiki_id = $1",
-        wiki_id
-    )
-    await pool.execute(
-        "DELETE FROM wikis WHERE wiki_id = $1",
-        wiki_id
-    )
-    sections_count = int(sections_result.split()[-1])
+    wiki_lists.clear()
     return {"deleted": wiki_id, "sections_deleted": sections_count}
 
 
@@ -251,15 +224,9 @@ async def delete_wiki(wiki_id: int, caller: dict = Depends(verify_api_key)):
 @router.post("/wikis/{wiki_id}/sections")
 async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, caller: dict = Depends(verify_api_key)):
     """Create a section under a wiki."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     async with pool.acquire() as conn:
         async with conn.transaction():
@@ -268,15 +235,16 @@ async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, caller:
                 wiki_id, section.parent_id, section.title, section.description
             )
             if section.tags:
-                await conn.executemany(
-                    "INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)",
-                    [(row["section_id"], tag) for tag in section.tags]
+                await conn.execute(
+                    "INSERT INTO wiki_section_tags (section_id, tag) SELECT $1, unnest($2::text[])",
+                    row["section_id"], list(section.tags)
                 )
             await conn.execute(
                 "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
                 wiki_id
             )
 
+    wiki_lists.clear()
     result = dict(row)
     result["tags"] = section.tags or []
     return {"created": result}
@@ -285,43 +253,45 @@ async def create_wiki_section(wiki_id: int, section: WikiSectionCreate, caller:
 @router.get("/wikis/{wiki_id}/sections/{section_id}")
 async def get_wiki_section(wiki_id: int, section_id: int, caller: dict = Depends(verify_api_key)):
     """Section detail with children and tags."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 1):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     node = await pool.fetchrow(
-        "SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2",
+        """SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at,
+                  EXISTS (SELECT 1 FROM wiki_section_tags wst WHERE wst.section_id = ws.section_id) AS has_tags
+           FROM wiki_sections ws WHERE ws.wiki_id = $1 AND ws.section_id = $2""",
         wiki_id, section_id
     )
     if not node:
         raise HTTPException(status_code=404, detail="Section not found")
 
     children = await pool.fetch(
-        "SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 AND parent_id = $2 ORDER BY section_id",
+        """SELECT ws.section_id, ws.parent_id, ws.title, ws.description, ws.updated_at,
+                  EXISTS (SELECT 1 FROM wiki_section_tags wst WHERE wst.section_id = ws.section_id) AS has_tags
+           FROM wiki_sections ws WHERE ws.wiki_id = $1 AND ws.parent_id = $2 ORDER BY ws.section_id""",
         wiki_id, section_id
     )
 
-    all_ids = [node["section_id"]] + [c["section_id"] for c in children]
-    tag_rows = await pool.fetch(
-        "SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag",
-        all_ids
-    )
-    tags_by_section: dict[int, list[str]] = {sid: [] for sid in all_ids}
-    for tr in tag_rows:
-        tags_by_section[tr["section_id"]].append(tr["tag"])
+    all_rows = [node, *children]
+    tags_by_section: dict[int, list[str]] = {r["section_id"]: [] for r in all_rows}
+    tagged_ids = [r["section_id"] for r in all_rows if r["has_tags"]]
+    if tagged_ids:
+        tag_rows = await pool.fetch(
+            "SELECT section_id, tag FROM wiki_section_tags WHERE section_id = ANY($1) ORDER BY section_id, tag",
+            tagged_ids
+        )
+        for tr in tag_rows:
+            tags_by_section[tr["section_id"]].append(tr["tag"])
 
     section_dict = dict(node)
+    del section_dict["has_tags"]
     section_dict["tags"] = tags_by_section[node["section_id"]]
 
     children_list = []
     for c in children:
         cd = dict(c)
+        del cd["has_tags"]
         cd["tags"] = tags_by_section[c["section_id"]]
         children_list.append(cd)
 
@@ -331,71 +301,52 @@ async def get_wiki_section(wiki_id: int, section_id: int, caller: dict = Depends
     }
 
 
+# Section fields, tag set and the wiki's updated_at in one statement. Tags are
+# reconciled rather than wiped and reinserted, since both halves run against
+# the same snapshot and UNIQUE(section_id, tag) would trip on kept tags.
+UPDATE_WIKI_SECTION_SQL = """
+    WITH s AS (
+        UPDATE wiki_sections
+        SET title = COALESCE($3, title), description = COALESCE($4, description), updated_at = NOW()
+        WHERE wiki_id = $1 AND section_id = $2
+        RETURNING section_id, title
+    ),
+    d AS (
+        DELETE FROM wiki_section_tags
+        WHERE section_id IN (SELECT section_id FROM s)
+          AND $5::text[] IS NOT NULL AND tag <> ALL($5::text[])
+    ),
+    i AS (
+        INSERT INTO wiki_section_tags (section_id, tag)
+        SELECT s.section_id, t FROM s, unnest($5::text[]) AS t
+        ON CONFLICT (section_id, tag) DO NOTHING
+    ),
+    w AS (
+        UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1 AND EXISTS (SELECT 1 FROM s)
+    )
+    SELECT section_id, title FROM s
+"""
+
+
 @router.put("/wikis/{wiki_id}/sections/{section_id}")
 async def update_wiki_section(wiki_id: int, section_id: int, section: WikiSectionUpdate, caller: dict = Depends(verify_api_key)):
     """Update a wiki section. If tags[] provided, replaces full tag set."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 2)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    updates = []
-    values = []
-    idx = 1
-    if section.title is not None:
-        updates.append(f"title = ${idx}")
-        values.append(section.title)
-        idx += 1
-    if section.description is not None:
-        updates.append(f"description = ${idx}")
-        values.append(section.description)
-        idx += 1
-
-    has_field_updates = bool(updates)
-    has_tag_updates = section.tags is not None
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 2):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
-    if not has_field_updates and not has_tag_updates:
+    has_tag_updates = section.tags is not None
+    if section.title is None and section.description is None and not has_tag_updates:
         raise HTTPException(status_code=400, detail="No fields to update")
 
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            if has_field_updates:
-                updates.append("updated_at = NOW()")
-                values.append(wiki_id)
-                values.append(section_id)
-                sql = f"UPDATE wiki_sections SET {', '.join(updates)} WHERE wiki_id = ${idx} AND section_id = ${idx + 1} RETURNING section_id, title"
-                row = await conn.fetchrow(sql, *values)
-                if not row:
-                    raise HTTPException(status_code=404, detail="Section not found")
-            else:
-                row = await conn.fetchrow(
-                    "UPDATE wiki_sections SET updated_at = NOW() WHERE wiki_id = $1 AND section_id = $2 RETURNING section_id, title",
-                    wiki_id, section_id
-                )
-                if not row:
-                    raise HTTPException(status_code=404, detail="Section not found")
-
-            if has_tag_updates:
-                await conn.execute(
-                    "DELETE FROM wiki_section_tags WHERE section_id = $1",
-                    section_id
-                )
-                if section.tags:
-                    await conn.executemany(
-                        "INSERT INTO wiki_section_tags (section_id, tag) VALUES ($1, $2)",
-                        [(section_id, tag) for tag in section.tags]
-                    )
-
-            await conn.execute(
-                "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
-                wiki_id
-            )
+    row = await pool.fetchrow(
+        UPDATE_WIKI_SECTION_SQL,
+        wiki_id, section_id, section.title, section.description, section.tags
+    )
+    if not row:
+        raise HTTPException(status_code=404, detail="Section not found")
 
+    wiki_lists.clear()
     result = dict(row)
     if has_tag_updates:
         result["tags"] = section.tags
@@ -405,40 +356,37 @@ async def update_wiki_section(wiki_id: int, section_id: int, section: WikiSectio
 @router.delete("/wikis/{wiki_id}/sections/{section_id}")
 async def delete_wiki_section(wiki_id: int, section_id: int, caller: dict = Depends(verify_api_key)):
     """Delete a section and its descendants. Touches parent wiki updated_at."""
-    pool = await get_pool()
-    wiki = await pool.fetchrow(
-        "SELECT wiki_id FROM wikis WHERE wiki_id = $1 AND user_id = $2",
-        wiki_id, caller["user_id"]
-    )
-    if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 3)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-
-    async with pool.acquire() as conn:
-        async with conn.transaction():
-            result = await conn.execute(
-                """
-                WITH RECURSIVE subtree AS (
-                    SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2
-                    UNION ALL
-                    SELECT ws.section_id FROM wiki_sections ws
-                    INNER JOIN subtree s ON ws.parent_id = s.section_id
-                    WHERE ws.wiki_id = $1
-                )
-                DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree)
-                """,
-                wiki_id, section_id
-            )
-            deleted_count = int(result.split()[-1])
-            if deleted_count == 0:
-                raise HTTPException(status_code=404, detail="Section not found")
+    pool = get_pool()
+    if not await access_level(pool, caller["user_id"], 3, wiki_id, 3):
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
-            await conn.execute(
-                "UPDATE wikis SET updated_at = NOW() WHERE wiki_id = $1",
-                wiki_id
-            )
+    # Subtree delete and wiki touch in one statement; the touch only fires
+    # when something was actually deleted
+    deleted_count = await pool.fetchval(
+        """
+        WITH RECURSIVE subtree AS (
+            SELECT section_id FROM wiki_sections WHERE wiki_id = $1 AND section_id = $2
+            UNION ALL
+            SELECT ws.section_id FROM wiki_sections ws
+            INNER JOIN subtree s ON ws.parent_id = s.section_id
+            WHERE ws.wiki_id = $1
+        ),
+        d AS (
+            DELETE FROM wiki_sections WHERE section_id IN (SELECT section_id FROM subtree)
+            RETURNING 1
+        ),
+        touch AS (
+            UPDATE wikis SET updated_at = NOW()
+            WHERE wiki_id = $1 AND EXISTS (SELECT 1 FROM d)
+        )
+        SELECT count(*) FROM d
+        """,
+        wiki_id, section_id
+    )
+    if deleted_count == 0:
+        raise HTTPException(status_code=404, detail="Section not found")
 
+    wiki_lists.clear()
     return {"deleted": section_id, "descendants_deleted": deleted_count - 1}
 
 
@@ -447,15 +395,26 @@ async def delete_wiki_section(wiki_id: int, section_id: int, caller: dict = Depe
 # ---------------------------------------------------------------------------
 
 def _build_tree(sections: list[dict]) -> list[dict]:
-    """Organize flat sections into a tree by parent_id."""
-    by_id = {s["section_id"]: {**s, "children": []} for s in sections}
+    """Organize flat sections into a tree by parent_id, in place.
+
+    Single pass: a child seen before its parent waits in `pending` until the
+    parent arrives. Sections whose parent never shows up become roots.
+    """
+    by_id = {}
+    pending: dict[int, list[dict]] = {}
     roots = []
     for s in sections:
-        node = by_id[s["section_id"]]
-        if s["parent_id"] == 0 or s["parent_id"] not in by_id:
-            roots.append(node)
+        s["children"] = pending.pop(s["section_id"], [])
+        by_id[s["section_id"]] = s
+        parent_id = s["parent_id"]
+        if parent_id == 0:
+            roots.append(s)
+        elif parent_id in by_id:
+            by_id[parent_id]["children"].append(s)
         else:
-            by_id[s["parent_id"]]["children"].append(node)
+            pending.setdefault(parent_id, []).append(s)
+    for orphans in pending.values():
+        roots.extend(orphans)
     return roots
 
 
@@ -828,19 +787,16 @@ _WIKI_HTML_TEMPLATE = """<!DOCTYPE html>
 @router.get("/wikis/{wiki_id}/document", response_class=HTMLResponse)
 async def get_wiki_document(wiki_id: int, caller: dict = Depends(verify_api_key)):
     """Reconstitute a wiki as a self-contained HTML document."""
-    pool = await get_pool()
+    pool = get_pool()
     wiki = await pool.fetchrow(
-        "SELECT wiki_id, title, description, created_at, updated_at FROM wikis WHERE wiki_id = $1 AND user_id = $2",
+        """SELECT w.wiki_id, w.title, w.description, w.created_at, w.updated_at
+           FROM wikis w
+           LEFT JOIN shared_objects so ON so.object_id = w.wiki_id AND so.object_type_id = 3 AND so.shared_to_user_id = $2
+           WHERE w.wiki_id = $1 AND (w.user_id = $2 OR so.permission_level >= 1)""",
         wiki_id, caller["user_id"]
     )
     if not wiki:
-        perm = await check_share_permission(pool, caller["user_id"], 3, wiki_id, 1)
-        if not perm:
-            raise HTTPException(status_code=404, detail="Wiki not found")
-        wiki = await pool.fetchrow(
-            "SELECT wiki_id, title, description, created_at, updated_at FROM wikis WHERE wiki_id = $1",
-            wiki_id
-        )
+        raise HTTPException(status_code=404, detail="Wiki not found")
 
     sections = await pool.fetch(
         "SELECT section_id, parent_id, title, description, updated_at FROM wiki_sections WHERE wiki_id = $1 ORDER BY parent_id, section_id",
@@ -1,9 +1,14 @@
 import os
+import time
+import hashlib
+import json
 import bcrypt
 import jwt
+import orjson
 from datetime import datetime, timezone, timedelta
-from fastapi import Header, HTTPException
+from fastapi import Depends, Header, HTTPException
 from typing import Optional
+from .cache import TTLCache
 from .database import get_pool
 
 # JWT config
@@ -11,6 +16,22 @@ JWT_SECRET = os.environ.get("LUCYAPI_JWT_SECRET", "change-me-in-production")
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
 
+# Usernames allowed to run server-wide operations (comma-separated)
+OPERATORS = frozenset(
+    u.strip() for u in os.environ.get("LUCYAPI_OPERATORS", "").split(",") if u.strip()
+)
+
+# Verified token digest -> (exp, user dict). Repeat callers skip the HMAC
+# check and the users fetch; an entry never outlives its token's exp.
+_token_cache = TTLCache(ttl=60)
+
+
+class _OrjsonEncoder(json.JSONEncoder):
+    """Lets PyJWT serialize headers and claims with orjson."""
+
+    def encode(self, o):
+        return orjson.dumps(o).decode()
+
 
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
@@ -20,14 +41,16 @@ def verify_password(password: str, password_hash: str) -> bool:
     return bcrypt.checkpw(password.encode(), password_hash.encode())
 
 
-def create_token(user_id: int, username: str) -> str:
+def create_token(user_id: int, username: str, name: str, email: Optional[str] = None) -> str:
     payload = {
         "user_id": user_id,
         "username": username,
+        "name": name,
+        "email": email,
         "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS),
         "iat": datetime.now(timezone.utc),
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM, json_encoder=_OrjsonEncoder)
 
 
 def decode_token(token: str) -> dict:
@@ -45,13 +68,39 @@ async def verify_user_token(authorization: Optional[str] = Header(None)) -> dict
         raise HTTPException(status_code=401, detail="Bearer token required")
 
     token = authorization[7:]  # strip "Bearer "
+    cache_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(cache_key)
+    if cached is not None and cached[0] > time.time():
+        return cached[1]
+
     payload = decode_token(token)
 
-    pool = await get_pool()
+    # Tokens carry the profile, so the users table is only consulted for
+    # tokens issued before the claims were added
+    if "name" in payload:
+        user = {
+            "user_id": payload["user_id"],
+            "name": payload["name"],
+            "username": payload["username"],
+            "email": payload.get("email"),
+        }
+        _token_cache.set(cache_key, (payload["exp"], user))
+        return user
+
+    pool = get_pool()
     row = await pool.fetchrow(
         "SELECT user_id, name, username, email FROM users WHERE user_id = $1",
         payload["user_id"]
     )
     if not row:
         raise HTTPException(status_code=401, detail="User not found")
-    return dict(row)
+    user = dict(row)
+    _token_cache.set(cache_key, (payload["exp"], user))
+    return user
+
+
+async def verify_operator(user: dict = Depends(verify_user_token)) -> dict:
+    """FastAPI dependency — verify_user_token, restricted to LUCYAPI_OPERATORS."""
+    if user["username"] not in OPERATORS:
+        raise HTTPException(status_code=403, detail="Operator access required")
+    return user
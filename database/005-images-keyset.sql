@@ -0,0 +1,9 @@
+-- 005-images-keyset.sql
+-- Index backing keyset pagination of GET /admin/images
+-- (ORDER BY created_at DESC, image_id DESC with a (created_at, image_id) cursor)
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_images_user_created ON images (user_id, created_at DESC, image_id DESC);
+
+COMMIT;
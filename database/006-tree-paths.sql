@@ -0,0 +1,75 @@
+-- 006-tree-paths.sql
+-- Materialized ltree paths on always_load and hints, so a subtree delete is
+-- one indexed "path <@ ancestor" match instead of a recursive CTE walk.
+-- path is the chain of ids from the root down to the row itself (e.g. 4.17.52).
+-- Nodes are never re-parented, so paths are only computed on insert.
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS ltree;
+
+-- 1. always_load
+ALTER TABLE always_load ADD COLUMN path ltree;
+
+WITH RECURSIVE p AS (
+    -- Roots, plus orphans whose parent no longer exists: they are deleted
+    -- as subtrees of their own, like the recursive CTE used to
+    SELECT pkid, pkid::text::ltree AS path FROM always_load r
+    WHERE parent_id = 0 OR NOT EXISTS (SELECT 1 FROM always_load x WHERE x.pkid = r.parent_id)
+    UNION ALL
+    SELECT a.pkid, p.path || a.pkid::text
+    FROM always_load a JOIN p ON a.parent_id = p.pkid
+)
+UPDATE always_load a SET path = p.path FROM p WHERE a.pkid = p.pkid;
+
+-- Anything still unreached (a parent_id cycle) becomes its own root
+UPDATE always_load SET path = pkid::text::ltree WHERE path IS NULL;
+
+ALTER TABLE always_load ALTER COLUMN path SET NOT NULL;
+
+CREATE FUNCTION always_load_set_path() RETURNS trigger AS $$
+BEGIN
+    NEW.path := COALESCE((SELECT path FROM always_load WHERE pkid = NEW.parent_id), ''::ltree)
+                || NEW.pkid::text;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER always_load_path BEFORE INSERT ON always_load
+    FOR EACH ROW EXECUTE FUNCTION always_load_set_path();
+
+CREATE INDEX idx_always_load_path ON always_load USING GIST (path);
+
+-- 2. hints
+ALTER TABLE hints ADD COLUMN path ltree;
+
+WITH RECURSIVE p AS (
+    -- Roots, plus orphans whose parent no longer exists: they are deleted
+    -- as subtrees of their own, like the recursive CTE used to
+    SELECT hint_id, hint_id::text::ltree AS path FROM hints r
+    WHERE parent_id = 0 OR NOT EXISTS (SELECT 1 FROM hints x WHERE x.hint_id = r.parent_id)
+    UNION ALL
+    SELECT h.hint_id, p.path || h.hint_id::text
+    FROM hints h JOIN p ON h.parent_id = p.hint_id
+)
+UPDATE hints h SET path = p.path FROM p WHERE h.hint_id = p.hint_id;
+
+-- Anything still unreached (a parent_id cycle) becomes its own root
+UPDATE hints SET path = hint_id::text::ltree WHERE path IS NULL;
+
+ALTER TABLE hints ALTER COLUMN path SET NOT NULL;
+
+CREATE FUNCTION hints_set_path() RETURNS trigger AS $$
+BEGIN
+    NEW.path := COALESCE((SELECT path FROM hints WHERE hint_id = NEW.parent_id), ''::ltree)
+                || NEW.hint_id::text;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hints_path BEFORE INSERT ON hints
+    FOR EACH ROW EXECUTE FUNCTION hints_set_path();
+
+CREATE INDEX idx_hints_path ON hints USING GIST (path);
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- 007-image-status.sql
+-- Image generation runs in the background: rows are inserted as 'pending'
+-- and moved to 'ready' (or 'failed') when the generation finishes.
+-- Existing rows are all complete.
+
+BEGIN;
+
+ALTER TABLE images ADD COLUMN status TEXT NOT NULL DEFAULT 'ready'
+    CHECK (status IN ('pending', 'ready', 'failed'));
+
+COMMIT;
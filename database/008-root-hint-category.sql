@@ -0,0 +1,18 @@
+-- 008-root-hint-category.sql
+-- Root hints are their own category. Set hint_category_id = hint_id on
+-- insert, so creating a category is a single INSERT instead of an INSERT
+-- followed by a self-referencing UPDATE.
+
+BEGIN;
+
+CREATE FUNCTION hints_set_root_category() RETURNS trigger AS $$
+BEGIN
+    NEW.hint_category_id := NEW.hint_id;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER hints_root_category BEFORE INSERT ON hints
+    FOR EACH ROW WHEN (NEW.parent_id = 0) EXECUTE FUNCTION hints_set_root_category();
+
+COMMIT;
@@ -0,0 +1,11 @@
+-- 009-handoffs-pending.sql
+-- Partial index backing list_handoffs
+-- (WHERE agent_id = $1 AND picked_up_at IS NULL ORDER BY created_at):
+-- only pending rows are indexed, already in created_at order, so the
+-- list is an index range scan with no sort step.
+
+BEGIN;
+
+CREATE INDEX IF NOT EXISTS idx_handoffs_pending ON handoffs (agent_id, created_at) WHERE picked_up_at IS NULL;
+
+COMMIT;